@@ -1,22 +1,64 @@
-from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel, Field, ValidationError
+from starlette.background import BackgroundTask
+import bmi_batch
+import columnar
 import database
+import database_async
+import llm_client
+import metrics
+import passwords
+import plan_cache
+import plan_jobs
+import tokens
 import uvicorn
-import os
-from typing import Optional
-try:
-    import apikey
-except ImportError:
-    apikey = None
+import json
+import base64
+import binascii
+import asyncio
+import csv
+import io
+import sqlite3
+from contextlib import asynccontextmanager
+from db_pool import PoolTimeout
+from typing import Literal, Optional
 
 try:
-    from openai import OpenAI
-    _openai_available = True
-except Exception:
-    _openai_available = False
-
-database.init_db()
-app = FastAPI()
+    import orjson
+except ImportError:
+    orjson = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 结构迁移在启动时而不是 import 时执行；已是最新版本时只读一次 user_version
+    await asyncio.to_thread(database.init_db)
+    # LLM 客户端（未配置密钥时为 None）与 AI 方案后台 worker 随应用启停
+    app.state.llm = llm_client.LLMClient.from_env()
+    app.state.plan_cache = plan_cache.PlanCache() if plan_cache.PLAN_CACHE_ENABLED else None
+    app.state.plan_jobs = plan_jobs.PlanJobQueue(_run_plan_job)
+    await app.state.plan_jobs.start()
+    # 密码哈希进程池
+    await asyncio.to_thread(passwords.start)
+    try:
+        yield
+    finally:
+        await app.state.plan_jobs.stop()
+        passwords.shutdown()
+        await database_async.close_pool()
+        if app.state.llm is not None:
+            app.state.llm.close()
+
+app = FastAPI(lifespan=lifespan)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    # 等不到数据库连接时返回 503，客户端可稍后重试
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
 
 class User(BaseModel):
     """
@@ -48,7 +90,7 @@ class User(BaseModel):
     id: int
     username: str
     email: str
-    remark: str = None
+    remark: str | None = None
     created_at: str
 
 
@@ -72,6 +114,12 @@ class UserUpdate(BaseModel):
     weight: float | None = None
     age: int | None = None
 
+class UserBatchItem(UserUpdate):
+    id: int
+
+class UserBatchUpdate(BaseModel):
+    updates: list[UserBatchItem] = Field(..., min_length=1, max_length=database.MAX_PAGE_SIZE)
+
 class BMIRequest(BaseModel):
     height: float  # cm
     weight: float  # kg
@@ -79,20 +127,36 @@ class BMIRequest(BaseModel):
     gender: Optional[str] = None  # 'male' | 'female'
     goal: Optional[str] = None    # e.g. 'fat_loss', 'muscle_gain', 'recomposition'
     user_id: int # 新增，用于关联用户
+    force_refresh: bool = False  # 跳过方案缓存，强制重新生成
+
+class BMIBatchRecord(BaseModel):
+    id: Optional[int] = None  # 调用方自己的标识，原样返回
+    height: float = Field(..., ge=bmi_batch.MIN_HEIGHT_CM, le=bmi_batch.MAX_HEIGHT_CM)  # cm
+    weight: float = Field(..., gt=0, le=bmi_batch.MAX_WEIGHT_KG)  # kg
+    age: int = Field(..., ge=0, le=bmi_batch.MAX_AGE)
+    goal: Optional[str] = None
+
+class BMIBatchRequest(BaseModel):
+    records: list[BMIBatchRecord] = Field(..., min_length=1, max_length=bmi_batch.BMI_BATCH_MAX_RECORDS)
 
 class BMIPlanResponse(BaseModel):
     bmi: float
     bmi_category: str
     suggestion: str
     ai_plan: Optional[str] = None
+    job_id: Optional[str] = None  # 异步模式下用于查询 AI 方案
+    cached: bool = False  # AI 方案是否来自缓存
+
+class PlanJobStatus(BaseModel):
+    job_id: str
+    status: str  # pending | running | done | failed
+    ai_plan: Optional[str] = None
+    plan_id: Optional[int] = None
+    error: Optional[str] = None
 
 # 简单 BMI 分类
-_DEF_BMI_CATEGORIES = [
-    (18.5, '偏瘦'),
-    (24.0, '正常'),
-    (28.0, '超重'),
-    (100.0, '肥胖')
-]
+# 阈值定义在 database.BMI_CATEGORIES，统计触发器按同一张表计算用户的 BMI 分类
+_DEF_BMI_CATEGORIES = database.BMI_CATEGORIES
 
 def _calc_bmi(height_cm: float, weight_kg: float) -> float:
     if height_cm <= 0 or weight_kg <= 0:
@@ -126,8 +190,11 @@ def _basic_suggestion(bmi: float, age: int, goal: Optional[str]) -> str:
         base.append('交替轻微盈余与轻微缺口，保证训练强度。')
     return ' '.join(base)
 
+# 批量计算与上面的单条函数共用阈值、分类与建议规则
+_bmi_calculator = bmi_batch.BMICalculator(_DEF_BMI_CATEGORIES, _calc_bmi, _bmi_category, _basic_suggestion)
+
 @app.get("/")
-def index():
+async def index():
     return {"message": "Hello, World!"}
 '''
 对于app.add_api_route的参数举例(这破函数参数怎么这么多啊,根本背不过啊混蛋!)
@@ -135,42 +202,379 @@ app.add_api_route(path: str, endpoint: Callable, *, methods: List[str] = None, r
 '''
 
 
+def _encode_cursor(*values) -> str:
+    """把分页位置编码成不透明游标，客户端只需原样传回"""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor: str, arity: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    if not isinstance(values, list) or len(values) != arity:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    return values
+
+def _dumps(value) -> bytes:
+    """序列化为 JSON 字节串；安装了 orjson 时用它，比标准库 json 快数倍"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+def _user_records(columns: tuple, rows: list) -> list:
+    """把元组行按列名组装成 dict，交给 _dumps 直接序列化，不经过 jsonable_encoder"""
+    return [dict(zip(columns, row)) for row in rows]
+
+def _user_columns(fields: Optional[str]) -> tuple:
+    """解析 fields=id,username,... 投影参数；id 总会返回"""
+    if fields is None:
+        return database.PUBLIC_USER_COLUMNS
+    try:
+        return database.user_fields([field.strip() for field in fields.split(',') if field.strip()])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/users", response_model=list)
-def read_users(skip: int = 0, limit: int | None = None):
-    return database.get_all_users(skip=skip, limit=limit)
+def _require_columnar():
+    if not columnar.available():
+        raise HTTPException(status_code=501, detail="服务端未安装 pyarrow，不支持 arrow/parquet 格式")
 
+def _stream_response(chunks, stream, **kwargs) -> StreamingResponse:
+    """返回 chunks 的流式响应；stream 为已借到连接的 database_async.UsersStream（或 None），
+    响应结束、出错或客户端断开时都会关闭"""
+    if stream is None:
+        return StreamingResponse(chunks, **kwargs)
 
+    async def body():
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await stream.aclose()
+    return StreamingResponse(body(), background=BackgroundTask(stream.aclose), **kwargs)
+
+def _columnar_response(batches, columns: tuple, column_types: dict, format: str, headers: dict | None = None, stream=None):
+    """以 Arrow IPC 流或 Parquet 流式返回 batches（异步产出的元组行列表）"""
+    _require_columnar()
+    return _stream_response(
+        columnar.encode(batches, columnar.schema(columns, column_types), format), stream,
+        media_type=columnar.media_type(format),
+        headers=headers,
+    )
 
-@app.get('/users/count')
-def users_count():
-    return database.get_total_users_count()
+def _etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否包含 etag（弱比较）"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or etag in tags
 
-@app.get("/users/{user_id}", response_model=User)
-def read_user(user_id: int):
-    user = database.get_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="用户未找到")
-    return user
+async def _users_json(request: Request, key: tuple, load) -> Response:
+    """返回用户列表类数据的 JSON 响应，带 ETag。load 为返回可等待对象的函数。
 
-@app.post("/users", response_model=dict, status_code=201)
-def create_new_user(user: UserCreate):
+    序列化后的响应体按 key 缓存在 database 的用户读缓存中，用户数据未变化时
+    既不查库也不重新序列化；If-None-Match 与当前 ETag 相同时直接返回 304。
+    ETag 在读取数据之前取得，读取期间发生的写入只会让下次请求多拿一次 200，不会返回过时内容。
+    """
+    etag = await database_async.users_etag()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    async def render():
+        return _dumps(await load())
+    body = await database_async.cached_users_read(('json',) + key, render, check=False)
+    return Response(body, media_type='application/json', headers=headers)
+
+_bearer = HTTPBearer(auto_error=False)
+
+async def current_user(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> dict:
+    """校验 Authorization: Bearer 令牌并返回其载荷 ({"sub", "adm", "exp"})，不查数据库"""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="未登录", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return tokens.verify_token(credentials.credentials)
+    except tokens.InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+async def require_admin(claims: dict = Depends(current_user)) -> dict:
+    if not claims.get('adm'):
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+    return claims
+
+# /users 下的所有路由。Starlette 按注册顺序匹配路径，固定路径 (/count、/search)
+# 必须注册在 /{user_id} 之前，否则会被 int 路径参数先匹配并返回 422。
+users_router = APIRouter(prefix="/users", tags=["users"])
+
+# --- 集合与固定路径 ---
+
+@users_router.get("")
+async def read_users(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1, le=database.MAX_PAGE_SIZE),
+    after_id: int | None = Query(None, ge=0),
+    cursor: str | None = None,
+    fields: str | None = Query(None, description="逗号分隔的返回字段，如 id,username；默认全部公开字段"),
+    format: Literal['json', 'arrow', 'parquet'] = 'json',
+):
+    """获取用户列表。
+
+    传 after_id（首页传 0）或上一页返回的 cursor 时使用键集分页，
+    返回 {"items": [...], "next_cursor": ...}，next_cursor 为空表示已到末页；
+    否则沿用 skip/limit 偏移分页并直接返回列表。
+    响应带 ETag，用户数据未变化时带 If-None-Match 的请求返回 304。
+
+    format=arrow|parquet 时按 id 顺序流式返回 after_id（或 cursor）之后的用户：不传 limit 时
+    返回其后的全部用户（整表导出），传 limit 时下一页游标放在 X-Next-Cursor 响应头中。不支持 skip。
+    """
+    columns = _user_columns(fields)
+    if cursor is not None:
+        (after_id,) = _decode_cursor(cursor, 1)
+        if not isinstance(after_id, int):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+    if format != 'json':
+        if skip:
+            raise HTTPException(status_code=400, detail="arrow/parquet 格式请使用 after_id 或 cursor 分页")
+        _require_columnar()
+        after_id = after_id or 0
+        headers = {}
+        if limit is not None:
+            next_after_id = await database_async.users_next_after_id(after_id, limit)
+            if next_after_id is not None:
+                headers["X-Next-Cursor"] = _encode_cursor(next_after_id)
+        stream = await database_async.open_users_stream(
+            columns, batch_size=COLUMNAR_BATCH_SIZE, after_id=after_id, limit=limit
+        )
+        return _columnar_response(stream, columns, columnar.USER_COLUMN_TYPES, format, headers, stream)
+    if after_id is None:
+        async def load_offset_page():
+            return _user_records(columns, await database_async.get_all_users(skip=skip, limit=limit, columns=columns))
+        return await _users_json(request, ('offset', skip, limit, columns), load_offset_page)
+
+    async def load_page():
+        rows, next_after_id = await database_async.get_users_after(
+            after_id, limit or database.DEFAULT_PAGE_SIZE, columns=columns
+        )
+        next_cursor = _encode_cursor(next_after_id) if next_after_id is not None else None
+        return {"items": _user_records(columns, rows), "next_cursor": next_cursor}
+    return await _users_json(request, ('after', after_id, limit, columns), load_page)
+
+@users_router.post("", response_model=dict, status_code=201)
+async def create_new_user(user: UserCreate):
+    password_hash = await passwords.hash_password_async(user.password)
     try:
-        new_id = database.create_user(
-            user.username, user.email, user.password, user.remark,
+        new_id = await database_async.create_user(
+            user.username, user.email, password_hash, user.remark,
             height=user.height, weight=user.weight, age=user.age
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"创建用户失败: {e}")
-    return database.get_user_by_id(new_id)
+    return await database_async.get_user_by_id(new_id)
+
+# arrow/parquet 响应每批（每个 RecordBatch / 行组）的行数
+COLUMNAR_BATCH_SIZE = 10000
+
+# 批量导入每批插入的行数，以及响应中最多列出的错误行数
+BULK_BATCH_SIZE = 1000
+BULK_MAX_REPORTED_ERRORS = 1000
+
+async def _iter_body_lines(request: Request):
+    """逐行读取请求体，不把整个上传内容读进内存"""
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line.decode('utf-8-sig').rstrip('\r')
+    if buffer:
+        yield buffer.decode('utf-8-sig').rstrip('\r')
+
+async def _iter_import_records(request: Request, fmt: str):
+    """产出 (行号, dict 或解析错误信息)"""
+    header = None
+    line_no = 0
+    async for line in _iter_body_lines(request):
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == 'csv':
+            # 每行单独解析，不支持字段内换行
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            yield line_no, dict(zip(header, values))
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, f"JSON 解析失败: {e}"
+                continue
+            yield line_no, record if isinstance(record, dict) else "每行必须是一个 JSON 对象"
+
+@users_router.post("/bulk", dependencies=[Depends(require_admin)])
+async def bulk_import_users(request: Request, format: Literal['ndjson', 'csv'] | None = None):
+    """批量导入用户，仅管理员可用。
+
+    请求体为 NDJSON（每行一个对象）或带表头的 CSV，字段同 POST /users；
+    格式由 format 参数或 Content-Type (text/csv) 决定，默认 NDJSON。
+    边读边校验，每 BULK_BATCH_SIZE 行在一个事务中批量插入。单行失败（校验失败、
+    用户名或邮箱重复）不影响其他行，返回 {"inserted", "failed", "errors": [{"line", "error"}]}。
+    """
+    fmt = format or ('csv' if 'csv' in request.headers.get('content-type', '') else 'ndjson')
+    inserted = failed = 0
+    errors = []
+
+    def report(line_no, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < BULK_MAX_REPORTED_ERRORS:
+            errors.append({"line": line_no, "error": message})
+
+    async def flush(batch):
+        nonlocal inserted
+        # 密码列已是 scrypt 哈希（如从其他库迁移）时原样写入，否则在进程池中并行计算
+        hashed = await passwords.hash_passwords_async([row[2] for _, row in batch])
+        rows = [row[:2] + (password_hash,) + row[3:] for (_, row), password_hash in zip(batch, hashed)]
+        count, row_errors = await database_async.bulk_create_users(rows)
+        inserted += count
+        for index, message in row_errors:
+            report(batch[index][0], message)
+
+    batch = []
+    async for line_no, record in _iter_import_records(request, fmt):
+        if isinstance(record, str):
+            report(line_no, record)
+            continue
+        # CSV 中的空字段视为未提供
+        record = {k: v for k, v in record.items() if v not in ('', None)}
+        try:
+            user = UserCreate(**record)
+        except ValidationError as e:
+            report(line_no, '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        if passwords.is_malformed_hash(user.password):
+            report(line_no, "password: 以 scrypt$ 开头但不是有效的 scrypt 哈希，或参数超过 "
+                            f"n={passwords.SCRYPT_N}, r={passwords.SCRYPT_R}, p={passwords.SCRYPT_P}")
+            continue
+        batch.append((line_no, (
+            user.username, user.email, user.password, user.remark, 0, user.height, user.weight, user.age
+        )))
+        if len(batch) >= BULK_BATCH_SIZE:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    errors.sort(key=lambda error: error['line'])
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+@users_router.get("/export")
+async def export_users(format: Literal['ndjson', 'csv'] = 'ndjson'):
+    """流式导出全部用户（不含密码），按批从数据库读取，不在内存中保存整表。
+
+    流式读取的连接在发送响应头之前借好，达到 DATABASE_STREAM_LIMIT 且等待超时时返回 503。
+    """
+    columns = database.PUBLIC_USER_COLUMNS
+    stream = await database_async.open_users_stream(columns)
+
+    async def ndjson_chunks():
+        async for rows in stream:
+            yield b''.join(_dumps(dict(zip(columns, row))) + b'\n' for row in rows)
+
+    async def csv_chunks():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        async for rows in stream:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    if format == 'csv':
+        return _stream_response(
+            csv_chunks(), stream, media_type='text/csv',
+            headers={"Content-Disposition": 'attachment; filename="users.csv"'},
+        )
+    return _stream_response(
+        ndjson_chunks(), stream, media_type='application/x-ndjson',
+        headers={"Content-Disposition": 'attachment; filename="users.ndjson"'},
+    )
+
+@users_router.get('/count')
+async def users_count(request: Request):
+    """用户总数，支持 ETag / If-None-Match"""
+    return await _users_json(request, ('count',), database_async.get_total_users_count)
 
-@app.put("/users/{user_id}", response_model=dict)
-def update_existing_user(user_id: int, user: UserUpdate):
-    updated = database.update_user(
+@users_router.patch('/batch', dependencies=[Depends(require_admin)])
+async def batch_update_users(batch: UserBatchUpdate):
+    """在一个事务中批量更新多个用户，每项为 {"id": ..., 要修改的字段}，未提供的字段不变。仅管理员可用。
+
+    任一用户不存在 (404) 或用户名/邮箱冲突 (400) 时整批不生效。返回 {"updated": 更新的用户数}。
+    """
+    updates = [(item.id, item.model_dump(exclude={'id'})) for item in batch.updates]
+    for _, fields in updates:
+        if fields['password'] is not None:
+            fields['password'] = await passwords.hash_password_async(fields['password'])
+    try:
+        updated = await database_async.update_users(updates)
+    except database.UsersNotFound as e:
+        raise HTTPException(status_code=404, detail=f"用户未找到: {e.user_ids}")
+    except sqlite3.IntegrityError as e:
+        raise HTTPException(status_code=400, detail=f"批量更新失败: {e}")
+    return {"updated": updated}
+
+@users_router.get('/search')
+async def users_search(
+    query: str,
+    limit: int = Query(database.DEFAULT_SEARCH_LIMIT, ge=1, le=database.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    fields: str | None = Query(None, description="逗号分隔的返回字段，如 id,username；默认全部公开字段"),
+    format: Literal['json', 'arrow', 'parquet'] = 'json',
+):
+    """全文搜索用户，结果按相关度排序"""
+    columns = _user_columns(fields)
+    rows = await database_async.search_users(query, limit=limit, offset=offset, columns=columns)
+    if format != 'json':
+        return _columnar_response(columnar.single_batch(rows), columns, columnar.USER_COLUMN_TYPES, format)
+    return Response(_dumps(_user_records(columns, rows)), media_type='application/json')
+
+@users_router.get('/lookup')
+async def users_lookup(
+    prefix: str = Query("", max_length=database.MAX_LOOKUP_PREFIX),
+    limit: int = Query(database.DEFAULT_LOOKUP_LIMIT, ge=1, le=database.MAX_LOOKUP_LIMIT),
+):
+    """按用户名或邮箱前缀查找用户（输入联想），只返回 id 与 username，按用户名排序"""
+    rows = await database_async.lookup_users(prefix, limit)
+    return Response(_dumps(_user_records(("id", "username"), rows)), media_type='application/json')
+
+# --- 单个用户 (/{user_id}) ---
+
+@users_router.get("/{user_id}", response_model=User)
+async def read_user(user_id: int):
+    user = await database_async.get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="用户未找到")
+    return user
+
+@users_router.put("/{user_id}", response_model=dict)
+async def update_existing_user(user_id: int, user: UserUpdate, claims: dict = Depends(current_user)):
+    """更新用户信息：本人或管理员可用，修改 is_admin 仅管理员可用"""
+    if not claims.get('adm'):
+        if claims.get('sub') != user_id:
+            raise HTTPException(status_code=403, detail="只能修改自己的信息")
+        if user.is_admin is not None:
+            raise HTTPException(status_code=403, detail="需要管理员权限")
+    password_hash = await passwords.hash_password_async(user.password) if user.password is not None else None
+    updated = await database_async.update_user(
         user_id,
         username=user.username,
         email=user.email,
-        password=user.password,
+        password=password_hash,
         remark=user.remark,
         is_admin=user.is_admin,
         height=user.height,
@@ -179,39 +583,163 @@ def update_existing_user(user_id: int, user: UserUpdate):
     )
     if not updated:
         raise HTTPException(status_code=400, detail="更新失败")
-    data = database.get_user_by_id(user_id)
+    data = await database_async.get_user_by_id(user_id)
     if not data:
         raise HTTPException(status_code=404, detail="用户未找到")
     return data
 
-@app.delete("/users/{user_id}", status_code=204)
-def delete_existing_user(user_id: int):
-    if not database.get_user_by_id(user_id):
+@users_router.delete("/{user_id}", status_code=204, dependencies=[Depends(require_admin)])
+async def delete_existing_user(user_id: int):
+    """删除用户，仅管理员可用"""
+    if not await database_async.get_user_by_id(user_id):
         raise HTTPException(status_code=404, detail="用户未找到")
-    database.delete_user(user_id)
+    await database_async.delete_user(user_id)
     return None
 
+@users_router.get("/{user_id}/plans")
+async def get_user_plans(
+    user_id: int,
+    limit: int | None = Query(None, ge=1, le=database.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    summary: bool = False,
+    format: Literal['json', 'arrow', 'parquet'] = 'json',
+):
+    """获取指定用户的历史方案，按时间倒序。
+
+    传 limit 或 cursor 时分页返回 {"items": [...], "next_cursor": ...}，否则返回全部方案的列表。
+    summary=true 时不返回 ai_plan 正文，需要时通过 GET /plans/{plan_id} 单独获取。
+    format=arrow|parquet 时以列式格式返回同样的行，分页游标放在 X-Next-Cursor 响应头中。
+    """
+    next_cursor = None
+    if limit is None and cursor is None:
+        plans = await database_async.get_plans_by_user_id(user_id, summary=summary)
+    else:
+        before = None
+        if cursor is not None:
+            before = _decode_cursor(cursor, 2)
+            if not isinstance(before[0], str) or not isinstance(before[1], int):
+                raise HTTPException(status_code=400, detail="无效的分页游标")
+        plans, next_before = await database_async.get_plans_page(
+            user_id, before=before, limit=limit or database.DEFAULT_PAGE_SIZE, summary=summary
+        )
+        next_cursor = _encode_cursor(*next_before) if next_before is not None else None
+    if format != 'json':
+        columns = database.PLAN_SUMMARY_FIELDS if summary else database.PLAN_FIELDS
+        rows = [tuple(plan[column] for column in columns) for plan in plans]
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return _columnar_response(columnar.single_batch(rows), columns, columnar.PLAN_COLUMN_TYPES, format, headers)
+    if limit is None and cursor is None:
+        return plans
+    return {"items": plans, "next_cursor": next_cursor}
+
+
 class LoginRequest(BaseModel):
     email: str
     password: str
 
-@app.post('/login')
-def login(req: LoginRequest):
-    user = database.authenticate_user(req.email, req.password)
-    if not user:
-        raise HTTPException(status_code=401, detail='邮箱或密码错误')
-    return user
+class LoginResponse(BaseModel):
+    id: int
+    username: str
+    email: str
+    remark: str | None = None
+    created_at: str
+    is_admin: bool = False
+    height: float | None = None
+    weight: float | None = None
+    age: int | None = None
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int  # 秒
 
+@app.post('/login', response_model=LoginResponse)
+async def login(req: LoginRequest):
+    """校验邮箱与密码，返回用户信息与访问令牌。
 
+    之后的请求通过 Authorization: Bearer <access_token> 认证，管理员接口据令牌中的
+    is_admin 声明授权，不必再次调用 /login。
 
-@app.get('/users/search')
-def users_search(query: str):
-    return database.search_users(query)
+    KDF 在密码哈希进程池中计算，不阻塞事件循环；短时间内重复校验同一凭据（如删除用户前的再次确认）
+    命中校验缓存。仍以明文存储的旧密码在登录成功后替换为哈希。
+    """
+    user = await database_async.get_login_user(req.email)
+    # 邮箱不存在时也对假哈希跑一次 KDF，使响应时间与密码错误时相同
+    ok = await passwords.verify_password_async(req.password, user['password'] if user else passwords.DUMMY_HASH)
+    if not user or not ok:
+        raise HTTPException(status_code=401, detail='邮箱或密码错误')
+    stored = user.pop('password')
+    if passwords.needs_rehash(stored):
+        new_hash = await passwords.hash_password_async(req.password)
+        await database_async.replace_password_hash(user['id'], stored, new_hash)
+    token, expires_in = tokens.issue_token(user['id'], user['is_admin'])
+    return LoginResponse(**user, access_token=token, expires_in=expires_in)
+
+
+# 修改 _plan_prompt 或 _plan_messages 时递增，使旧的缓存方案失效
+PLAN_PROMPT_VERSION = 1
+
+def _plan_prompt(data: BMIRequest, bmi: float, category: str) -> str:
+    return f"""你是专业的运动营养教练。请基于以下用户数据提供中文的 7 日身材(体脂)控制方案，使用分点与表格化友好格式：\n\nBMI: {bmi} ({category})\n年龄: {data.age}\n性别: {data.gender or '未提供'}\n目标: {data.goal or '未明确'}\n身高: {data.height} cm\n体重: {data.weight} kg\n\n需包含：\n1. 核心策略概述 (热量与宏量素区间)。\n2. 每日样例三餐+加餐 (注明大致热量)。\n3. 训练安排 (力量+有氧频次与示例)。\n4. 恢复与睡眠建议。\n5. 风险与注意事项。\n请简洁分段。"""
+
+def _plan_messages(data: BMIRequest, bmi: float, category: str) -> list:
+    return [
+        {"role": "system", "content": "你是专业的营养与训练顾问。"},
+        {"role": "user", "content": _plan_prompt(data, bmi, category)}
+    ]
+
+def _request_ai_plan(llm: llm_client.LLMClient, data: BMIRequest, bmi: float, category: str) -> str:
+    """同步调用 DeepSeek(OpenAI 兼容) 接口生成方案，失败时抛出异常"""
+    return llm.chat(_plan_messages(data, bmi, category), temperature=0.7, max_tokens=800)
+
+def _stream_ai_plan(llm: llm_client.LLMClient, data: BMIRequest, bmi: float, category: str):
+    """以流式方式调用 LLM，逐段产出生成的文本"""
+    return llm.stream_chat(_plan_messages(data, bmi, category), temperature=0.7, max_tokens=800)
+
+def _plan_cache_key(llm: llm_client.LLMClient, data: BMIRequest, bmi: float) -> str:
+    return plan_cache.plan_fingerprint(bmi, data.age, data.gender, data.goal, llm.model, PLAN_PROMPT_VERSION)
+
+def _lookup_cached_plan(cache: Optional[plan_cache.PlanCache], key: str, data: BMIRequest) -> Optional[str]:
+    """查缓存；未启用缓存或请求要求强制刷新时返回 None"""
+    if cache is None or data.force_refresh:
+        return None
+    return cache.get(key)
+
+def _plan_record(data: BMIRequest, bmi: float, category: str, suggestion: str, ai_plan: str) -> dict:
+    return dict(
+        user_id=data.user_id,
+        bmi=bmi,
+        bmi_category=category,
+        suggestion=suggestion,
+        ai_plan=ai_plan
+    )
+
+async def _save_plan(data: BMIRequest, bmi: float, category: str, suggestion: str, ai_plan: str) -> int:
+    return await database_async.create_plan(**_plan_record(data, bmi, category, suggestion, ai_plan))
+
+def _sse(event: str, data) -> str:
+    """格式化一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _run_plan_job(job: plan_jobs.PlanJob) -> dict:
+    """后台 worker 执行的任务：生成 AI 方案并保存到数据库"""
+    data, bmi, category, suggestion = job.payload
+    llm = app.state.llm
+    if llm is None:
+        raise RuntimeError("未配置 LLM 密钥")
+    ai_plan = await asyncio.to_thread(_request_ai_plan, llm, data, bmi, category)
+    cache = app.state.plan_cache
+    if cache is not None:
+        await asyncio.to_thread(cache.put, _plan_cache_key(llm, data, bmi), ai_plan)
+    plan_id = await _save_plan(data, bmi, category, suggestion, ai_plan)
+    return {"ai_plan": ai_plan, "plan_id": plan_id}
 
 @app.post('/bmi/plan', response_model=BMIPlanResponse)
-def generate_bmi_plan(data: BMIRequest):
+async def generate_bmi_plan(data: BMIRequest, request: Request, response: Response, mode: Literal['sync', 'async'] = 'sync'):
     """根据 BMI 及年龄生成基础建议，并可调用 DeepSeek(OpenAI 兼容) 模型生成智能方案。
     需要设置环境变量 DEEPSEEK_API_KEY (或 OPENAI_API_KEY) 与可选 DEEPSEEK_BASE_URL。
+
+    mode=async 时立即返回基础指标和 job_id (状态码 202)，AI 方案由后台 worker 生成，
+    通过 GET /bmi/plan/jobs/{job_id} 查询；排队已满时返回 503。
+    命中方案缓存时两种模式都直接返回方案 (cached=true)，force_refresh=true 跳过缓存。
     """
     try:
         bmi = _calc_bmi(data.height, data.weight)
@@ -220,46 +748,217 @@ def generate_bmi_plan(data: BMIRequest):
     category = _bmi_category(bmi)
     suggestion = _basic_suggestion(bmi, data.age, data.goal)
 
-    ai_plan = None
-    # 优先从 apikey.py 读取, 其次是环境变量
-    api_key_from_file = getattr(apikey, 'apikey', None)
-    api_key = api_key_from_file if api_key_from_file and api_key_from_file != "你的key" else os.getenv('DEEPSEEK_API_KEY') or os.getenv('OPENAI_API_KEY')
-    base_url = os.getenv('DEEPSEEK_BASE_URL')  # 如 https://api.deepseek.com
+    llm = request.app.state.llm
+    cache = request.app.state.plan_cache
+    if llm is not None:
+        cache_key = _plan_cache_key(llm, data, bmi)
+        cached_plan = await run_in_threadpool(_lookup_cached_plan, cache, cache_key, data)
+        if cached_plan:
+            await _save_plan(data, bmi, category, suggestion, cached_plan)
+            return BMIPlanResponse(bmi=bmi, bmi_category=category, suggestion=suggestion, ai_plan=cached_plan, cached=True)
+
     # 仅在安装了 openai 包且存在 key 时尝试
-    if api_key and _openai_available:
+    if mode == 'async' and llm is not None:
         try:
-            client = OpenAI(api_key=api_key, base_url=base_url) if base_url else OpenAI(api_key=api_key)
-            prompt = f"""你是专业的运动营养教练。请基于以下用户数据提供中文的 7 日身材(体脂)控制方案，使用分点与表格化友好格式：\n\nBMI: {bmi} ({category})\n年龄: {data.age}\n性别: {data.gender or '未提供'}\n目标: {data.goal or '未明确'}\n身高: {data.height} cm\n体重: {data.weight} kg\n\n需包含：\n1. 核心策略概述 (热量与宏量素区间)。\n2. 每日样例三餐+加餐 (注明大致热量)。\n3. 训练安排 (力量+有氧频次与示例)。\n4. 恢复与睡眠建议。\n5. 风险与注意事项。\n请简洁分段。"""
-            completion = client.chat.completions.create(
-                model=os.getenv('DEEPSEEK_MODEL', 'deepseek-chat'),
-                messages=[
-                    {"role": "system", "content": "你是专业的营养与训练顾问。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=800
-            )
-            ai_plan = completion.choices[0].message.content.strip()
+            job = request.app.state.plan_jobs.submit((data, bmi, category, suggestion))
+        except plan_jobs.QueueFull as e:
+            raise HTTPException(status_code=503, detail=f"方案生成繁忙: {e}", headers={"Retry-After": "5"})
+        response.status_code = 202
+        return BMIPlanResponse(bmi=bmi, bmi_category=category, suggestion=suggestion, job_id=job.id)
+
+    ai_plan = None
+    if llm is not None:
+        try:
+            ai_plan = await run_in_threadpool(_request_ai_plan, llm, data, bmi, category)
         except Exception as e:
             # 不抛出，返回基础建议即可
             ai_plan = f"AI 方案生成失败: {e}"
 
-    # 如果成功生成了AI方案，则保存到数据库
+    # 如果成功生成了AI方案，则写入缓存并保存到数据库
     if ai_plan and "生成失败" not in ai_plan:
-        database.create_plan(
-            user_id=data.user_id,
-            bmi=bmi,
-            bmi_category=category,
-            suggestion=suggestion,
-            ai_plan=ai_plan
-        )
+        if cache is not None:
+            await run_in_threadpool(cache.put, cache_key, ai_plan)
+        await _save_plan(data, bmi, category, suggestion, ai_plan)
 
     return BMIPlanResponse(bmi=bmi, bmi_category=category, suggestion=suggestion, ai_plan=ai_plan)
 
-@app.get("/users/{user_id}/plans", response_model=list)
-def get_user_plans(user_id: int):
-    """获取指定用户的所有历史方案"""
-    return database.get_plans_by_user_id(user_id)
+@app.post('/bmi/plan/stream')
+async def stream_bmi_plan(data: BMIRequest, request: Request):
+    """以 Server-Sent Events 流式返回方案。
+
+    事件依次为: meta (BMI、分类与基础建议) -> 若干 token ({"delta": 文本片段})
+    -> done ({"plan_id": ..., "cached": ...})；生成失败时以 error ({"detail": ...}) 结束。
+    未配置密钥时 meta 之后直接 done；命中方案缓存时整份方案作为一个 token 发送。
+    完整方案在流结束后才保存到数据库。
+    """
+    try:
+        bmi = _calc_bmi(data.height, data.weight)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    category = _bmi_category(bmi)
+    suggestion = _basic_suggestion(bmi, data.age, data.goal)
+    llm = request.app.state.llm
+    cache = request.app.state.plan_cache
+
+    # 同步生成器由 Starlette 在线程池中逐段迭代，每段到达即发送
+    def events():
+        yield _sse('meta', {"bmi": bmi, "bmi_category": category, "suggestion": suggestion})
+        if llm is None:
+            yield _sse('done', {"plan_id": None, "cached": False})
+            return
+        cache_key = _plan_cache_key(llm, data, bmi)
+        cached_plan = _lookup_cached_plan(cache, cache_key, data)
+        if cached_plan:
+            yield _sse('token', {"delta": cached_plan})
+            plan_id = database.create_plan(**_plan_record(data, bmi, category, suggestion, cached_plan))
+            yield _sse('done', {"plan_id": plan_id, "cached": True})
+            return
+        parts = []
+        try:
+            for delta in _stream_ai_plan(llm, data, bmi, category):
+                parts.append(delta)
+                yield _sse('token', {"delta": delta})
+        except Exception as e:
+            yield _sse('error', {"detail": f"AI 方案生成失败: {e}"})
+            return
+        ai_plan = ''.join(parts).strip()
+        plan_id = None
+        if ai_plan:
+            if cache is not None:
+                cache.put(cache_key, ai_plan)
+            plan_id = database.create_plan(**_plan_record(data, bmi, category, suggestion, ai_plan))
+        yield _sse('done', {"plan_id": plan_id, "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get('/bmi/plan/jobs/{job_id}', response_model=PlanJobStatus)
+async def get_plan_job(job_id: str, request: Request):
+    """查询异步方案任务的状态与结果"""
+    job = request.app.state.plan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    result = job.result or {}
+    return PlanJobStatus(
+        job_id=job.id,
+        status=job.status,
+        ai_plan=result.get('ai_plan'),
+        plan_id=result.get('plan_id'),
+        error=job.error,
+    )
+
+@app.post('/bmi/batch')
+async def bmi_batch_compute(
+    batch: BMIBatchRequest | None = None,
+    source: Literal['records', 'users'] = 'records',
+    format: Literal['ndjson', 'arrow'] = 'ndjson',
+    credentials: HTTPAuthorizationCredentials | None = Depends(_bearer),
+):
+    """批量计算 BMI、分类与基础建议，结果按输入顺序流式返回，每行 {"id", "bmi", "bmi_category", "suggestion"}。
+
+    source=records 时计算请求体 {"records": [...]} 中的记录；
+    source=users 时计算所有已填写身高体重的用户（id 为用户 id），需要管理员令牌，不需要请求体。
+    两种来源中无法计算或超出范围的记录都返回 {"id", "error"}。
+    format=arrow 时以 Arrow IPC 流返回同样的列（外加 error 列）。
+    """
+    stream = None
+    if source == 'users':
+        await require_admin(await current_user(credentials))
+        if format == 'arrow':
+            _require_columnar()
+        stream = await database_async.open_users_stream(
+            ("id", "height", "weight", "age"), batch_size=bmi_batch.BMI_BATCH_CHUNK_SIZE
+        )
+
+        async def chunks():
+            async for rows in stream:
+                # 未填写身高或体重的用户不参与计算；已填写但超出范围的与请求体记录一样返回 {"id", "error"}
+                rows = [row for row in rows if row[1] is not None and row[2] is not None]
+                if rows:
+                    ids, heights, weights, ages = zip(*rows)
+                    yield _bmi_calculator.compute(ids, heights, weights, ages)
+    else:
+        if batch is None:
+            raise HTTPException(status_code=422, detail="source=records 时需要请求体 {\"records\": [...]}")
+        records = batch.records
+
+        async def chunks():
+            for start in range(0, len(records), bmi_batch.BMI_BATCH_CHUNK_SIZE):
+                part = records[start:start + bmi_batch.BMI_BATCH_CHUNK_SIZE]
+                yield _bmi_calculator.compute(
+                    [r.id for r in part], [r.height for r in part], [r.weight for r in part],
+                    [r.age for r in part], [r.goal for r in part],
+                )
+
+    if format == 'arrow':
+        return _columnar_response(chunks(), bmi_batch.COLUMNS, columnar.BMI_BATCH_COLUMN_TYPES, format, stream=stream)
+
+    async def ndjson_chunks():
+        async for rows in chunks():
+            yield b''.join(
+                _dumps({"id": row[0], "error": row[4]} if row[4] is not None else dict(zip(bmi_batch.COLUMNS[:4], row)))
+                + b'\n'
+                for row in rows
+            )
+    return _stream_response(ndjson_chunks(), stream, media_type='application/x-ndjson')
+
+@app.get('/plans/{plan_id}')
+async def read_plan(plan_id: int):
+    """获取单个方案的完整内容（含 ai_plan）"""
+    plan = await database_async.get_plan_by_id(plan_id)
+    if not plan:
+        raise HTTPException(status_code=404, detail="方案未找到")
+    return plan
+
+@app.get('/stats', dependencies=[Depends(require_admin)])
+async def read_stats(days: int = Query(database.STATS_DEFAULT_DAYS, ge=1, le=database.STATS_MAX_DAYS)):
+    """统计看板数据（需要管理员令牌）：用户按年龄段与 BMI 分类（bmi_categories，每个用户计一次）、
+    方案按 BMI 分类（plan_bmi_categories）的计数，以及最近 days 天每天的方案数。
+
+    读取由触发器增量维护的汇总表，耗时与用户、方案总数无关。
+    """
+    return Response(_dumps(await database_async.get_stats(days)), media_type='application/json')
+
+@app.get('/bmi/plan/cache')
+async def get_plan_cache_stats(request: Request):
+    """方案缓存命中统计；未启用缓存时为 null"""
+    cache = request.app.state.plan_cache
+    return cache.stats() if cache is not None else None
+
+@app.get('/llm/metrics')
+async def get_llm_metrics(request: Request):
+    """LLM 客户端指标：在途请求数、请求/失败/重试次数与延迟；未配置密钥时为 null"""
+    llm = request.app.state.llm
+    return llm.metrics() if llm is not None else None
+
+@app.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus 文本格式的指标：请求、SQL 语句、LLM、连接池、写队列与各缓存"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@metrics.register_collector
+def _collect_app_metrics():
+    state = app.state
+    families = metrics.stats_collector(
+        "password_cache", {}, passwords.credential_cache.stats(), ("hits", "misses")
+    )
+    llm = getattr(state, 'llm', None)
+    if llm is not None:
+        families.append(("llm_in_flight", "gauge", "进行中的 LLM 请求数", [({}, llm.metrics()["in_flight"])]))
+    cache = getattr(state, 'plan_cache', None)
+    if cache is not None:
+        families += metrics.stats_collector(
+            "plan_cache", {}, cache.stats(), ("memory_hits", "db_hits", "misses", "writes")
+        )
+    jobs = getattr(state, 'plan_jobs', None)
+    if jobs is not None:
+        families += metrics.stats_collector("plan_jobs", {}, jobs.stats())
+    return families
+
+app.include_router(users_router)
 
 # 删除示例调用代码，避免在导入时就执行外部请求
 
@@ -0,0 +1,141 @@
+"""Streamlit 前端访问 API 的客户端
+
+- 所有请求共用一个 requests.Session（st.cache_resource，进程内所有会话共享），复用 keep-alive 连接；
+- 读接口 get() 的响应放在 st.cache_data 中，API_CACHE_TTL 秒内重跑页面不再请求；
+  post/put/patch/delete 成功后调用 invalidate() 整体清空，保证写入后立即看到新数据；
+- 每次调用的耗时记录在本次页面运行中，render_timings() 在侧边栏显示，便于定位页面渲染时间花在哪里。
+
+缓存的读响应在所有会话之间共享，只应用于不依赖登录身份的公开接口；
+写请求与 stream() 会带上当前会话的访问令牌。
+"""
+import os
+import threading
+import time
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+API_CACHE_TTL = int(os.getenv("API_CACHE_TTL") or 30)
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE") or 16)
+API_TIMEOUT = float(os.getenv("API_TIMEOUT") or 30)
+
+# 缓存函数内部是否真正发出了请求；Streamlit 每个会话的脚本运行在各自线程中
+_local = threading.local()
+
+
+@st.cache_resource
+def session():
+    """进程内共享的 Session；连接池大小按并发会话数设置"""
+    shared = requests.Session()
+    adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE)
+    shared.mount("http://", adapter)
+    shared.mount("https://", adapter)
+    return shared
+
+
+def _auth_headers():
+    token = st.session_state.get('token')
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def _record(method, path, started, cached):
+    timings = st.session_state.setdefault('api_timings', [])
+    timings.append({
+        "请求": f"{method} {path}",
+        "耗时 (ms)": round((time.perf_counter() - started) * 1000, 1),
+        "来源": "缓存" if cached else "网络",
+    })
+
+
+class _Uncached(Exception):
+    """非 2xx 响应：借异常跳出缓存函数，st.cache_data 不缓存抛出异常的调用"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+@st.cache_data(ttl=API_CACHE_TTL, show_spinner=False, max_entries=256)
+def _cached_get(path, params):
+    _local.fetched = True
+    response = session().get(f"{API_URL}{path}", params=params, timeout=API_TIMEOUT)
+    if not response.ok:
+        raise _Uncached(response)
+    return response
+
+
+def get(path, params=None, cache=True):
+    """GET 读接口；cache=False 时绕过缓存直接请求"""
+    started = time.perf_counter()
+    if not cache:
+        response = session().get(f"{API_URL}{path}", params=params, headers=_auth_headers(), timeout=API_TIMEOUT)
+        _record("GET", path, started, False)
+        return response
+    _local.fetched = False
+    try:
+        # 参数排序后作为缓存键，顺序不同的同一请求命中同一条缓存
+        response = _cached_get(path, tuple(sorted((params or {}).items())))
+    except _Uncached as e:
+        response = e.response
+    _record("GET", path, started, not _local.fetched)
+    return response
+
+
+def request(method, path, invalidate=True, **kwargs):
+    """写请求：带上访问令牌，成功后清空读缓存"""
+    started = time.perf_counter()
+    kwargs.setdefault("timeout", API_TIMEOUT)
+    headers = {**_auth_headers(), **kwargs.pop("headers", {})}
+    response = session().request(method, f"{API_URL}{path}", headers=headers, **kwargs)
+    _record(method, path, started, False)
+    if invalidate and response.ok:
+        invalidate_cache()
+    return response
+
+
+def post(path, invalidate=True, **kwargs):
+    return request("POST", path, invalidate, **kwargs)
+
+
+def put(path, **kwargs):
+    return request("PUT", path, **kwargs)
+
+
+def patch(path, **kwargs):
+    return request("PATCH", path, **kwargs)
+
+
+def delete(path, **kwargs):
+    return request("DELETE", path, **kwargs)
+
+
+def stream(method, path, **kwargs):
+    """流式请求，返回未读取正文的响应（调用方用 with 关闭）；耗时记录到收到响应头为止"""
+    started = time.perf_counter()
+    headers = {**_auth_headers(), **kwargs.pop("headers", {})}
+    response = session().request(method, f"{API_URL}{path}", headers=headers, stream=True, **kwargs)
+    _record(method, path, started, False)
+    return response
+
+
+def invalidate_cache():
+    _cached_get.clear()
+
+
+def start_run():
+    """每次页面运行开始时调用：清空上次的耗时记录"""
+    st.session_state['api_timings'] = []
+    st.session_state['run_started'] = time.perf_counter()
+
+
+def render_timings():
+    """在侧边栏显示本次页面运行的各接口耗时与总渲染时间（在脚本末尾调用）"""
+    timings = st.session_state.get('api_timings', [])
+    total = (time.perf_counter() - st.session_state.get('run_started', time.perf_counter())) * 1000
+    api_total = sum(item["耗时 (ms)"] for item in timings)
+    with st.sidebar.expander(f"接口耗时：{len(timings)} 次 / {api_total:.0f} ms，页面 {total:.0f} ms"):
+        if timings:
+            st.dataframe(timings, use_container_width=True, hide_index=True)
+        else:
+            st.caption("本次页面运行没有请求接口")
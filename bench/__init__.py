@@ -0,0 +1 @@
+"""性能基准脚本，均在仓库根目录下以 `python -m bench.<name>` 运行。"""
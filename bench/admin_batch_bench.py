@@ -0,0 +1,60 @@
+"""权限批量修改基准：逐个 PUT + 重新拉取列表 vs 一次 PATCH /users/batch
+
+模拟“管理用户权限”页面修改 --changes 个用户的管理员权限：旧做法每改一个用户发一次
+PUT /users/{id} 再 rerun 拉取 limit=1000 的列表；新做法一次提交全部修改，再拉取一次列表。
+
+用法: python -m bench.admin_batch_bench [--users 1000] [--changes 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--changes", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="admin_batch_bench_"), "bench.db")
+    from fastapi.testclient import TestClient
+
+    import api
+    import database
+    import tokens
+
+    database.init_db()
+
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+            [(f"bench{i:05d}", f"bench{i:05d}@example.com", "secret") for i in range(args.users)],
+        )
+    ids = range(1, args.changes + 1)
+    token, _ = tokens.issue_token(0, is_admin=True)
+    auth = {"Authorization": f"Bearer {token}"}
+
+    with TestClient(api.app) as client:
+        api.app.state.llm = None
+        start = time.perf_counter()
+        for user_id in ids:
+            client.put(f"/users/{user_id}", json={"is_admin": True}, headers=auth).raise_for_status()
+            client.get("/users", params={"limit": 1000}).raise_for_status()
+        per_user = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.patch("/users/batch", json={"updates": [{"id": i, "is_admin": False} for i in ids]},
+                                headers=auth)
+        response.raise_for_status()
+        client.get("/users", params={"limit": 1000}).raise_for_status()
+        batch = time.perf_counter() - start
+
+    print(f"users={args.users} changes={args.changes}")
+    print(f"{'PUT + reload each':<20} {per_user * 1000:>9.1f} ms  ({args.changes * 2} requests)")
+    print(f"{'PATCH /users/batch':<20} {batch * 1000:>9.1f} ms  (2 requests)")
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""用户整表读取基准：JSON 与 Arrow / Parquet 响应在客户端得到 DataFrame 的耗时与传输字节
+
+按 --sizes（默认 10000 100000 1000000）逐级写入用户，每级比较：
+  json pages    按 GET /users?limit=1000 的游标逐页取回，json 解析后拼成 DataFrame
+  ndjson export GET /users/export 一次流式取回，逐行 json.loads 后构造 DataFrame
+  arrow         GET /users?format=arrow，pyarrow.ipc.open_stream(...).read_pandas()
+  parquet       GET /users?format=parquet，pyarrow.parquet.read_table(...).to_pandas()
+时间为从发起请求到得到 DataFrame 的总耗时（取 --iterations 次的中位数），经 TestClient 在本进程内请求。
+
+用法: python -m bench.arrow_bench [--sizes 10000 100000 1000000] [--iterations 3]
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def _measure(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--max-pages-size", type=int, default=100000,
+                        help="超过该行数时跳过逐页 JSON（每页一次请求，过慢）")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="arrow_bench_"), "bench.db")
+    os.environ["USERS_CACHE_SIZE"] = "0"
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from fastapi.testclient import TestClient
+
+    import api
+    import database
+    import passwords
+
+    database.init_db()
+
+    stored = passwords.hash_password("secret")
+
+    def fill(start, stop):
+        with database.connection() as conn:
+            conn.executemany(
+                "INSERT INTO users (username, email, password, remark, height, weight, age) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((f"user{i:07d}", f"user{i:07d}@example.com", stored, "普通用户", 150 + i % 50, 45 + i % 60, 18 + i % 50)
+                 for i in range(start, stop)),
+            )
+
+    with TestClient(api.app) as client:
+        def json_pages():
+            frames, params, received = [], {"after_id": 0, "limit": database.MAX_PAGE_SIZE}, 0
+            while True:
+                response = client.get("/users", params=params)
+                response.raise_for_status()
+                received += len(response.content)
+                page = response.json()
+                frames.append(pd.DataFrame(page["items"]))
+                if not page["next_cursor"]:
+                    return pd.concat(frames, ignore_index=True), received
+                params = {"cursor": page["next_cursor"], "limit": database.MAX_PAGE_SIZE}
+
+        def ndjson_export():
+            response = client.get("/users/export")
+            response.raise_for_status()
+            records = [json.loads(line) for line in response.text.splitlines()]
+            return pd.DataFrame(records), len(response.content)
+
+        def arrow():
+            response = client.get("/users", params={"format": "arrow"})
+            response.raise_for_status()
+            return pa.ipc.open_stream(response.content).read_pandas(), len(response.content)
+
+        def parquet():
+            response = client.get("/users", params={"format": "parquet"})
+            response.raise_for_status()
+            return pq.read_table(io.BytesIO(response.content)).to_pandas(), len(response.content)
+
+        print(f"{'rows':>9} {'path':<14} {'ms':>10} {'MiB':>8} {'rows/s':>12}")
+        filled = 0
+        for size in sorted(args.sizes):
+            fill(filled, size)
+            filled = size
+            paths = [("ndjson export", ndjson_export), ("arrow", arrow), ("parquet", parquet)]
+            if size <= args.max_pages_size:
+                paths.insert(0, ("json pages", json_pages))
+            for name, fn in paths:
+                ms, (frame, received) = _measure(fn, args.iterations)
+                assert len(frame) == size, (name, len(frame))
+                print(f"{size:>9} {name:<14} {ms:>10.1f} {received / 2**20:>8.2f} {size / ms * 1000:>12.0f}",
+                      flush=True)
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""同步 vs 异步数据访问的负载基准
+
+分别用 uvicorn 启动两个只含读接口的最小应用：
+  sync  —— def 端点调用 database（在 Starlette 线程池中执行，默认最多 40 个线程）
+  async —— async def 端点调用 database_async（aiosqlite 连接池，不占线程池）
+再用独立进程中的轻量 HTTP/1.1 客户端保持 --connections 个长连接并发请求
+GET /users/{id} 与 GET /users/search，统计 RPS 与延迟。
+
+用法: python -m bench.async_bench [--users 20000] [--connections 1000] [--duration 10]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _build_app(mode):
+    from fastapi import FastAPI
+
+    import database
+
+    app = FastAPI()
+    if mode == "sync":
+        @app.get("/users/search")
+        def search(query: str):
+            return database.search_users(query, limit=20)
+
+        @app.get("/users/{user_id}")
+        def read_user(user_id: int):
+            return database.get_user_by_id(user_id)
+    else:
+        import database_async
+
+        @app.get("/users/search")
+        async def search(query: str):
+            return await database_async.search_users(query, limit=20)
+
+        @app.get("/users/{user_id}")
+        async def read_user(user_id: int):
+            return await database_async.get_user_by_id(user_id)
+    return app
+
+
+def _serve(mode, port):
+    import uvicorn
+
+    uvicorn.run(_build_app(mode), host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+async def _client(port, connections, duration, users):
+    latencies = []
+    errors = 0
+    deadline = None
+    rng = random.Random(7)
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        while time.perf_counter() < deadline:
+            if rng.random() < 0.5:
+                path = f"/users/{rng.randrange(1, users + 1)}"
+            else:
+                path = f"/users/search?query=user{rng.randrange(users):06d}"
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            if not head.startswith(b"HTTP/1.1 200"):
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+        writer.close()
+
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    results = await asyncio.gather(*(worker() for _ in range(connections)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    return len(latencies) / elapsed, latencies, errors, failed
+
+
+def _wait_for_port(port, timeout=30):
+    import socket
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"服务未在 {timeout}s 内启动")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", choices=["sync", "async"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.serve, args.port)
+        return
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="async_bench_"), "bench.db")
+    os.environ["DATABASE_PATH"] = db_path
+    import database
+
+    database.init_db()
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+            [(f"user{i:06d}", f"user{i:06d}@example.com", "x") for i in range(args.users)],
+        )
+    database.close_pool()
+
+    print(f"users={args.users} connections={args.connections} duration={args.duration}s")
+    print(f"{'mode':>6} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode in ("sync", "async"):
+        server = subprocess.Popen(
+            [sys.executable, "-m", "bench.async_bench", "--serve", mode, "--port", str(args.port)],
+            env=dict(os.environ, DATABASE_PATH=db_path),
+        )
+        try:
+            _wait_for_port(args.port)
+            rps, latencies, errors, failed = asyncio.run(
+                _client(args.port, args.connections, args.duration, args.users)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+        print(f"{mode:>6} {rps:>8.0f} {statistics.median(latencies) if latencies else 0:>8.1f} {p99:>8.1f} "
+              f"{errors + failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""认证开销基准
+
+1. tokens.verify_token 单次校验耗时（纯 HMAC + base64 + JSON，不查库）。
+2. 每请求开销：同一个管理员接口 (PATCH /users/batch，空操作更新) 分别
+   - 不经认证直接调用（基线，临时去掉依赖）；
+   - 携带 Bearer 令牌；
+   - 旧做法：每次先 POST /login 再调用（冷启动时需计算 KDF，之后命中校验缓存）。
+
+用法: python -m bench.auth_bench [--requests 500]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import timeit
+
+
+def _timed(fn, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="auth_bench_"), "bench.db")
+    from fastapi.testclient import TestClient
+
+    import api
+    import database
+    import passwords
+    import tokens
+
+    database.init_db()
+
+    token, _ = tokens.issue_token(1, is_admin=True)
+    loops = 100000
+    per_call = timeit.timeit(lambda: tokens.verify_token(token), number=loops) / loops
+    print(f"verify_token: {per_call * 1e6:.2f} µs/call")
+
+    with database.connection() as conn:
+        conn.execute(
+            "INSERT INTO users (username, email, password, is_admin) VALUES (?, ?, ?, 1)",
+            ("admin", "admin@example.com", passwords.hash_password("secret")),
+        )
+    body = {"updates": [{"id": 1, "remark": "bench"}]}
+    auth = {"Authorization": f"Bearer {token}"}
+    login = {"email": "admin@example.com", "password": "secret"}
+
+    with TestClient(api.app) as client:
+        api.app.state.llm = None
+
+        def with_token():
+            client.patch("/users/batch", json=body, headers=auth).raise_for_status()
+
+        def with_login():
+            client.post("/login", json=login).raise_for_status()
+            client.patch("/users/batch", json=body, headers=auth).raise_for_status()
+
+        api.app.dependency_overrides[api.require_admin] = lambda: {"sub": 1, "adm": True}
+        baseline = _timed(with_token, args.requests)
+        api.app.dependency_overrides.clear()
+        bearer = _timed(with_token, args.requests)
+        relogin = _timed(with_login, args.requests)
+
+    print(f"{'mode':<22} {'p50 ms':>8}")
+    print(f"{'no auth (baseline)':<22} {baseline:>8.3f}")
+    print(f"{'bearer token':<22} {bearer:>8.3f}  (+{(bearer - baseline) * 1000:.0f} µs)")
+    print(f"{'/login + request':<22} {relogin:>8.3f}")
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
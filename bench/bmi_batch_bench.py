@@ -0,0 +1,84 @@
+"""批量 BMI 基准：逐条调用 _calc_bmi/_bmi_category/_basic_suggestion 与 NumPy 向量化计算的对比
+
+1. 函数级：--rows 条随机记录（默认 1000000），逐条计算与 BMICalculator.compute 的耗时，并核对两者结果一致；
+2. 接口级：写入 --users 个带身高体重的用户，POST /bmi/batch?source=users 流式读取全部结果，
+   分别在向量化与退回逐条计算（模拟未安装 numpy）时计时。
+
+用法: python -m bench.bmi_batch_bench [--rows 1000000] [--users 1000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000000)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bmi_batch_bench_"), "bench.db")
+    from fastapi.testclient import TestClient
+
+    import api
+    import bmi_batch
+    import database
+    import tokens
+
+    database.init_db()
+
+    rng = random.Random(0)
+    ids = list(range(args.rows))
+    heights = [round(rng.gauss(168, 9), 1) for _ in ids]
+    weights = [round(max(35.0, rng.gauss(65, 14)), 1) for _ in ids]
+    ages = [rng.randint(16, 80) for _ in ids]
+    goals = [rng.choice(("fat_loss", "muscle_gain", "recomposition", None)) for _ in ids]
+
+    def scalar():
+        rows = []
+        for record_id, height, weight, age, goal in zip(ids, heights, weights, ages, goals):
+            bmi = api._calc_bmi(height, weight)
+            rows.append((record_id, bmi, api._bmi_category(bmi), api._basic_suggestion(bmi, age, goal), None))
+        return rows
+
+    scalar_seconds, expected = _timed(scalar)
+    vector_seconds, actual = _timed(lambda: api._bmi_calculator.compute(ids, heights, weights, ages, goals))
+    assert actual == expected, "向量化结果与逐条计算不一致"
+    print(f"{'function (' + str(args.rows) + ' rows)':<32} {'seconds':>8} {'rows/s':>12}")
+    for name, seconds in (("scalar loop", scalar_seconds), ("numpy vectorized", vector_seconds)):
+        print(f"{name:<32} {seconds:>8.3f} {args.rows / seconds:>12.0f}")
+
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password, height, weight, age) VALUES (?, ?, ?, ?, ?, ?)",
+            ((f"user{i:07d}", f"user{i:07d}@example.com", "x", heights[i % args.rows], weights[i % args.rows],
+              ages[i % args.rows]) for i in range(args.users)),
+        )
+    token, _ = tokens.issue_token(1, True)
+    print(f"\n{'POST /bmi/batch?source=users':<32} {'seconds':>8} {'rows/s':>12} {'MiB':>8}")
+    with TestClient(api.app) as client:
+        for name, numpy_available in (("numpy vectorized", True), ("scalar fallback", False)):
+            bmi_batch._numpy_available = numpy_available
+            for format in ("ndjson", "arrow"):
+                def request():
+                    response = client.post(f"/bmi/batch?source=users&format={format}",
+                                           headers={"Authorization": f"Bearer {token}"})
+                    response.raise_for_status()
+                    return response
+                seconds, response = _timed(request)
+                print(f"{name + ' / ' + format:<32} {seconds:>8.3f} {args.users / seconds:>12.0f} "
+                      f"{len(response.content) / 2**20:>8.1f}", flush=True)
+        bmi_batch._numpy_available = True
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
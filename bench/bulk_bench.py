@@ -0,0 +1,79 @@
+"""批量导入/导出基准
+
+对比逐个 POST /users 与 POST /users/bulk（NDJSON 流式上传）导入用户的速度，
+再用 GET /users/export 流式导出全部用户。全部在进程内通过 ASGI 调用完成。
+批量导入的密码是预先算好的 scrypt 哈希（迁移场景，原样写入）；逐个 POST 的用户每个都要计算一次 KDF。
+
+用法: python -m bench.bulk_bench [--users 100000] [--single 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+
+def _ndjson_chunks(prefix, count, password, chunk_rows=2000):
+    for start in range(0, count, chunk_rows):
+        yield "".join(
+            json.dumps({"username": f"{prefix}{i}", "email": f"{prefix}{i}@example.com",
+                        "password": password, "age": 20 + i % 50}) + "\n"
+            for i in range(start, min(count, start + chunk_rows))
+        ).encode()
+
+
+async def _run(api, users, single):
+    import httpx
+
+    import passwords
+    import tokens
+
+    auth = {"Authorization": f"Bearer {tokens.issue_token(0, is_admin=True)[0]}"}
+    password_hash = passwords.hash_password("secret")
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.app.router.lifespan_context(api.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            for i in range(single):
+                await client.post("/users", json={
+                    "username": f"single{i}", "email": f"single{i}@example.com", "password": "secret"})
+            single_rate = single / (time.perf_counter() - start)
+            print(f"POST /users      {single:>8} users  {single_rate:>10.0f} users/s")
+
+            async def body():
+                for chunk in _ndjson_chunks("bulk", users, password_hash):
+                    yield chunk
+
+            start = time.perf_counter()
+            response = await client.post("/users/bulk", content=body(),
+                                         headers={"Content-Type": "application/x-ndjson", **auth})
+            elapsed = time.perf_counter() - start
+            result = response.json()
+            print(f"POST /users/bulk {result['inserted']:>8} users  {result['inserted'] / elapsed:>10.0f} users/s"
+                  f"  ({elapsed:.2f}s, failed={result['failed']})")
+
+            start = time.perf_counter()
+            rows = 0
+            async with client.stream("GET", "/users/export") as response:
+                async for line in response.aiter_lines():
+                    if line:
+                        rows += 1
+            elapsed = time.perf_counter() - start
+            print(f"GET /users/export{rows:>8} users  {rows / elapsed:>10.0f} users/s  ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--single", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bulk_bench_"), "bench.db")
+    import api
+
+    asyncio.run(_run(api, args.users, args.single))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""并发读写基准：N 个读线程 + M 个写线程同时访问同一个数据库
+
+对比两种存储配置（每种配置在独立子进程中运行，避免模块级配置互相影响）：
+  legacy : 回滚日志 (journal_mode=DELETE)，各线程直接在自己的连接上写
+  wal    : WAL + 调优 PRAGMA + 单写线程合并事务
+
+用法: python -m bench.concurrency_bench [--readers 8] [--writers 8] [--seconds 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CONFIGS = {
+    "legacy": {"DATABASE_JOURNAL_MODE": "DELETE", "DATABASE_SYNCHRONOUS": "FULL", "DATABASE_WRITE_QUEUE": "0"},
+    "wal": {"DATABASE_JOURNAL_MODE": "WAL", "DATABASE_SYNCHRONOUS": "NORMAL", "DATABASE_WRITE_QUEUE": "1"},
+}
+
+
+def _child(readers, writers, seconds, seed_users):
+    import database
+
+    database.init_db()
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+            [(f"seed{i}", f"seed{i}@example.com", "x") for i in range(seed_users)],
+        )
+
+    counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        while time.perf_counter() < deadline:
+            try:
+                database.get_all_users(skip=0, limit=20)
+                bump("reads")
+            except Exception:
+                bump("read_errors")
+
+    def writer(wid):
+        n = 0
+        while time.perf_counter() < deadline:
+            n += 1
+            try:
+                new_id = database.create_user(f"w{wid}_{n}", f"w{wid}_{n}@example.com", "x")
+                database.update_user(new_id, remark="bench")
+                bump("writes")
+            except Exception:
+                bump("write_errors")
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    database.close_pool()
+    counts["reads_per_sec"] = counts["reads"] / elapsed
+    counts["writes_per_sec"] = counts["writes"] / elapsed
+    print(json.dumps(counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed-users", type=int, default=1000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.readers, args.writers, args.seconds, args.seed_users)
+        return
+
+    print(f"readers={args.readers} writers={args.writers} seconds={args.seconds}")
+    print(f"{'config':>8} {'reads/s':>10} {'writes/s':>10} {'read err':>9} {'write err':>10}")
+    for name, overrides in CONFIGS.items():
+        tmpdir = tempfile.mkdtemp(prefix="concurrency_bench_")
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmpdir, "bench.db"), **overrides)
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.concurrency_bench", "--child",
+             "--readers", str(args.readers), "--writers", str(args.writers),
+             "--seconds", str(args.seconds), "--seed-users", str(args.seed_users)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{name:>8} {r['reads_per_sec']:>10.0f} {r['writes_per_sec']:>10.0f} "
+              f"{r['read_errors']:>9} {r['write_errors']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""本地假 OpenAI 兼容服务，用于在不调用真实 LLM 的情况下测试和压测方案生成
+
+用法:
+    python -m bench.fake_llm --port 9999 --delay 2
+    DEEPSEEK_BASE_URL=http://127.0.0.1:9999/v1 DEEPSEEK_API_KEY=test uvicorn api:app
+
+也可在脚本中调用 start_fake_llm() 在后台线程启动。
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "## 核心策略\n每日热量缺口 300~500kcal，蛋白 1.6g/kg。\n\n## 训练安排\n每周 3 次力量 + 2 次有氧。"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，便于观察客户端连接复用
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # 统计 TCP 连接数：客户端复用连接时远少于请求数
+        self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        self.server.requests += 1
+        reply = self.server.reply
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            self._send_stream(reply, body.get("model", "fake"), include_usage)
+            return
+        time.sleep(self.server.delay)
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": len(reply), "total_tokens": 100 + len(reply)},
+        })
+
+    def _send_stream(self, reply, model, include_usage=False):
+        # 以 chunked 编码逐段发送 SSE，总耗时仍为 delay
+        pieces = [reply[i:i + 8] for i in range(0, len(reply), 8)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for piece in pieces:
+            time.sleep(self.server.delay / len(pieces))
+            self._write_chunk("data: " + json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }, ensure_ascii=False) + "\n\n")
+        if include_usage:
+            self._write_chunk("data: " + json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": {"prompt_tokens": 100, "completion_tokens": len(reply), "total_tokens": 100 + len(reply)},
+            }) + "\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake_llm(delay=0.0, reply=DEFAULT_REPLY, host="127.0.0.1", port=0):
+    """在后台线程启动假服务，返回 (server, base_url)；用完调用 server.shutdown()"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.reply = reply
+    server.requests = 0
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--delay", type=float, default=1.0, help="每个请求的模拟生成耗时（秒）")
+    args = parser.parse_args()
+    server, base_url = start_fake_llm(args.delay, host=args.host, port=args.port)
+    print(f"fake LLM listening on {base_url} (delay={args.delay}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""前端请求方式基准：每次新建连接 与 共享连接池 (keep-alive) 请求同一组读接口的耗时对比
+
+子进程启动 uvicorn api:app，模拟 Streamlit 用户列表页一次重跑发出的请求
+（GET /users/count、GET /users?limit=20&format=arrow、GET /users/1/plans?limit=10&summary=true），
+分别以每次新建连接与共享 httpx.Client 的方式重复 --runs 次，记录每次重跑的 p50。
+前端用的是 requests.Session，连接复用的效果与此相同。
+
+用法: python -m bench.keepalive_bench [--users 2000] [--runs 200]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import seed
+from bench.loadtest import _free_port, _wait_for_port
+
+PAGE_REQUESTS = (
+    ("/users/count", None),
+    ("/users", {"after_id": 0, "limit": 20, "format": "arrow"}),
+    ("/users/1/plans", {"limit": 10, "summary": "true"}),
+)
+
+
+def _page_p50(get, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for path, params in PAGE_REQUESTS:
+            get(path, params).raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--plans", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    import httpx
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="keepalive_bench_"), "bench.db")
+    seed.seed_database(args.users, args.plans)
+    import database
+    database.close_pool()
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env=os.environ.copy(),
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        _wait_for_port(port)
+        fresh = _page_p50(lambda path, params: httpx.get(base + path, params=params), args.runs)
+        with httpx.Client(base_url=base) as client:
+            pooled = _page_p50(lambda path, params: client.get(path, params=params), args.runs)
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"{'client':<24} {'page p50 ms':>12}")
+    print(f"{'new connection per call':<24} {fresh:>12.2f}")
+    print(f"{'shared pool (keep-alive)':<24} {pooled:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
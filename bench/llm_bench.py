@@ -0,0 +1,61 @@
+"""LLM 客户端基准：每次新建客户端 vs 共享连接池的长连接客户端
+
+对本地假 LLM（每次耗时 --delay 秒）用 --threads 个线程发出 --requests 个请求，
+统计吞吐和假服务端实际建立的 TCP 连接数。共享客户端的吞吐随连接池大小增长，
+连接数约等于池大小而不是请求数。
+
+用法: python -m bench.llm_bench [--requests 400] [--threads 32] [--delay 0.05] [--pools 1 4 16 32]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_llm import start_fake_llm
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def _run(call, requests, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: call(), range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--pools", type=int, nargs="+", default=[1, 4, 16, 32])
+    args = parser.parse_args()
+
+    from openai import OpenAI
+
+    import llm_client
+
+    server, base_url = start_fake_llm(delay=args.delay)
+    print(f"requests={args.requests} threads={args.threads} llm_delay={args.delay}s")
+    print(f"{'client':>16} {'req/s':>8} {'connections':>12}")
+
+    def per_call():
+        # 引入共享客户端之前的写法：每次请求新建 OpenAI 客户端
+        client = OpenAI(api_key="test", base_url=base_url)
+        client.chat.completions.create(model="fake", messages=MESSAGES)
+        client.close()
+
+    server.connections = 0
+    rps = _run(per_call, args.requests, args.threads)
+    print(f"{'new per request':>16} {rps:>8.0f} {server.connections:>12}")
+
+    for pool_size in args.pools:
+        client = llm_client.LLMClient("test", base_url=base_url, model="fake", pool_size=pool_size)
+        server.connections = 0
+        rps = _run(lambda: client.chat(MESSAGES), args.requests, args.threads)
+        print(f"{f'pooled ({pool_size})':>16} {rps:>8.0f} {server.connections:>12}")
+        client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
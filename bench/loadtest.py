@@ -0,0 +1,305 @@
+"""场景化负载测试：生成种子数据，按场景以固定并发压测，输出可在提交之间对比的 JSON 报告
+
+场景（--scenarios，默认全部）：
+  list    GET /users?after_id=...&limit=20
+  search  GET /users/search?query=<种子词表中的词>
+  get     GET /users/{id}
+  login   POST /login（种子用户，密码种类有限，多数命中校验缓存）
+  create  POST /users（每次新用户，需计算一次 scrypt）
+  plan    POST /bmi/plan，LLM 由 bench.fake_llm 模拟（--llm-delay 秒），默认关闭方案缓存
+两种运行方式（--mode）：
+  inproc   httpx.ASGITransport 在本进程内驱动应用，不经网络
+  uvicorn  子进程启动 uvicorn api:app，经本机 TCP 请求
+每个场景运行 --duration 秒，记录吞吐、延迟分位数、错误数与应用进程的内存 (RSS)。
+
+用法:
+  python -m bench.loadtest [--mode inproc uvicorn] [--concurrency 16] [--duration 5] [--output report.json]
+  python -m bench.loadtest --compare old.json new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from bench import seed
+from bench.fake_llm import start_fake_llm
+
+SCENARIOS = ("list", "search", "get", "login", "create", "plan")
+MODES = ("inproc", "uvicorn")
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def _request_factory(name, config, run_id):
+    """返回 make(rng, i) -> (method, path, kwargs)"""
+    users = config["users"]
+    if name == "list":
+        return lambda rng, i: ("GET", "/users", {"params": {"after_id": rng.randrange(users), "limit": 20}})
+    if name == "search":
+        words = seed.WORDS + seed.ANIMALS
+        return lambda rng, i: ("GET", "/users/search", {"params": {"query": rng.choice(words), "limit": 20}})
+    if name == "get":
+        return lambda rng, i: ("GET", f"/users/{rng.randrange(1, users + 1)}", {})
+    if name == "login":
+        def make(rng, i):
+            index = rng.randrange(users)
+            return "POST", "/login", {"json": {
+                "email": seed.email_for(index), "password": seed.password_for(index)}}
+        return make
+    if name == "create":
+        return lambda rng, i: ("POST", "/users", {"json": {
+            "username": f"load{run_id}_{i}", "email": f"load{run_id}_{i}@example.com", "password": "load-secret"}})
+    if name == "plan":
+        return lambda rng, i: ("POST", "/bmi/plan", {"json": {
+            "height": rng.randint(150, 195), "weight": rng.randint(45, 110), "age": rng.randint(18, 65),
+            "goal": rng.choice(seed.GOALS), "user_id": rng.randrange(1, users + 1)}})
+    raise ValueError(f"未知场景: {name}")
+
+
+async def _run_scenario(client, name, config, run_id, rss):
+    make = _request_factory(name, config, run_id)
+    latencies = []
+    errors = 0
+    counter = 0
+    deadline = time.perf_counter() + config["duration"]
+
+    async def worker(worker_id):
+        nonlocal errors, counter
+        rng = random.Random(f"{name}:{worker_id}")
+        while time.perf_counter() < deadline:
+            counter += 1
+            method, path, kwargs = make(rng, counter)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(config["concurrency"])))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round((len(latencies) - errors) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50), 3),
+        "p90_ms": round(_percentile(latencies, 0.90), 3),
+        "p99_ms": round(_percentile(latencies, 0.99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        "rss_mb": rss(),
+    }
+
+
+def _rss_mb(pid="self"):
+    """当前常驻内存 (MiB)，读取 /proc；不可用时返回 None"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_mb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid == "self":
+        # Linux 下 ru_maxrss 单位为 KiB，macOS 为字节
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return None
+
+
+async def _run_inproc(config):
+    import httpx
+
+    import api
+
+    results = {}
+    async with api.app.router.lifespan_context(api.app):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            for name in config["scenarios"]:
+                results[name] = await _run_scenario(client, name, config, "inproc", _rss_mb)
+                _print_row("inproc", name, results[name])
+    return results, _peak_rss_mb()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"uvicorn 未在 {timeout}s 内启动")
+
+
+async def _run_uvicorn(config):
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env=os.environ.copy(),
+    )
+    results = {}
+    try:
+        _wait_for_port(port)
+        limits = httpx.Limits(max_connections=config["concurrency"], max_keepalive_connections=config["concurrency"])
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            for name in config["scenarios"]:
+                results[name] = await _run_scenario(
+                    client, name, config, f"uvicorn{port}", lambda: _rss_mb(server.pid)
+                )
+                _print_row("uvicorn", name, results[name])
+        peak = _peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    return results, peak
+
+
+def _print_row(mode, name, result):
+    print(f"{mode:<8} {name:<7} {result['rps']:>9.1f} {result['p50_ms']:>8.2f} {result['p90_ms']:>8.2f} "
+          f"{result['p99_ms']:>8.2f} {result['errors']:>7} {result['rss_mb'] or 0:>8.1f}", flush=True)
+
+
+def _git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(old_path, new_path):
+    """逐个 (方式, 场景) 对比两份报告的吞吐与 p99"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old: {old['meta'].get('commit')}  new: {new['meta'].get('commit')}")
+    print(f"{'mode':<8} {'scenario':<8} {'rps old':>9} {'rps new':>9} {'Δ%':>7} {'p99 old':>9} {'p99 new':>9} {'Δ%':>7}")
+    for mode, scenarios in new["results"].items():
+        for name, result in scenarios.items():
+            before = old["results"].get(mode, {}).get(name)
+            if before is None:
+                continue
+            rps_delta = (result["rps"] / before["rps"] - 1) * 100 if before["rps"] else 0.0
+            p99_delta = (result["p99_ms"] / before["p99_ms"] - 1) * 100 if before["p99_ms"] else 0.0
+            print(f"{mode:<8} {name:<8} {before['rps']:>9.1f} {result['rps']:>9.1f} {rps_delta:>+7.1f} "
+                  f"{before['p99_ms']:>9.2f} {result['p99_ms']:>9.2f} {p99_delta:>+7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", nargs="+", choices=MODES, default=["inproc"])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--plans", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5, help="每个场景运行的秒数")
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="假 LLM 每次生成的耗时（秒）")
+    parser.add_argument("--plan-cache", action="store_true", help="开启方案缓存（默认关闭以测完整生成路径）")
+    parser.add_argument("--output", help="JSON 报告路径")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两份报告后退出")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="loadtest_"), "bench.db")
+    server, llm_url = start_fake_llm(args.llm_delay)
+    os.environ.update(
+        DATABASE_PATH=db_path,
+        DEEPSEEK_BASE_URL=llm_url,
+        DEEPSEEK_API_KEY="loadtest",
+        PLAN_CACHE_ENABLED="1" if args.plan_cache else "0",
+    )
+    os.environ.pop("OPENAI_API_KEY", None)
+
+    start = time.perf_counter()
+    seed.seed_database(args.users, args.plans)
+    # 种子数据由本进程的连接池写入；uvicorn 子进程与后续请求各自重新建连
+    import database
+    database.close_pool()
+    print(f"seeded {args.users} users / {args.plans} plans in {time.perf_counter() - start:.1f}s")
+
+    config = {
+        "users": args.users,
+        "plans": args.plans,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "llm_delay": args.llm_delay,
+        "plan_cache": args.plan_cache,
+        "scenarios": args.scenarios,
+    }
+    results = {}
+    memory = {}
+    print(f"{'mode':<8} {'scenario':<7} {'rps':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'errors':>7} {'rss MiB':>8}")
+    try:
+        # uvicorn 先跑：in-process 模式会把应用导入本进程，影响本进程的内存读数
+        for mode in sorted(args.mode, key=MODES.index, reverse=True):
+            runner = _run_uvicorn if mode == "uvicorn" else _run_inproc
+            results[mode], peak = asyncio.run(runner(config))
+            memory[mode] = {"peak_rss_mb": peak}
+    finally:
+        server.shutdown()
+
+    commit, dirty = _git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "results": results,
+        "memory": memory,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""登录基准：scrypt 校验在进程池中计算时的吞吐，以及事件循环是否仍能及时响应其他请求
+
+先以 --concurrency 个并发请求登录 --users 个不同用户（每次都要计算 KDF），同时每 10ms 请求一次
+GET /users/count 作为探针；再把同一批登录重复一遍，此时应命中校验缓存。
+
+用法: python -m bench.login_bench [--users 200] [--concurrency 32] [--workers N]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def _login_round(client, users, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login(i):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/login", json={"email": f"bench{i:05d}@example.com", "password": f"pw{i}"})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    probes = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/users/count")
+            probes.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.01)
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+    return elapsed, latencies, probes
+
+
+async def _run(api, users, concurrency):
+    import httpx
+
+    import database
+    import passwords
+
+    async with api.app.router.lifespan_context(api.app):
+        hashes = await passwords.hash_passwords_async([f"pw{i}" for i in range(users)])
+        with database.connection() as conn:
+            conn.executemany(
+                "INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+                [(f"bench{i:05d}", f"bench{i:05d}@example.com", hashes[i]) for i in range(users)],
+            )
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            print(f"users={users} concurrency={concurrency} workers={passwords.PASSWORD_HASH_WORKERS}")
+            print(f"{'round':>6} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'probe p50':>10} {'probe max':>10}")
+            for name in ("cold", "cached"):
+                elapsed, latencies, probes = await _login_round(client, users, concurrency)
+                print(f"{name:>6} {users / elapsed:>9.0f} {statistics.median(latencies):>8.1f} "
+                      f"{_percentile(latencies, 0.99):>8.1f} {statistics.median(probes):>10.1f} {max(probes):>10.1f}")
+            print(f"credential cache: {passwords.credential_cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None, help="PASSWORD_HASH_WORKERS，0 为线程计算")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="login_bench_"), "bench.db")
+    if args.workers is not None:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    import api
+
+    asyncio.run(_run(api, args.users, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
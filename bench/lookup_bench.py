@@ -0,0 +1,65 @@
+"""用户选择下拉框基准：GET /users?limit=1000&fields=id,username 与 GET /users/lookup?prefix= 的对比
+
+写入 --users 个用户后（关闭用户读缓存）记录：
+1. 接口级：旧下拉框整页加载与各长度前缀联想请求的 p50 与响应字节数；
+2. 语句级：前缀查找走 NOCASE 索引范围扫描，与禁用索引 (NOT INDEXED) 的 LIKE 'prefix%' 全表扫描的 p50。
+
+用法: python -m bench.lookup_bench [--users 100000] [--iterations 200]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def _p50(fn, iterations):
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="lookup_bench_"), "bench.db")
+    os.environ["USERS_CACHE_SIZE"] = "0"
+    from fastapi.testclient import TestClient
+
+    import api
+    import database
+    from bench import seed
+
+    seed.seed_database(args.users, 0)
+    prefixes = ("s", "seed0012", "seed001234", "Seed000042_", "zz")
+
+    print(f"{'endpoint':<44} {'p50 ms':>8} {'bytes':>8}")
+    with TestClient(api.app) as client:
+        paths = ["/users?limit=1000&fields=id,username"] + [f"/users/lookup?prefix={p}&limit=20" for p in prefixes]
+        for path in paths:
+            def request():
+                response = client.get(path)
+                response.raise_for_status()
+                return response
+            print(f"{path:<44} {_p50(request, args.iterations):>8.2f} {len(request().content):>8}")
+
+    print(f"\n{'statement':<44} {'p50 ms':>8}")
+    with database.connection() as conn:
+        for prefix in prefixes:
+            indexed = database._lookup_statement(prefix, 20)
+            scan = ("SELECT id, username FROM users NOT INDEXED WHERE username LIKE ?1 OR email LIKE ?1 "
+                    "ORDER BY username COLLATE NOCASE LIMIT 20", (prefix + "%",))
+            for name, (sql, params) in ((f"index range '{prefix}'", indexed), (f"LIKE scan '{prefix}'", scan)):
+                print(f"{name:<44} {_p50(lambda: conn.execute(sql, params).fetchall(), args.iterations):>8.2f}")
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
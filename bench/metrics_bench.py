@@ -0,0 +1,99 @@
+"""指标采集开销基准
+
+1. 单条语句：同一查询 (SELECT * FROM users WHERE id = ? + fetchone) 分别在原生 sqlite3.Connection
+   与 db_metrics.TimedConnection 上执行，比较每次耗时。
+2. 单个请求：在子进程中分别以 METRICS_ENABLED=1/0 启动应用，用 TestClient 请求 GET /users/{id}
+   （中间件 + 一条计时语句），比较 p50；最后输出一次 /metrics 的大小与生成耗时。
+
+用法: python -m bench.metrics_bench [--users 10000] [--requests 3000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _statement_cost(db_path, factory, count):
+    conn = sqlite3.connect(db_path, factory=factory)
+    conn.row_factory = sqlite3.Row
+    rng = random.Random(1)
+    ids = [rng.randrange(1, 10000) for _ in range(count)]
+    start = time.perf_counter()
+    for user_id in ids:
+        conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed / count * 1e6
+
+
+def _request_run(users, requests):
+    """子进程：按当前环境变量启动应用并输出 JSON 结果"""
+    from fastapi.testclient import TestClient
+
+    import api
+
+    rng = random.Random(2)
+    samples = []
+    with TestClient(api.app) as client:
+        for _ in range(requests):
+            path = f"/users/{rng.randrange(1, users + 1)}"
+            start = time.perf_counter()
+            client.get(path).raise_for_status()
+            samples.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        body = client.get("/metrics").text
+        render_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({"p50": statistics.median(samples), "metrics_bytes": len(body), "render_ms": render_ms}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _request_run(args.users, args.requests)
+        return
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="metrics_bench_"), "bench.db")
+    os.environ["DATABASE_PATH"] = db_path
+    import database
+    import db_metrics
+
+    database.init_db()
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+            [(f"user{i:06d}", f"user{i:06d}@example.com", "x") for i in range(args.users)],
+        )
+    database.close_pool()
+
+    loops = 50000
+    plain = min(_statement_cost(db_path, sqlite3.Connection, loops) for _ in range(3))
+    timed = min(_statement_cost(db_path, db_metrics.TimedConnection, loops) for _ in range(3))
+    print(f"statement  plain {plain:6.2f} µs  timed {timed:6.2f} µs  (+{timed - plain:.2f} µs)")
+
+    results = {}
+    for enabled in ("0", "1"):
+        output = subprocess.run(
+            [sys.executable, "-m", "bench.metrics_bench", "--child",
+             "--users", str(args.users), "--requests", str(args.requests)],
+            env=dict(os.environ, DATABASE_PATH=db_path, METRICS_ENABLED=enabled),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        results[enabled] = json.loads(output.strip().splitlines()[-1])
+    off, on = results["0"]["p50"], results["1"]["p50"]
+    print(f"request    off   {off:6.3f} ms  on    {on:6.3f} ms  (+{(on - off) * 1000:.0f} µs)")
+    print(f"/metrics   {results['1']['metrics_bytes']} bytes, rendered in {results['1']['render_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
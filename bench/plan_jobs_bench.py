@@ -0,0 +1,73 @@
+"""方案生成对其他接口的影响：同步模式 vs 异步任务模式
+
+启动本地假 LLM（每次生成耗时 --delay 秒），同时发出 --plans 个 POST /bmi/plan，
+随后 1.5 倍 delay 的时间内持续请求 GET /users/count 并统计其延迟。同步模式下 LLM 调用占满线程池，
+其他同步端点只能排队；异步模式下生成由有界 worker 执行，其他端点不受影响。
+
+用法: python -m bench.plan_jobs_bench [--plans 80] [--delay 2]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from bench.fake_llm import start_fake_llm
+
+
+async def _run_mode(api, mode, plans, window):
+    import httpx
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.app.router.lifespan_context(api.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            payload = {"height": 170, "weight": 70, "age": 30, "user_id": 1}
+            plan_tasks = [
+                asyncio.create_task(client.post("/bmi/plan", params={"mode": mode}, json=payload))
+                for _ in range(plans)
+            ]
+            await asyncio.sleep(0.2)
+            latencies = []
+            deadline = time.perf_counter() + window
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/users/count")
+                latencies.append((time.perf_counter() - start) * 1000)
+            responses = await asyncio.gather(*plan_tasks)
+            if mode == "async":
+                jobs = [r.json()["job_id"] for r in responses if r.status_code == 202]
+                while True:
+                    states = [(await client.get(f"/bmi/plan/jobs/{j}")).json()["status"] for j in jobs]
+                    if all(s in ("done", "failed") for s in states):
+                        break
+                    await asyncio.sleep(0.2)
+    statuses = sorted({r.status_code for r in responses})
+    return latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, default=80)
+    parser.add_argument("--delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_llm(delay=args.delay)
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="plan_jobs_bench_"), "bench.db")
+    os.environ["DEEPSEEK_BASE_URL"] = base_url
+    os.environ["DEEPSEEK_API_KEY"] = "test"
+    os.environ["PLAN_JOB_QUEUE_SIZE"] = str(max(args.plans, 100))
+    import api
+
+    print(f"plans={args.plans} llm_delay={args.delay}s")
+    print(f"{'mode':>6} {'count p50 ms':>13} {'count max ms':>13} {'plan status':>12}")
+    for mode in ("sync", "async"):
+        latencies, statuses = asyncio.run(_run_mode(api, mode, args.plans, args.delay * 1.5))
+        p50 = statistics.median(latencies)
+        worst = max(latencies)
+        print(f"{mode:>6} {p50:>13.1f} {worst:>13.1f} {','.join(map(str, statuses)):>12}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""连接池微基准：对比每次调用都 connect/close 与从连接池借连接的吞吐
+
+用法: python -m bench.pool_bench [--users 1000] [--requests 20000] [--threads 1 4 8 16]
+结果以 requests/sec 输出，每轮使用临时数据库，不会碰 users.db。
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _legacy_get_user_by_id(db_path, user_id):
+    # 连接池引入之前 database.get_user_by_id 的写法
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def _run(fn, ids, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(fn, ids))
+    return len(ids) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="pool_bench_")
+    db_path = os.path.join(tmpdir, "bench.db")
+    os.environ["DATABASE_PATH"] = db_path
+    import database  # 需在设置 DATABASE_PATH 之后导入
+
+    database.DB_PATH = db_path
+    database.init_db()
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+            [(f"user{i}", f"user{i}@example.com", "x") for i in range(args.users)],
+        )
+
+    rng = random.Random(42)
+    ids = [rng.randint(1, args.users) for _ in range(args.requests)]
+
+    print(f"{'threads':>8} {'connect/close':>15} {'pooled':>12} {'speedup':>8}")
+    for threads in args.threads:
+        legacy = _run(lambda i: _legacy_get_user_by_id(db_path, i), ids, threads)
+        pooled = _run(database.get_user_by_id, ids, threads)
+        print(f"{threads:>8} {legacy:>13.0f}/s {pooled:>10.0f}/s {pooled / legacy:>7.1f}x")
+
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""路由级基准：在进程内逐个请求每个端点，记录 p50/p99 延迟
+
+状态码与预期不符的端点在 status 列中标出实际状态码，便于发现延迟异常是否来自错误响应；
+路由与权限的正确性由 tests/test_routes.py 校验。LLM 调用被禁用，/bmi/plan 只走基础建议。
+
+用法: python -m bench.route_bench [--users 2000] [--iterations 200]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _endpoints(state):
+    """(名称, 预期状态码, 生成第 i 次请求参数的函数)；按顺序执行，后面的可依赖前面创建的数据"""
+    return [
+        ("GET /", 200, lambda i: ("GET", "/", {})),
+        ("GET /users (offset)", 200, lambda i: ("GET", "/users", {"params": {"skip": i, "limit": 20}})),
+        ("GET /users (cursor)", 200, lambda i: ("GET", "/users", {"params": {"after_id": i, "limit": 20}})),
+        ("GET /users/count", 200, lambda i: ("GET", "/users/count", {})),
+        ("GET /users/search", 200, lambda i: ("GET", "/users/search", {"params": {"query": f"bench{i:05d}"}})),
+        ("GET /users/{id}", 200, lambda i: ("GET", f"/users/{i % state['users'] + 1}", {})),
+        ("GET /users/{id}/plans", 200, lambda i: ("GET", f"/users/{i % state['users'] + 1}/plans", {})),
+        ("POST /users", 201, lambda i: ("POST", "/users", {"json": {
+            "username": f"route{i}", "email": f"route{i}@example.com", "password": "secret"}})),
+        ("PUT /users/{id}", 200, lambda i: ("PUT", f"/users/{i % state['users'] + 1}", {
+            "json": {"remark": f"r{i}"}, "headers": state["auth"]})),
+        ("PATCH /users/batch", 200, lambda i: ("PATCH", "/users/batch", {"json": {"updates": [
+            {"id": (i + k) % state['users'] + 1, "is_admin": i % 2 == 0} for k in range(1, 11)]}, "headers": state["auth"]})),
+        ("POST /login", 200, lambda i: ("POST", "/login", {"json": {
+            "email": f"bench{i % state['users']:05d}@example.com", "password": "secret"}})),
+        ("POST /bmi/plan", 200, lambda i: ("POST", "/bmi/plan", {"json": {
+            "height": 170, "weight": 60 + i % 30, "age": 30, "user_id": 1}})),
+        ("DELETE (no token)", 401, lambda i: ("DELETE", f"/users/{state['created'][i]}", {})),
+        ("DELETE /users/{id}", 204, lambda i: ("DELETE", f"/users/{state['created'][i]}", {"headers": state["auth"]})),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="route_bench_"), "bench.db")
+    for var in ("DEEPSEEK_API_KEY", "OPENAI_API_KEY"):
+        os.environ.pop(var, None)
+    from fastapi.testclient import TestClient
+
+    import api
+    import database
+
+    database.init_db()
+
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password, is_admin) VALUES (?, ?, ?, ?)",
+            [(f"bench{i:05d}", f"bench{i:05d}@example.com", "secret", int(i == 0)) for i in range(args.users)],
+        )
+
+    state = {"users": args.users, "created": []}
+    print(f"{'endpoint':<24} {'p50 ms':>8} {'p99 ms':>8} {'status':>7}")
+    with TestClient(api.app, raise_server_exceptions=False) as client:
+        api.app.state.llm = None  # 不调用真实的 LLM
+        # 管理员接口使用 bench00000 (管理员) 登录得到的令牌
+        login = client.post("/login", json={"email": "bench00000@example.com", "password": "secret"})
+        state["auth"] = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        for name, expected, make in _endpoints(state):
+            samples = []
+            bad_status = None
+            for i in range(args.iterations):
+                method, path, kwargs = make(i)
+                start = time.perf_counter()
+                response = client.request(method, path, **kwargs)
+                samples.append((time.perf_counter() - start) * 1000)
+                if response.status_code != expected and bad_status is None:
+                    bad_status = response.status_code
+                if name == "POST /users" and response.status_code == 201:
+                    state["created"].append(response.json()["id"])
+            status = "ok" if bad_status is None else str(bad_status)
+            print(f"{name:<24} {statistics.median(samples):>8.2f} {_percentile(samples, 0.99):>8.2f} {status:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""搜索基准：FTS5 trigram 索引 vs LIKE '%q%' 全表扫描
+
+用法: python -m bench.search_bench [--users 200000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_WORDS = ["跑步", "游泳", "程序员", "设计师", "北京", "上海", "深圳", "健身", "瑜伽", "摄影", "学生", "教师"]
+
+
+def _timed(fn, queries):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="search_bench_"), "bench.db")
+    import database
+
+    database.init_db()
+    rng = random.Random(42)
+    rows = [
+        (f"user{i:07d}", f"user{i:07d}@example.com", "x", "".join(rng.sample(_WORDS, 3)) + f"{i}")
+        for i in range(args.users)
+    ]
+    with database.connection() as conn:
+        conn.executemany("INSERT INTO users (username, email, password, remark) VALUES (?, ?, ?, ?)", rows)
+
+    queries = [f"user{rng.randrange(args.users):07d}" for _ in range(args.queries // 2)]
+    queries += [rng.choice(_WORDS) + rng.choice(_WORDS) for _ in range(args.queries - len(queries))]
+
+    def like_scan(q):
+        pattern = f"%{q}%"
+        with database.connection() as conn:
+            conn.execute(
+                "SELECT * FROM users WHERE username LIKE ? OR email LIKE ? OR remark LIKE ? LIMIT ?",
+                (pattern, pattern, pattern, database.DEFAULT_SEARCH_LIMIT),
+            ).fetchall()
+
+    print(f"users={args.users} queries={len(queries)}")
+    print(f"{'path':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, fn in (("like", like_scan), ("fts5", database.search_users)):
+        p50, p99 = _timed(fn, queries)
+        print(f"{name:>6} {p50:>8.3f} {p99:>8.3f}")
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""确定性的测试数据生成器：向数据库写入 N 个用户和 M 个方案
+
+同一组 (--users, --plans, --seed) 总是生成相同的用户名、邮箱、身体数据、方案与创建时间，
+便于在不同提交之间对比基准结果（密码哈希的盐仍是随机的）。
+用户名形如 seed000042_amber_fox，邮箱为 <用户名>@example.com，第 0 个用户是管理员。
+为避免计算 N 次 scrypt，密码只有 --distinct-passwords 种，第 i 个用户的密码见 password_for(i)。
+
+用法: python -m bench.seed [--db users.db] [--users 10000] [--plans 50000] [--seed 0]
+目标库中已有同名的种子用户时不重复写入。
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+WORDS = (
+    "amber", "azure", "birch", "cedar", "cobalt", "coral", "delta", "ember", "fern", "frost",
+    "garnet", "harbor", "hazel", "indigo", "ivory", "jasper", "juniper", "lagoon", "lunar", "maple",
+    "meadow", "nova", "ocean", "olive", "onyx", "orbit", "pepper", "pine", "prairie", "quartz",
+    "raven", "river", "saffron", "sierra", "solar", "spruce", "summit", "thunder", "tundra", "willow",
+)
+ANIMALS = (
+    "badger", "bison", "crane", "falcon", "fox", "heron", "lynx", "marten", "otter", "panda",
+    "puffin", "salmon", "seal", "sparrow", "tiger", "viper", "walrus", "whale", "wolf", "yak",
+)
+REMARKS = ("", "新用户", "VIP", "体验会员", "减脂计划", "增肌计划", "来自线下门店", "需要回访")
+GOALS = ("fat_loss", "muscle_gain", "recomposition", None)
+DEFAULT_PASSWORDS = 32
+# 方案创建时间从该时刻往前分布，不取当前时间以保证结果可复现
+BASE_TIME = datetime(2025, 1, 1)
+
+
+def password_for(index, distinct_passwords=DEFAULT_PASSWORDS):
+    return f"seed-password-{index % distinct_passwords}"
+
+
+def username_for(index, seed=0):
+    rng = random.Random(f"{seed}:{index}")
+    return f"seed{index:06d}_{rng.choice(WORDS)}_{rng.choice(ANIMALS)}"
+
+
+def email_for(index, seed=0):
+    return f"{username_for(index, seed)}@example.com"
+
+
+def generate_users(count, seed=0, password_hashes=None):
+    """按 USER_IMPORT_COLUMNS 顺序产出用户行；password_hashes 为各种密码对应的哈希列表"""
+    rng = random.Random(seed)
+    distinct = len(password_hashes) if password_hashes else DEFAULT_PASSWORDS
+    for i in range(count):
+        height = round(rng.gauss(168, 9), 1)
+        weight = round(max(40.0, rng.gauss(65, 12)), 1)
+        password = password_hashes[i % distinct] if password_hashes else password_for(i, distinct)
+        yield (
+            username_for(i, seed),
+            email_for(i, seed),
+            password,
+            rng.choice(REMARKS) or None,
+            int(i == 0),
+            height,
+            weight,
+            rng.randint(16, 70),
+        )
+
+
+def generate_plans(count, users, seed=0):
+    """产出 (user_id, bmi, bmi_category, suggestion, ai_plan, created_at)；user_id 取 1..users"""
+    from api import _basic_suggestion, _bmi_category
+
+    rng = random.Random(seed + 1)
+    for i in range(count):
+        user_id = rng.randint(1, users)
+        bmi = round(rng.uniform(16, 35), 2)
+        age = rng.randint(16, 70)
+        goal = rng.choice(GOALS)
+        created_at = BASE_TIME - timedelta(seconds=rng.randrange(180 * 24 * 3600))
+        ai_plan = (
+            f"## 核心策略\n每日热量缺口 {rng.randrange(200, 600, 50)}kcal，蛋白 {rng.choice((1.2, 1.6, 2.0))}g/kg。\n\n"
+            f"## 训练安排\n每周 {rng.randint(2, 5)} 次力量 + {rng.randint(1, 4)} 次有氧。\n\n"
+            f"## 恢复\n每晚睡眠 {rng.randint(7, 9)} 小时。"
+        )
+        yield (user_id, bmi, _bmi_category(bmi), _basic_suggestion(bmi, age, goal), ai_plan,
+               created_at.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def seed_database(users, plans, seed=0, distinct_passwords=DEFAULT_PASSWORDS, batch_size=5000):
+    """写入种子数据，返回 (新增用户数, 新增方案数)。数据库路径取自 DATABASE_PATH。"""
+    import database
+    import passwords
+
+    database.init_db()
+    with database.connection() as conn:
+        if conn.execute("SELECT 1 FROM users WHERE username = ?", (username_for(0, seed),)).fetchone():
+            return 0, 0
+    hashes = [passwords.hash_password(password_for(i, distinct_passwords)) for i in range(distinct_passwords)]
+    inserted = 0
+    batch = []
+    for row in generate_users(users, seed, hashes):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            inserted += database.bulk_create_users(batch)[0]
+            batch = []
+    if batch:
+        inserted += database.bulk_create_users(batch)[0]
+
+    # 方案按用户在本库中的实际 id 关联（库中原有数据时 id 不从 1 开始）
+    with database.connection() as conn:
+        first_id = conn.execute("SELECT id FROM users WHERE username = ?", (username_for(0, seed),)).fetchone()[0]
+    plan_rows = [(first_id - 1 + row[0],) + row[1:] for row in generate_plans(plans, users, seed)]
+
+    def insert_plans(conn):
+        conn.executemany(
+            "INSERT INTO plans (user_id, bmi, bmi_category, suggestion, ai_plan, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            plan_rows,
+        )
+    database.run_write(insert_plans)
+    return inserted, len(plan_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=None, help="数据库文件，默认取 DATABASE_PATH 或 users.db")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--plans", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--distinct-passwords", type=int, default=DEFAULT_PASSWORDS)
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ["DATABASE_PATH"] = args.db
+    start = time.perf_counter()
+    users, plans = seed_database(args.users, args.plans, args.seed, args.distinct_passwords)
+    if not users and not plans:
+        print("数据库中已有这组种子数据，未写入")
+        return
+    print(f"seeded {users} users and {plans} plans into {os.environ.get('DATABASE_PATH') or 'users.db'} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""冷启动基准：新进程中 import api 与启动后第一个响应的耗时
+
+每轮启动一个新的 Python 进程，记录：
+  import api      导入 api 模块（不再执行结构迁移，也不导入 openai / numpy / pyarrow）
+  first response  TestClient 进入 lifespan（结构迁移、LLM 客户端、后台 worker、密码哈希进程池）到 GET / 返回
+  process         整个子进程的墙钟时间（含解释器启动与退出）
+数据库分三种状态：
+  fresh    数据库文件不存在，执行全部迁移
+  current  已是最新版本，init_db 只读一次 user_version
+  legacy   已有全部表但 user_version 为 0（引入版本号之前的库），每一步幂等地再执行一遍
+--eager 时在 import api 之前先导入 openai、numpy、pyarrow（计入 import api），模拟这些依赖在模块顶层导入时的开销。
+
+用法: python -m bench.startup_bench [--rounds 5] [--users 100000] [--eager]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == "1":
+    import numpy, openai, pyarrow.parquet
+import api
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client_ready = time.perf_counter()
+with TestClient(api.app) as client:
+    client.get("/").raise_for_status()
+    responded = time.perf_counter()
+print(json.dumps({"import": imported - start, "first": responded - client_ready}))
+"""
+
+
+def _run(db_path, eager):
+    env = dict(os.environ, DATABASE_PATH=db_path)
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD, "1" if eager else "0"],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    elapsed = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["import"] * 1000, result["first"] * 1000, elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--users", type=int, default=100000, help="current / legacy 库中的用户数")
+    parser.add_argument("--eager", action="store_true")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="startup_bench_")
+    seeded = os.path.join(directory, "seeded.db")
+    os.environ["DATABASE_PATH"] = seeded
+    import database
+    from bench import seed
+
+    seed.seed_database(args.users, 0)
+    database.close_pool()
+
+    def fresh():
+        return os.path.join(directory, f"fresh{time.perf_counter_ns()}.db")
+
+    def current():
+        return seeded
+
+    def legacy():
+        with database.connection() as conn:
+            conn.execute("PRAGMA user_version = 0")
+        database.close_pool()
+        return seeded
+
+    print(f"users={args.users} rounds={args.rounds} eager={args.eager}")
+    print(f"{'database':<10} {'import api ms':>14} {'first response ms':>18} {'process ms':>11}")
+    for name, prepare in (("fresh", fresh), ("current", current), ("legacy", legacy)):
+        samples = [_run(prepare(), args.eager) for _ in range(args.rounds)]
+        imports, firsts, processes = (statistics.median(column) for column in zip(*samples))
+        print(f"{name:<10} {imports:>14.1f} {firsts:>18.1f} {processes:>11.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
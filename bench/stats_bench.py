@@ -0,0 +1,104 @@
+"""统计汇总基准：GET /stats 读汇总表 与 每次全表 GROUP BY 计算 的耗时对比，以及触发器带来的写入开销
+
+对 --sizes 中的每个用户数（方案数为其 --plans-per-user 倍）写入种子数据后记录：
+  /stats          经 TestClient 请求，读取触发器维护的 stats_counts
+  full scan       不用汇总表，直接对 users / plans 做 GROUP BY（四条统计查询之和）
+最后在最大的库上逐条插入 --writes 个方案，比较有无统计触发器时每次插入的耗时。
+
+用法: python -m bench.stats_bench [--sizes 10000 100000] [--plans-per-user 2] [--iterations 50]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def _p50(fn, iterations):
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--plans-per-user", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="stats_bench_"), "bench.db")
+    from fastapi.testclient import TestClient
+
+    import api
+    import database
+    import tokens
+    from bench import seed
+
+    def fill(start, stop):
+        # 直接 executemany 写入，统计触发器逐行生效
+        users = list(seed.generate_users(stop, password_hashes=["x"]))[start:]
+        plans = list(seed.generate_plans((stop - start) * args.plans_per_user, stop, seed=start))
+        with database.connection() as conn:
+            conn.executemany(
+                f"INSERT INTO users ({', '.join(database.USER_IMPORT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", users
+            )
+            conn.executemany(
+                "INSERT INTO plans (user_id, bmi, bmi_category, suggestion, ai_plan, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", plans
+            )
+
+    def full_scan():
+        with database.connection() as conn:
+            conn.execute(f"SELECT {database._age_band_sql('age')} AS band, COUNT(*) FROM users GROUP BY band").fetchall()
+            conn.execute(
+                f"SELECT {database._bmi_category_sql('height', 'weight')} AS category, COUNT(*) FROM users GROUP BY category"
+            ).fetchall()
+            conn.execute("SELECT bmi_category, COUNT(*) FROM plans GROUP BY bmi_category").fetchall()
+            conn.execute(
+                "SELECT date(created_at) AS day, COUNT(*) FROM plans "
+                "WHERE created_at >= date('now', '-29 days') GROUP BY day"
+            ).fetchall()
+
+    token, _ = tokens.issue_token(1, True)
+    headers = {"Authorization": f"Bearer {token}"}
+    print(f"{'users':>8} {'plans':>8} {'/stats ms':>10} {'full scan ms':>13}")
+    filled = 0
+    with TestClient(api.app) as client:
+        def stats():
+            client.get("/stats", headers=headers).raise_for_status()
+
+        for size in sorted(args.sizes):
+            fill(filled, size)
+            filled = size
+            print(f"{size:>8} {size * args.plans_per_user:>8} {_p50(stats, args.iterations):>10.2f} "
+                  f"{_p50(full_scan, max(3, args.iterations // 10)):>13.2f}", flush=True)
+
+    def insert_plans():
+        start = time.perf_counter()
+        for i in range(args.writes):
+            with database.connection() as conn:
+                conn.execute(
+                    "INSERT INTO plans (user_id, bmi, bmi_category, suggestion, ai_plan) VALUES (?, ?, ?, ?, ?)",
+                    (1 + i % size, 22.5, "正常", "bench", "bench"),
+                )
+        return (time.perf_counter() - start) / args.writes * 1e6
+
+    # 预热一轮：刚写入大量数据后的首轮插入会赶上 WAL 检查点，不计入结果
+    insert_plans()
+    with_triggers = insert_plans()
+    with database.connection() as conn:
+        conn.execute("DROP TRIGGER stats_plans_ai")
+    without_triggers = insert_plans()
+    print(f"\nplan insert (own transaction): {with_triggers:.1f} µs with stats triggers, "
+          f"{without_triggers:.1f} µs without")
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
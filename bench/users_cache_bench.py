@@ -0,0 +1,76 @@
+"""用户列表缓存基准：模拟 Streamlit 每次重跑时请求 /users/count 与 /users?limit=1000
+
+分别测试：关闭缓存、开启服务端缓存、开启缓存且客户端带 If-None-Match（命中时返回 304）。
+每 --write-every 轮插入一个用户，使缓存失效一次。
+
+用法: python -m bench.users_cache_bench [--users 20000] [--rounds 300] [--write-every 50]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def _run(client, database, rounds, write_every, cache_size, conditional, tag):
+    database.USERS_CACHE_SIZE = cache_size
+    database.invalidate_users_cache()
+    etags = {}
+    samples = []
+    not_modified = 0
+    for i in range(rounds):
+        if write_every and i % write_every == write_every - 1:
+            client.post("/users", json={
+                "username": f"{tag}{i}", "email": f"{tag}{i}@example.com", "password": "secret"})
+        start = time.perf_counter()
+        for url in ("/users/count", "/users?limit=1000"):
+            headers = {"If-None-Match": etags[url]} if conditional and url in etags else {}
+            response = client.get(url, headers=headers)
+            if response.status_code == 304:
+                not_modified += 1
+            else:
+                etags[url] = response.headers["etag"]
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1], not_modified
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--write-every", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="users_cache_bench_"), "bench.db")
+    from fastapi.testclient import TestClient
+
+    import api
+    import database
+
+    database.init_db()
+
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+            [(f"bench{i:06d}", f"bench{i:06d}@example.com", "secret") for i in range(args.users)],
+        )
+    cache_size = database.USERS_CACHE_SIZE or 256
+
+    print(f"users={args.users} rounds={args.rounds} write_every={args.write_every}")
+    print(f"{'mode':>12} {'p50 ms':>8} {'p99 ms':>8} {'304s':>6}")
+    with TestClient(api.app) as client:
+        api.app.state.llm = None
+        for name, size, conditional in (
+            ("no cache", 0, False),
+            ("cache", cache_size, False),
+            ("cache+etag", cache_size, True),
+        ):
+            p50, p99, not_modified = _run(client, database, args.rounds, args.write_every, size, conditional,
+                                          name.replace(" ", "").replace("+", ""))
+            print(f"{name:>12} {p50:>8.2f} {p99:>8.2f} {not_modified:>6}")
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""用户列表序列化基准：SELECT * + dict(row) + jsonable_encoder 与 公开列投影 + 元组 + orjson 的对比
+
+1. 函数级：一次读取并序列化 --rows 行（默认 10000，超过接口单页上限 MAX_PAGE_SIZE），
+   记录耗时与 tracemalloc 峰值内存。
+2. 接口级：关闭用户读缓存 (USERS_CACHE_SIZE=0)，请求 GET /users?limit=1000、
+   带 fields=id,username 的同一请求，以及 GET /users/search，记录 p50。
+
+用法: python -m bench.users_json_bench [--users 20000] [--rows 10000] [--iterations 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+
+def _measure(fn, iterations):
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(samples), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="users_json_bench_"), "bench.db")
+    os.environ["USERS_CACHE_SIZE"] = "0"
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.testclient import TestClient
+
+    import api
+    import database
+    import passwords
+
+    database.init_db()
+
+    stored = passwords.hash_password("secret")
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password, remark, height, weight, age) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"user{i:06d}", f"user{i:06d}@example.com", stored, "普通用户", 170.5, 62.3, 30)
+             for i in range(args.users)],
+        )
+
+    def legacy():
+        # 优化前：SELECT * 读出含 password 的整行，逐行 dict(row)，再由 FastAPI 通用编码
+        with database.connection() as conn:
+            rows = conn.execute("SELECT * FROM users ORDER BY id LIMIT ?", (args.rows,)).fetchall()
+        return json.dumps(jsonable_encoder([dict(row) for row in rows]), ensure_ascii=False).encode()
+
+    def lean(columns=database.PUBLIC_USER_COLUMNS):
+        with database.connection() as conn:
+            rows = database._fetch_tuples(conn, *database._users_page_statement(0, args.rows, columns))
+        return api._dumps(api._user_records(columns, rows))
+
+    print(f"serializer: {'orjson' if api.orjson is not None else 'json (orjson 未安装)'}")
+    print(f"{'path (' + str(args.rows) + ' rows)':<28} {'p50 ms':>8} {'peak KiB':>9} {'bytes':>9}")
+    for name, fn in (
+        ("SELECT * + jsonable_encoder", legacy),
+        ("public columns + orjson", lean),
+        ("fields=id,username", lambda: lean(("id", "username"))),
+    ):
+        p50, peak = _measure(fn, args.iterations)
+        print(f"{name:<28} {p50:>8.2f} {peak:>9.0f} {len(fn()):>9}")
+
+    print(f"\n{'endpoint':<46} {'p50 ms':>8} {'bytes':>9}")
+    with TestClient(api.app) as client:
+        for path in (
+            "/users?skip=0&limit=1000",
+            "/users?skip=0&limit=1000&fields=id,username",
+            "/users/search?query=user00&limit=1000",
+        ):
+            def request():
+                response = client.get(path)
+                response.raise_for_status()
+                return response
+            p50, _ = _measure(request, args.iterations)
+            print(f"{path:<46} {p50:>8.2f} {len(request().content):>9}")
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
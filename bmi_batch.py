@@ -0,0 +1,169 @@
+"""批量 BMI 计算：一次计算成千上万条记录的 BMI、分类与基础建议
+
+单条接口的 _calc_bmi / _bmi_category / _basic_suggestion 每次处理一个人，分类靠逐个比较阈值。
+批量计算把身高、体重转成 NumPy 数组一次算出 BMI，再用 np.digitize 按 _DEF_BMI_CATEGORIES 的阈值分段；
+建议文本只取决于 (BMI 分段, 年龄, 目标)，每种组合调用一次 _basic_suggestion 后查表得到，
+因此结果与逐条调用单条函数一致，规则仍只在 api.py 中维护一份。
+
+numpy 是可选依赖（pandas / pyarrow 都依赖它）；未安装时退回逐条调用单条函数。
+numpy 在第一次批量计算时才导入。
+"""
+import functools
+import importlib.util
+import math
+import os
+
+_numpy_available = importlib.util.find_spec("numpy") is not None
+np = None
+
+# 一次请求最多提交的记录数；流式响应中每块包含的记录数
+BMI_BATCH_MAX_RECORDS = int(os.getenv("BMI_BATCH_MAX_RECORDS") or 100000)
+BMI_BATCH_CHUNK_SIZE = int(os.getenv("BMI_BATCH_CHUNK_SIZE") or 10000)
+
+# 每条结果的列；error 非空表示该条无法计算，其余列为空
+COLUMNS = ("id", "bmi", "bmi_category", "suggestion", "error")
+
+# 单条记录的取值范围：请求体超出时校验失败 (422)；compute 中超出的记录（如来自 users 表）记为错误
+MIN_HEIGHT_CM = 30
+MAX_HEIGHT_CM = 300
+MAX_WEIGHT_KG = 1000
+MAX_AGE = 150
+HEIGHT_ERROR = f"身高需在 {MIN_HEIGHT_CM}-{MAX_HEIGHT_CM} cm 之间"
+WEIGHT_ERROR = f"体重需在 0-{MAX_WEIGHT_KG} kg 之间"
+AGE_ERROR = f"年龄需在 0-{MAX_AGE} 之间"
+RESULT_ERROR = "身高体重超出可计算范围"
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy
+
+        np = numpy
+
+
+class BMICalculator:
+    """由单条函数构造的批量计算器。
+
+    categories 为 [(阈值, 分类), ...]（BMI 小于阈值即属于该分类，超过最后一个阈值为“未知”）；
+    suggestion(bmi, age, goal) 的 BMI 分段须与 categories 的阈值一致。
+    """
+
+    def __init__(self, categories, calc_bmi, category, suggestion):
+        self._thresholds = [threshold for threshold, _ in categories]
+        self._labels = [label for _, label in categories] + [category(self._thresholds[-1])]
+        # 每个分段取下边界作为代表值调用 suggestion；分段内建议相同
+        self._representatives = [0.0] + self._thresholds
+        self._calc_bmi = calc_bmi
+        self._category = category
+        self._suggestion = suggestion
+        self._cached_suggestion = functools.lru_cache(maxsize=4096)(self._segment_suggestion)
+        try:
+            calc_bmi(0, 0)
+        except ValueError as e:
+            self._invalid_message = str(e)
+
+    def _segment_suggestion(self, segment, age, goal):
+        return self._suggestion(self._representatives[segment], age, goal)
+
+    def compute(self, ids, heights, weights, ages, goals=None):
+        """计算一批记录，返回按 COLUMNS 排列的元组列表，顺序与输入一致。
+
+        身高或体重缺失、不为正数，身高、体重或年龄超出范围，或 BMI 不是有限数的记录 error 为错误信息；
+        年龄缺失按 0 处理；goals 为 None 表示都没有目标。
+        """
+        if not _numpy_available:
+            return self._compute_scalar(ids, heights, weights, ages, goals)
+        _load_numpy()
+        height = np.array(heights, dtype=np.float64)
+        weight = np.array(weights, dtype=np.float64)
+        # NaN（缺失值）与任何数比较都为 False，一并视为无效
+        valid = (height > 0) & (weight > 0)
+        height_ok = (height >= MIN_HEIGHT_CM) & (height <= MAX_HEIGHT_CM)
+        weight_ok = weight <= MAX_WEIGHT_KG
+        valid_in_range = valid & height_ok & weight_ok
+        height_m = np.where(valid_in_range, height, 100.0) / 100.0
+        # 极小的身高或极大的体重会溢出为 inf，这些行下面记为错误
+        with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+            raw = np.where(valid_in_range, weight, 0.0) / height_m ** 2
+            bmi = np.round(raw, 2)
+            # np.round 先乘 100 再取整，恰在两位小数中点附近时可能与 round() 的十进制舍入差一位，这些值逐个重算
+            scaled = raw * 100
+            tie = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+        # 很大的 BMI 乘 100 时也会溢出，同样交给 round() 逐个计算
+        redo = np.union1d(tie, np.flatnonzero(np.isfinite(raw) & ~np.isfinite(bmi)))
+        if len(redo):
+            bmi[redo] = [round(value, 2) for value in raw[redo].tolist()]
+        finite = np.isfinite(bmi)
+        segment = np.digitize(np.where(finite, bmi, 0.0), self._thresholds)
+
+        # 超出范围的年龄先按 0 参与编码，避免下面的组合编码溢出
+        age = np.nan_to_num(np.array(ages, dtype=np.float64))
+        age_ok = (age >= 0) & (age <= MAX_AGE)
+        age = np.where(age_ok, age, 0.0).astype(np.int64)
+        goal_names = [None]
+        goal_codes = {None: 0}
+        if goals is None:
+            goal = np.zeros(len(bmi), dtype=np.int64)
+        else:
+            goal = np.fromiter(
+                (goal_codes.setdefault(name, len(goal_codes)) for name in goals), dtype=np.int64, count=len(bmi)
+            )
+            goal_names = list(goal_codes)
+
+        # (分段, 年龄, 目标) 编码为一个整数，每种组合只生成一次建议文本
+        age_offset = int(age.min()) if len(age) else 0
+        age_span = int(age.max()) - age_offset + 1 if len(age) else 1
+        key = (segment * age_span + (age - age_offset)) * len(goal_names) + goal
+        unique, inverse = np.unique(key, return_inverse=True)
+        table = []
+        for code in unique.tolist():
+            code, goal_code = divmod(code, len(goal_names))
+            code, age_index = divmod(code, age_span)
+            table.append(self._cached_suggestion(code, age_index + age_offset, goal_names[goal_code]))
+
+        labels = [self._labels[index] for index in segment.tolist()]
+        suggestions = [table[index] for index in inverse.tolist()]
+        rows = list(zip(ids, bmi.tolist(), labels, suggestions, [None] * len(bmi)))
+        failed = ~(valid_in_range & finite & age_ok)
+        if failed.any():
+            for index in np.flatnonzero(failed).tolist():
+                if not valid[index]:
+                    error = self._invalid_message
+                elif not height_ok[index]:
+                    error = HEIGHT_ERROR
+                elif not weight_ok[index]:
+                    error = WEIGHT_ERROR
+                elif not age_ok[index]:
+                    error = AGE_ERROR
+                else:
+                    error = RESULT_ERROR
+                rows[index] = (rows[index][0], None, None, None, error)
+        return rows
+
+    def _compute_scalar(self, ids, heights, weights, ages, goals):
+        rows = []
+        for index, (record_id, height, weight, age) in enumerate(zip(ids, heights, weights, ages)):
+            try:
+                bmi = self._calc_bmi(height or 0, weight or 0)
+            except ValueError as e:
+                rows.append((record_id, None, None, None, str(e)))
+                continue
+            except ZeroDivisionError:
+                # 身高极小时平方下溢为 0
+                bmi = math.inf
+            if not MIN_HEIGHT_CM <= height <= MAX_HEIGHT_CM:
+                rows.append((record_id, None, None, None, HEIGHT_ERROR))
+                continue
+            if weight > MAX_WEIGHT_KG:
+                rows.append((record_id, None, None, None, WEIGHT_ERROR))
+                continue
+            if age is not None and not 0 <= age <= MAX_AGE:
+                rows.append((record_id, None, None, None, AGE_ERROR))
+                continue
+            if not math.isfinite(bmi):
+                rows.append((record_id, None, None, None, RESULT_ERROR))
+                continue
+            goal = goals[index] if goals is not None else None
+            rows.append((record_id, bmi, self._category(bmi), self._suggestion(bmi, age or 0, goal), None))
+        return rows
@@ -0,0 +1,134 @@
+"""Arrow / Parquet 列式响应
+
+列表接口以 format=arrow|parquet 请求时，直接把 SQLite 游标按批取出的元组转置成列，
+构造 Arrow RecordBatch 并编码为 IPC 流（或 Parquet 行组）逐批发送，不经过 dict 与 JSON。
+客户端用 pyarrow.ipc.open_stream(...).read_pandas() 得到 DataFrame，数值列无需逐个解析。
+
+pyarrow 是可选依赖（Streamlit 本身依赖它）；未安装时 available() 为 False，接口返回 501。
+pyarrow 在第一次构造 schema 时才导入。
+"""
+import importlib.util
+
+_pyarrow_available = importlib.util.find_spec("pyarrow") is not None
+pa = None
+pq = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# 各列的 Arrow 类型名；created_at 与 JSON 响应一致保持为字符串
+USER_COLUMN_TYPES = {
+    "id": "int64",
+    "username": "string",
+    "email": "string",
+    "remark": "string",
+    "created_at": "string",
+    "is_admin": "int64",
+    "height": "float64",
+    "weight": "float64",
+    "age": "int64",
+}
+PLAN_COLUMN_TYPES = {
+    "id": "int64",
+    "user_id": "int64",
+    "bmi": "float64",
+    "bmi_category": "string",
+    "suggestion": "string",
+    "ai_plan": "string",
+    "created_at": "string",
+}
+BMI_BATCH_COLUMN_TYPES = {
+    "id": "int64",
+    "bmi": "float64",
+    "bmi_category": "string",
+    "suggestion": "string",
+    "error": "string",
+}
+
+
+def available():
+    return _pyarrow_available
+
+
+def _load():
+    global pa, pq
+    if pq is None:
+        import pyarrow
+        import pyarrow.parquet
+
+        pa = pyarrow
+        pq = pyarrow.parquet
+
+
+def schema(columns, column_types):
+    _load()
+    return pa.schema([(column, pa.type_for_alias(column_types[column])) for column in columns])
+
+
+def record_batch(rows, arrow_schema):
+    """把元组行转置为列并构造 RecordBatch"""
+    if not rows:
+        return pa.RecordBatch.from_pylist([], schema=arrow_schema)
+    columns = zip(*rows)
+    return pa.record_batch(
+        [pa.array(values, type=field.type) for values, field in zip(columns, arrow_schema)],
+        schema=arrow_schema,
+    )
+
+
+class _Sink:
+    """写入端：编码器写入的字节暂存在这里，每写完一批取出发送"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def encode(batches, arrow_schema, format):
+    """把异步产出的元组批次编码为 Arrow IPC 流或 Parquet，逐批产出字节。
+
+    Parquet 的每批写成一个行组；文件尾 (footer) 在最后一批之后才能写出。
+    """
+    sink = _Sink()
+    if format == "parquet":
+        writer = pq.ParquetWriter(sink, arrow_schema)
+    else:
+        writer = pa.ipc.new_stream(sink, arrow_schema)
+    try:
+        async for rows in batches:
+            writer.write_batch(record_batch(rows, arrow_schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+async def single_batch(rows):
+    """把一次查出的全部行包装成 encode 接受的批次来源"""
+    yield rows
+
+
+def media_type(format):
+    return PARQUET_MEDIA_TYPE if format == "parquet" else ARROW_MEDIA_TYPE
@@ -1,16 +1,208 @@
 import sqlite3
 import os
+import atexit
+import functools
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import db_metrics
+import metrics
+from db_pool import ConnectionPool
+from db_writer import WriteQueue
 
 DB_PATH = os.getenv("DATABASE_PATH") or "users.db"
+DB_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE") or 8)
+DB_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT") or 30)
+# 导出等长时间流式读取使用独立连接，不占连接池；同时进行的流式读取最多这么多个
+DB_STREAM_LIMIT = int(os.getenv("DATABASE_STREAM_LIMIT") or 8)
+
+# 存储配置：WAL 下读写互不阻塞，synchronous=NORMAL 在 WAL 下仍能保证数据库不损坏
+DB_JOURNAL_MODE = (os.getenv("DATABASE_JOURNAL_MODE") or "WAL").upper()
+DB_SYNCHRONOUS = (os.getenv("DATABASE_SYNCHRONOUS") or "NORMAL").upper()
+DB_CACHE_SIZE = int(os.getenv("DATABASE_CACHE_SIZE") or -16000)  # 负数单位为 KiB
+DB_MMAP_SIZE = int(os.getenv("DATABASE_MMAP_SIZE") or 256 * 1024 * 1024)
+DB_BUSY_TIMEOUT = int(os.getenv("DATABASE_BUSY_TIMEOUT") or 5000)  # 毫秒
+# 写操作是否交给单写线程串行执行，以及每个事务最多合并多少个写操作
+DB_WRITE_QUEUE = (os.getenv("DATABASE_WRITE_QUEUE") or "1").lower() not in ("0", "false", "no", "off")
+DB_WRITE_BATCH = int(os.getenv("DATABASE_WRITE_BATCH") or 64)
+# 同步调用方等待写操作提交的最长秒数
+DB_WRITE_TIMEOUT = float(os.getenv("DATABASE_WRITE_TIMEOUT") or 60)
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+if DB_JOURNAL_MODE not in _JOURNAL_MODES:
+    raise ValueError(f"DATABASE_JOURNAL_MODE 取值无效: {DB_JOURNAL_MODE}")
+if DB_SYNCHRONOUS not in _SYNCHRONOUS_MODES:
+    raise ValueError(f"DATABASE_SYNCHRONOUS 取值无效: {DB_SYNCHRONOUS}")
+
+# 每个连接建立时执行一次的 PRAGMA（journal_mode 是持久化到文件的，在 init_db 中设置）
+_CONNECTION_PRAGMAS = [
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT}",
+    f"PRAGMA synchronous = {DB_SYNCHRONOUS}",
+    f"PRAGMA cache_size = {DB_CACHE_SIZE}",
+    f"PRAGMA mmap_size = {DB_MMAP_SIZE}",
+    "PRAGMA temp_store = MEMORY",
+]
+
+# 用户总数与列表页的进程内缓存：最多缓存的条目数，0 表示关闭
+USERS_CACHE_SIZE = int(os.getenv("USERS_CACHE_SIZE") or 128)
+
+# 分页：单页默认条数与硬上限
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 1000
+
+DEFAULT_SEARCH_LIMIT = 50
+
+# 用户名 / 邮箱前缀查找（输入联想）：默认与最多返回条数，前缀最大长度
+DEFAULT_LOOKUP_LIMIT = 10
+MAX_LOOKUP_LIMIT = 20
+MAX_LOOKUP_PREFIX = 64
+
+# 可以对外返回的用户列（不含 password）。除 get_login_user 外，读用户的函数都只查询这些列。
+PUBLIC_USER_COLUMNS = ("id", "username", "email", "remark", "created_at", "is_admin", "height", "weight", "age")
+_PUBLIC_USER_SQL = ", ".join(PUBLIC_USER_COLUMNS)
+# 批量导入时按此顺序提供每行数据
+USER_IMPORT_COLUMNS = ("username", "email", "password", "remark", "is_admin", "height", "weight", "age")
+# update_user / update_users 可以修改的列
+USER_UPDATE_COLUMNS = USER_IMPORT_COLUMNS
+
+# plans 表的列，以及摘要模式返回的列（不含较大的 ai_plan 文本）
+PLAN_FIELDS = ("id", "user_id", "bmi", "bmi_category", "suggestion", "ai_plan", "created_at")
+PLAN_SUMMARY_FIELDS = tuple(field for field in PLAN_FIELDS if field != "ai_plan")
+PLAN_SUMMARY_COLUMNS = ", ".join(PLAN_SUMMARY_FIELDS)
+
+_search_index_ready = None
+_pool = None
+_pool_lock = threading.Lock()
+_writer = None
+
+# users 表每次写入后递增，缓存条目只在写入时的版本号与当前一致时有效。
+# 其他连接（其他 worker 进程、manage.py 等）提交的写入由 PRAGMA data_version 察觉，见 _apply_data_version。
+_users_version = 0
+_users_cache = OrderedDict()  # key -> (version, value)
+_users_cache_lock = threading.Lock()
+_data_version_conn = None
+_data_version_lock = threading.Lock()
+_data_version = None
+# 进程启动标识，使不同进程 / 重启前后的版本号不会得到相同的 ETag
+_users_cache_epoch = uuid.uuid4().hex[:8]
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+    """新建一个配置好的连接。连接池也通过它建连，连接可跨线程借用。"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, factory=db_metrics.connection_factory())
     conn.row_factory = sqlite3.Row
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_connection, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
+    return _pool
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _pool_lock:
+            if _writer is None:
+                _writer = WriteQueue(get_connection, max_batch=DB_WRITE_BATCH, timeout=DB_WRITE_TIMEOUT)
+    return _writer
+
+def close_pool():
+    """关闭写线程与连接池（切换 DB_PATH 或进程退出前调用）"""
+    global _pool, _writer
+    with _pool_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+    _close_data_version_conn()
+
+atexit.register(close_pool)
+
+_POOL_METRIC_HELP = {
+    "size": "连接池大小",
+    "created": "已建立的连接数",
+    "idle": "空闲连接数",
+    "waits": "池满时需要等待的借出次数",
+    "wait_seconds": "等待空闲连接的累计秒数",
+    "timeouts": "等待连接超时次数",
+    "streams": "进行中的流式读取数（各用一个独立连接）",
+}
+_WRITER_METRIC_HELP = {
+    "pending": "排队中的写操作数",
+    "batches": "已提交的写事务数",
+    "jobs": "已执行的写操作数",
+    "failed_jobs": "失败（已单独回滚）的写操作数",
+    "failed_batches": "整批失败的写事务数",
+    "queue_wait_seconds": "写操作从提交到开始执行的累计等待秒数",
+    "lock_wait_seconds": "BEGIN IMMEDIATE 等待写锁的累计秒数",
+    "commit_seconds": "写事务从开始到提交的累计秒数",
+}
+_POOL_COUNTERS = ("waits", "wait_seconds", "timeouts")
+_WRITER_COUNTERS = tuple(key for key in _WRITER_METRIC_HELP if key != "pending")
+
+@metrics.register_collector
+def _collect_metrics():
+    families = []
+    if _pool is not None:
+        families += metrics.stats_collector(
+            "db_pool", _POOL_METRIC_HELP, _pool.stats(), _POOL_COUNTERS, {"pool": "sync"}
+        )
+    if _writer is not None:
+        families += metrics.stats_collector("db_writer", _WRITER_METRIC_HELP, _writer.stats(), _WRITER_COUNTERS)
+    families.append(("users_cache_entries", "gauge", "用户读缓存条目数", [({}, len(_users_cache))]))
+    families.append(("users_cache_version", "gauge", "users 表写入版本号", [({}, _users_version)]))
+    return families
+
+@contextmanager
+def connection():
+    """从连接池借一个连接：正常退出时提交，异常时回滚"""
+    with get_pool().connection() as conn:
+        yield conn
+
+def run_write(fn):
+    """执行写操作 fn(conn) 并返回其结果。
+
+    默认交给单写线程，与同时到达的其他写操作合并进一个事务；
+    DATABASE_WRITE_QUEUE=0 时直接在池连接上执行。
+    """
+    if not DB_WRITE_QUEUE:
+        with connection() as conn:
+            return fn(conn)
+    return get_writer().execute(fn)
+
 def init_db():
-    conn = get_connection()
-    cursor = conn.cursor()
+    """把数据库结构迁移到最新版本，返回本次执行的迁移步数。
+
+    已是最新版本时只读一次 PRAGMA user_version，不再逐个检查表、列与索引。
+    """
+    with connection() as conn:
+        # journal_mode 不能在事务中切换，且会持久化到数据库文件
+        conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+        if _schema_version(conn) >= SCHEMA_VERSION:
+            return 0
+        # 拿到写锁后再读一次版本：多个 worker 同时启动时只有第一个执行迁移
+        conn.execute("BEGIN IMMEDIATE")
+        version = _schema_version(conn)
+        cursor = conn.cursor()
+        for migration in MIGRATIONS[version:]:
+            migration(cursor)
+        # user_version 与结构变更在同一事务中提交，迁移中途失败会整体回滚
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return max(SCHEMA_VERSION - version, 0)
+
+def _schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _create_users(cursor):
     # 创建 users 表，如果它不存在
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -27,32 +219,21 @@ def init_db():
         )
     """)
 
-    # 检查并添加 is_admin 列
+    # 早期版本的 users 表没有这些列，检查并补上
     cursor.execute("PRAGMA table_info(users)")
     columns = [col[1] for col in cursor.fetchall()]
-    if 'is_admin' not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN is_admin INTEGER DEFAULT 0")
-        conn.commit()
-        print("Added 'is_admin' column to 'users' table.")
-
-    # 检查并添加 height 列
-    if 'height' not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN height REAL")
-        conn.commit()
-        print("Added 'height' column to 'users' table.")
-
-    # 检查并添加 weight 列
-    if 'weight' not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN weight REAL")
-        conn.commit()
-        print("Added 'weight' column to 'users' table.")
-
-    # 检查并添加 age 列
-    if 'age' not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN age INTEGER")
-        conn.commit()
-        print("Added 'age' column to 'users' table.")
+    for column, column_type in (("is_admin", "INTEGER DEFAULT 0"), ("height", "REAL"),
+                                ("weight", "REAL"), ("age", "INTEGER")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE users ADD COLUMN {column} {column_type}")
+            print(f"Added '{column}' column to 'users' table.")
+
+def _create_lookup_indexes(cursor):
+    # 前缀查找按不区分大小写的范围扫描，需要 NOCASE 排序规则的索引（UNIQUE 自带的索引是 BINARY）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users (username COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email_nocase ON users (email COLLATE NOCASE)")
 
+def _create_plans(cursor):
     # 创建 plans 表
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS plans (
@@ -67,146 +248,822 @@ def init_db():
         )
     """)
 
-    conn.commit()
-    conn.close()
+    # 历史方案按用户、时间倒序查询，复合索引让查询直接按索引顺序读取，无需全表扫描与排序
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_plans_user_created'")
+    if cursor.fetchone() is None:
+        cursor.execute("CREATE INDEX idx_plans_user_created ON plans (user_id, created_at DESC, id DESC)")
+        print("Added 'idx_plans_user_created' index to 'plans' table.")
+
+def _create_plan_cache(cursor):
+    # AI 方案缓存（见 plan_cache.py），键为量化输入的指纹
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS plan_cache (
+            key TEXT PRIMARY KEY,
+            ai_plan TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_plan_cache_created ON plan_cache (created_at)")
+
+_FTS_INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts (rowid, username, email, remark)
+        VALUES (new.id, new.username, new.email, new.remark);
+    END
+"""
+
+def _init_search_index(cursor):
+    """建立 users 的 FTS5 全文索引，由触发器与 users 表保持同步。
+
+    使用 trigram 分词：按字符三元组建索引，不依赖空格分词，中文备注的子串/前缀也能命中。
+    索引首次创建时从 users 全量回填。SQLite 未编译 FTS5 时退回 LIKE 扫描。
+    """
+    global _search_index_ready
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+    existed = cursor.fetchone() is not None
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                username, email, remark,
+                content='users', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"FTS5 unavailable, search falls back to LIKE: {e}")
+        _search_index_ready = False
+        return
+    cursor.execute(_FTS_INSERT_TRIGGER)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, username, email, remark)
+            VALUES ('delete', old.id, old.username, old.email, old.remark);
+        END
+    """)
+    # 只在被索引的列变化时重建该行索引，改 is_admin/身高体重不触发
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, email, remark ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, username, email, remark)
+            VALUES ('delete', old.id, old.username, old.email, old.remark);
+            INSERT INTO users_fts (rowid, username, email, remark)
+            VALUES (new.id, new.username, new.email, new.remark);
+        END
+    """)
+    if not existed:
+        cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+        print("Built 'users_fts' full-text index.")
+    _search_index_ready = True
+
+# 统计汇总：用户按年龄段与 BMI 分类、方案按 BMI 分类与按天的计数，由触发器随写入增量维护。
+# 年龄段为 (上界, 名称)，年龄小于上界即属于该段；超过最后一个上界为 60+，未填写为 unknown。
+AGE_BANDS = ((18, "<18"), (30, "18-29"), (40, "30-39"), (50, "40-49"), (60, "50-59"))
+# BMI 分类阈值 (上界, 分类)，BMI 小于上界即属于该分类，超过最后一个上界为“未知”。
+# api.py 的 _DEF_BMI_CATEGORIES 即此表；统计触发器在迁移时按它生成，修改阈值需要新增一步迁移重建触发器。
+BMI_CATEGORIES = ((18.5, "偏瘦"), (24.0, "正常"), (28.0, "超重"), (100.0, "肥胖"))
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+
+def _age_band_sql(age):
+    bands = " ".join(f"WHEN {age} < {upper} THEN '{label}'" for upper, label in AGE_BANDS)
+    return f"CASE WHEN {age} IS NULL THEN 'unknown' {bands} ELSE '60+' END"
+
+def _bmi_category_sql(height, weight):
+    """与 api._calc_bmi / _bmi_category 相同的分类；身高或体重未填写（或不为正数）时为 unknown"""
+    bmi = f"round({weight} / (({height} / 100.0) * ({height} / 100.0)), 2)"
+    categories = " ".join(f"WHEN {bmi} < {upper} THEN '{label}'" for upper, label in BMI_CATEGORIES)
+    return f"CASE WHEN NOT coalesce({height} > 0 AND {weight} > 0, 0) THEN 'unknown' {categories} ELSE '未知' END"
+
+def _stats_add_sql(metric, key, delta):
+    return (
+        f"INSERT INTO stats_counts (metric, key, value) VALUES ('{metric}', {key}, {delta}) "
+        f"ON CONFLICT (metric, key) DO UPDATE SET value = value + {delta};"
+    )
+
+_STATS_USERS_INSERT_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS stats_users_ai AFTER INSERT ON users BEGIN
+        {_stats_add_sql('age_band', _age_band_sql('new.age'), 1)}
+    END
+"""
+
+_STATS_USERS_BMI_INSERT_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS stats_users_bmi_ai AFTER INSERT ON users BEGIN
+        {_stats_add_sql('user_bmi_category', _bmi_category_sql('new.height', 'new.weight'), 1)}
+    END
+"""
+
+def _init_stats(cursor):
+    """建立统计汇总表与维护它的触发器；汇总表首次创建时从现有数据全量计算。
+
+    读统计只需按主键读取几十行，不随用户与方案数增长。
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_counts'")
+    existed = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_counts (
+            metric TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY (metric, key)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(_STATS_USERS_INSERT_TRIGGER)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_users_ad AFTER DELETE ON users BEGIN
+            {_stats_add_sql('age_band', _age_band_sql('old.age'), -1)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_users_au AFTER UPDATE OF age ON users
+        WHEN {_age_band_sql('old.age')} IS NOT {_age_band_sql('new.age')} BEGIN
+            {_stats_add_sql('age_band', _age_band_sql('old.age'), -1)}
+            {_stats_add_sql('age_band', _age_band_sql('new.age'), 1)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_plans_ai AFTER INSERT ON plans BEGIN
+            {_stats_add_sql('bmi_category', 'new.bmi_category', 1)}
+            {_stats_add_sql('plans_day', 'date(new.created_at)', 1)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_plans_ad AFTER DELETE ON plans BEGIN
+            {_stats_add_sql('bmi_category', 'old.bmi_category', -1)}
+            {_stats_add_sql('plans_day', 'date(old.created_at)', -1)}
+        END
+    """)
+    if not existed:
+        _rebuild_stats(cursor)
+        print("Built 'stats_counts' rollup table.")
+
+def _init_user_bmi_stats(cursor):
+    """用户按 BMI 分类的计数（每个用户计一次，按当前身高体重），随用户增删与身高体重修改维护"""
+    cursor.execute(_STATS_USERS_BMI_INSERT_TRIGGER)
+    old_category = _bmi_category_sql('old.height', 'old.weight')
+    new_category = _bmi_category_sql('new.height', 'new.weight')
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_users_bmi_ad AFTER DELETE ON users BEGIN
+            {_stats_add_sql('user_bmi_category', old_category, -1)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_users_bmi_au AFTER UPDATE OF height, weight ON users
+        WHEN {old_category} IS NOT {new_category} BEGIN
+            {_stats_add_sql('user_bmi_category', old_category, -1)}
+            {_stats_add_sql('user_bmi_category', new_category, 1)}
+        END
+    """)
+    cursor.execute("DELETE FROM stats_counts WHERE metric = 'user_bmi_category'")
+    _rebuild_user_bmi_stats(cursor)
+
+def _rebuild_user_bmi_stats(conn):
+    conn.execute(
+        f"INSERT INTO stats_counts (metric, key, value) "
+        f"SELECT 'user_bmi_category', {_bmi_category_sql('height', 'weight')} AS category, COUNT(*) "
+        f"FROM users GROUP BY category"
+    )
+
+def _rebuild_stats(conn):
+    conn.execute("DELETE FROM stats_counts")
+    conn.execute(
+        f"INSERT INTO stats_counts (metric, key, value) "
+        f"SELECT 'age_band', {_age_band_sql('age')} AS band, COUNT(*) FROM users GROUP BY band"
+    )
+    _rebuild_user_bmi_stats(conn)
+    conn.execute(
+        "INSERT INTO stats_counts (metric, key, value) "
+        "SELECT 'bmi_category', bmi_category, COUNT(*) FROM plans GROUP BY bmi_category"
+    )
+    conn.execute(
+        "INSERT INTO stats_counts (metric, key, value) "
+        "SELECT 'plans_day', date(created_at) AS day, COUNT(*) FROM plans WHERE day IS NOT NULL GROUP BY day"
+    )
+
+# 结构迁移，按顺序执行；PRAGMA user_version 记录已执行的步数。
+# 引入版本号之前建立的数据库 user_version 为 0，会从头执行一遍，因此每一步都要幂等。
+# 新的结构变更只追加到末尾，已发布的步骤不再修改。
+MIGRATIONS = (
+    _create_users,
+    _init_search_index,
+    _create_lookup_indexes,
+    _create_plans,
+    _create_plan_cache,
+    _init_stats,
+    _init_user_bmi_stats,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def _has_search_index(conn):
+    global _search_index_ready
+    if _search_index_ready is None:
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'").fetchone()
+        _search_index_ready = row is not None
+    return _search_index_ready
+
+def _fts_phrase_query(query):
+    """把用户输入转成 FTS5 查询：每个词作为带引号的短语，多个词取交集。
+
+    trigram 分词至少需要 3 个字符才能走索引，有更短的词时返回 None。
+    """
+    terms = query.split()
+    if not terms or any(len(term) < 3 for term in terms):
+        return None
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+# --- 用户读缓存 ---
+
+def users_etag(check=True):
+    """当前 users 表内容对应的 ETag，任何用户写入后都会变化。
+
+    check=False 时不读取 data_version，由调用方先行检查（异步代码见 database_async.check_data_version）。
+    """
+    if check:
+        _check_data_version()
+    with _users_cache_lock:
+        return f'"{_users_cache_epoch}-{_users_version}"'
+
+def _read_data_version():
+    """读取 PRAGMA data_version。这是阻塞 I/O，异步代码须放到线程中调用。
+
+    data_version 在其他连接（包括其他进程）提交后变化，且只对同一个连接的前后两次读取有意义，
+    因此用一个专用连接读取，不占连接池。
+    """
+    global _data_version_conn
+    with _data_version_lock:
+        if _data_version_conn is None:
+            _data_version_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        return _data_version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+def _apply_data_version(version):
+    """data_version 与上次不同（数据库被其他连接提交过写入）时，递增版本号并清空缓存。
+
+    它不区分表，写 plans 等表也会使用户缓存失效；本进程的写入会因此多失效一次，但不会返回过时内容。
+    """
+    global _data_version, _users_version
+    with _users_cache_lock:
+        if version != _data_version:
+            if _data_version is not None:
+                _users_version += 1
+                _users_cache.clear()
+            _data_version = version
+
+def _check_data_version():
+    _apply_data_version(_read_data_version())
+
+def _close_data_version_conn():
+    global _data_version_conn, _data_version
+    with _data_version_lock, _users_cache_lock:
+        if _data_version_conn is not None:
+            _data_version_conn.close()
+            _data_version_conn = None
+            _data_version = None
+
+def invalidate_users_cache():
+    """users 表写入提交后调用，使已缓存的总数与列表页全部失效"""
+    global _users_version
+    with _users_cache_lock:
+        _users_version += 1
+        _users_cache.clear()
+
+def cached_users_read(key, load):
+    """按 key 返回缓存结果，未命中时调用 load() 并缓存。返回的对象被多个请求共享，调用方不应修改。"""
+    version, value = users_cache_get(key)
+    if value is _MISSING:
+        value = load()
+        users_cache_put(key, version, value)
+    return value
+
+_MISSING = object()
+
+def users_cache_get(key, check=True):
+    """返回 (当前版本号, 缓存值)，未命中时缓存值为 _MISSING。读取数据后用同一版本号调用 users_cache_put。
+
+    check 的含义同 users_etag。
+    """
+    if check:
+        _check_data_version()
+    with _users_cache_lock:
+        entry = _users_cache.get(key) if USERS_CACHE_SIZE > 0 else None
+        if entry is not None and entry[0] == _users_version:
+            _users_cache.move_to_end(key)
+            return entry
+        return _users_version, _MISSING
+
+def users_cache_put(key, version, value, check=True):
+    if USERS_CACHE_SIZE <= 0:
+        return
+    if check:
+        _check_data_version()
+    with _users_cache_lock:
+        # 读取期间发生过写入时结果可能已过时，不缓存
+        if version != _users_version:
+            return
+        _users_cache[key] = (version, value)
+        _users_cache.move_to_end(key)
+        while len(_users_cache) > USERS_CACHE_SIZE:
+            _users_cache.popitem(last=False)
+
+def write_operation(invalidates_users=False):
+    """装饰写函数：被装饰的函数只构造并返回写任务 fn(conn)，调用时交给 run_write 执行并返回其结果。
+
+    原函数保存在 .build 上，database_async 用它构造同样的写任务后异步提交给写线程。
+    invalidates_users 为 True 时，提交后使用户读缓存失效。
+    """
+    def decorate(build):
+        @functools.wraps(build)
+        def wrapper(*args, **kwargs):
+            fn = build(*args, **kwargs)
+            return _run_users_write(fn) if invalidates_users else run_write(fn)
+        wrapper.build = build
+        wrapper.invalidates_users = invalidates_users
+        return wrapper
+    return decorate
+
+def _run_users_write(fn):
+    """执行修改 users 表的写操作，提交后使用户读缓存失效"""
+    try:
+        return run_write(fn)
+    finally:
+        invalidate_users_cache()
 
 # 以下是从 models.py 合并的 CRUD 函数
 def get_total_users_count():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM users")
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
+    return cached_users_read(("count",), _count_users)
 
-def get_all_users(skip=0, limit=None):
-    conn = get_connection()
-    cursor = conn.cursor()
-    if limit:
-        cursor.execute("SELECT * FROM users LIMIT ? OFFSET ?", (limit, skip))
-    else:
-        cursor.execute("SELECT * FROM users")
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+def _count_users():
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users")
+        return cursor.fetchone()[0]
+
+def user_fields(fields=None):
+    """校验并规范化列表接口的列投影，返回列名元组。
 
-def search_users(query):
-    conn = get_connection()
+    fields 为 None 时返回全部公开列；否则按 PUBLIC_USER_COLUMNS 的顺序排列并去重，id 总在第一列（键集分页需要）。
+    同一组列不论请求中的顺序都得到同一条 SQL，语句级指标的标签与用户读缓存的键不会随排列组合增长。
+    包含非公开列或未知列时抛出 ValueError。
+    """
+    if fields is None:
+        return PUBLIC_USER_COLUMNS
+    unknown = [field for field in fields if field not in PUBLIC_USER_COLUMNS]
+    if unknown:
+        raise ValueError(f"未知的字段: {', '.join(unknown)}")
+    return tuple(column for column in PUBLIC_USER_COLUMNS if column == "id" or column in fields)
+
+def _fetch_tuples(conn, sql, params=()):
+    """执行查询并以普通元组返回全部行，省去 sqlite3.Row 的构造，便于直接序列化"""
     cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(sql, params).fetchall()
+
+def get_all_users(skip=0, limit=None, columns=PUBLIC_USER_COLUMNS):
+    """偏移分页（旧接口）。limit 缺省或超过 MAX_PAGE_SIZE 时按 MAX_PAGE_SIZE 截断。
+
+    返回元组列表，各元素依次对应 columns（由 user_fields 得到）。
+    """
+    limit = min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+    return cached_users_read(("offset", skip, limit, columns), lambda: _load_users_page(skip, limit, columns))
+
+def _load_users_page(skip, limit, columns):
+    with connection() as conn:
+        return _fetch_tuples(conn, *_users_page_statement(skip, limit, columns))
+
+def _users_page_statement(skip, limit, columns):
+    return f"SELECT {', '.join(columns)} FROM users ORDER BY id LIMIT ? OFFSET ?", (limit, skip)
+
+def get_users_after(after_id=0, limit=DEFAULT_PAGE_SIZE, columns=PUBLIC_USER_COLUMNS):
+    """键集分页：按 id 升序返回 id > after_id 的一页用户。
+
+    直接沿主键 B 树定位起点，翻到多靠后都不需要扫描前面的行。
+    返回 (rows, next_after_id)，rows 为对应 columns 的元组列表，没有下一页时 next_after_id 为 None。
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    return cached_users_read(
+        ("after", after_id, limit, columns), lambda: _load_users_after(after_id, limit, columns)
+    )
+
+def _load_users_after(after_id, limit, columns):
+    with connection() as conn:
+        # 多取一行用来判断是否还有下一页
+        rows = _fetch_tuples(conn, *_users_after_statement(after_id, limit + 1, columns))
+    return _users_after_result(rows, limit)
+
+def _users_after_statement(after_id, limit, columns):
+    return f"SELECT {', '.join(columns)} FROM users WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+
+def _users_after_result(rows, limit):
+    """rows 比 limit 多取一行，返回 (rows, next_after_id)；id 总是第一列"""
+    next_after_id = rows[limit - 1][0] if len(rows) > limit else None
+    return rows[:limit], next_after_id
+
+def search_users(query, limit=DEFAULT_SEARCH_LIMIT, offset=0, columns=PUBLIC_USER_COLUMNS):
+    """在 username/email/remark 中搜索，按相关度 (bm25) 排序并分页，返回对应 columns 的元组列表。
+
+    查询词都不短于 3 个字符时走 FTS5 索引；更短的词（如两个汉字）退回 LIKE 扫描，
+    按 id 排序并同样受 limit 限制。
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    with connection() as conn:
+        return _fetch_tuples(conn, *_search_statement(query, limit, offset, _has_search_index(conn), columns))
+
+def _search_statement(query, limit, offset, fts, columns=PUBLIC_USER_COLUMNS):
+    """返回搜索用的 (SQL, 参数)；fts 表示 FTS5 索引可用"""
+    match = _fts_phrase_query(query) if fts else None
+    if match is not None:
+        return (
+            f"SELECT {', '.join('users.' + column for column in columns)} "
+            "FROM users_fts JOIN users ON users.id = users_fts.rowid "
+            "WHERE users_fts MATCH ? ORDER BY users_fts.rank LIMIT ? OFFSET ?",
+            (match, limit, offset)
+        )
     search_pattern = f"%{query}%"
-    cursor.execute("SELECT * FROM users WHERE username LIKE ? OR email LIKE ? OR remark LIKE ?", (search_pattern, search_pattern, search_pattern))
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return (
+        f"SELECT {', '.join(columns)} FROM users "
+        "WHERE username LIKE ? OR email LIKE ? OR remark LIKE ? ORDER BY id LIMIT ? OFFSET ?",
+        (search_pattern, search_pattern, search_pattern, limit, offset)
+    )
+
+def lookup_users(prefix, limit=DEFAULT_LOOKUP_LIMIT):
+    """按用户名或邮箱前缀（不区分大小写）查找用户，返回 (id, username) 元组列表，按用户名排序。
+
+    两个前缀各自在 NOCASE 索引上做范围扫描，最多读取 2 * limit 行；prefix 为空时返回按用户名排序的前 limit 个用户。
+    """
+    limit = min(limit, MAX_LOOKUP_LIMIT)
+    with connection() as conn:
+        return _fetch_tuples(conn, *_lookup_statement(prefix, limit))
+
+def _lookup_statement(prefix, limit):
+    # 与 NOCASE / LIKE 一致，只把 ASCII 字母转为小写
+    prefix = "".join(char.lower() if char.isascii() else char for char in prefix)
+    if not prefix:
+        return "SELECT id, username FROM users ORDER BY username COLLATE NOCASE LIMIT ?", (limit,)
+    upper = _prefix_upper_bound(prefix)
+    # 范围条件走索引；NOCASE 只折叠 ASCII 字母，范围是前缀匹配的超集，再以 LIKE 精确过滤
+    pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    branch = (
+        "SELECT id, username FROM users WHERE {0} COLLATE NOCASE >= ?1 "
+        + ("AND {0} COLLATE NOCASE < ?2 " if upper else "")
+        + "AND {0} LIKE ?3 ESCAPE '\\' ORDER BY {0} COLLATE NOCASE LIMIT ?4"
+    )
+    return (
+        f"SELECT id, username FROM ({branch.format('username')}) "
+        f"UNION SELECT id, username FROM ({branch.format('email')}) "
+        "ORDER BY username COLLATE NOCASE LIMIT ?4",
+        (prefix, upper, pattern, limit),
+    )
+
+def _prefix_upper_bound(prefix):
+    """以 prefix 开头的字符串都小于返回值：末字符加一（已是最大码点时去掉）；没有上界时返回 None"""
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000  # 跳过代理码点，它们不能编码为 UTF-8
+    return prefix[:-1] + chr(code)
 
 def get_user_by_id(user_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {_PUBLIC_USER_SQL} FROM users WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
     return dict(row) if row else None
 
 def get_user_by_email(email):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
-    row = cursor.fetchone()
-    conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {_PUBLIC_USER_SQL} FROM users WHERE email = ?", (email,))
+        row = cursor.fetchone()
+    return dict(row) if row else None
+
+def get_login_user(email):
+    """登录校验用：返回公开列加上 password（密码哈希），是唯一会读出密码列的函数"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {_PUBLIC_USER_SQL}, password FROM users WHERE email = ?", (email,))
+        row = cursor.fetchone()
     return dict(row) if row else None
 
+@write_operation(invalidates_users=True)
 def create_user(username, email, password, remark=None, is_admin=0, height=None, weight=None, age=None):
     """创建用户。若 username/email 已存在会抛出 sqlite3.IntegrityError。"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO users (username, email, password, remark, is_admin, height, weight, age) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (username, email, password, remark, is_admin, height, weight, age)
+    def _insert(conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO users (username, email, password, remark, is_admin, height, weight, age) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (username, email, password, remark, is_admin, height, weight, age)
+        )
+        return cursor.lastrowid
+    return _insert
+
+@write_operation(invalidates_users=True)
+def bulk_create_users(rows):
+    """批量创建用户，rows 为按 USER_IMPORT_COLUMNS 顺序排列的元组列表。
+
+    整批在单写线程的一个事务内完成：先剔除批内重复和库中已存在的用户名/邮箱，
+    再用 executemany 插入其余行。返回 (inserted, errors)，errors 为 [(行下标, 原因)]。
+    """
+    def _bulk(conn):
+        errors = []
+        usernames = [row[0] for row in rows]
+        emails = [row[1] for row in rows]
+        existing_usernames = _existing_values(conn, "username", usernames)
+        existing_emails = _existing_values(conn, "email", emails)
+        seen_usernames, seen_emails = set(), set()
+        valid = []
+        for i, row in enumerate(rows):
+            username, email = row[0], row[1]
+            if username in existing_usernames or username in seen_usernames:
+                errors.append((i, f"用户名已存在: {username}"))
+            elif email in existing_emails or email in seen_emails:
+                errors.append((i, f"邮箱已存在: {email}"))
+            else:
+                seen_usernames.add(username)
+                seen_emails.add(email)
+                valid.append((i, row))
+        placeholders = ", ".join("?" * len(USER_IMPORT_COLUMNS))
+        query = f"INSERT INTO users ({', '.join(USER_IMPORT_COLUMNS)}) VALUES ({placeholders})"
+        conn.execute("SAVEPOINT bulk_insert")
+        try:
+            # 年龄段计数同样在插入后按 id 区间分组一次性累加，不逐行 upsert
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+            conn.execute("DROP TRIGGER IF EXISTS stats_users_ai")
+            conn.execute("DROP TRIGGER IF EXISTS stats_users_bmi_ai")
+            if _has_search_index(conn):
+                # 逐行触发器维护 trigram 索引是导入的主要开销：本批插入期间停用插入触发器，
+                # 插入后再按 id 区间一次性写入索引。DDL 同样在事务内，回滚时触发器随之恢复。
+                conn.execute("DROP TRIGGER IF EXISTS users_fts_ai")
+                conn.executemany(query, [row for _, row in valid])
+                conn.execute(
+                    "INSERT INTO users_fts (rowid, username, email, remark) "
+                    "SELECT id, username, email, remark FROM users WHERE id > ?",
+                    (last_id,),
+                )
+                conn.execute(_FTS_INSERT_TRIGGER)
+            else:
+                conn.executemany(query, [row for _, row in valid])
+            for metric, key in (("age_band", _age_band_sql("age")),
+                                ("user_bmi_category", _bmi_category_sql("height", "weight"))):
+                conn.execute(
+                    f"INSERT INTO stats_counts (metric, key, value) "
+                    f"SELECT '{metric}', {key} AS k, COUNT(*) FROM users WHERE id > ? GROUP BY k "
+                    "ON CONFLICT (metric, key) DO UPDATE SET value = value + excluded.value",
+                    (last_id,),
+                )
+            conn.execute(_STATS_USERS_INSERT_TRIGGER)
+            conn.execute(_STATS_USERS_BMI_INSERT_TRIGGER)
+        except sqlite3.IntegrityError:
+            # 预检查之外的约束冲突：撤销本批，逐行插入以定位出错的行
+            conn.execute("ROLLBACK TO bulk_insert")
+            conn.execute("RELEASE bulk_insert")
+            inserted = 0
+            for i, row in valid:
+                try:
+                    conn.execute(query, row)
+                    inserted += 1
+                except sqlite3.IntegrityError as e:
+                    errors.append((i, str(e)))
+            errors.sort()
+            return inserted, errors
+        conn.execute("RELEASE bulk_insert")
+        return len(valid), errors
+    return _bulk
+
+def _existing_values(conn, column, values, chunk_size=500):
+    """返回 values 中已存在于 users.<column> 的值"""
+    found = set()
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor = conn.execute(f"SELECT {column} FROM users WHERE {column} IN ({placeholders})", chunk)
+        found.update(row[0] for row in cursor.fetchall())
+    return found
+
+def _iter_users_statement(columns, after_id, limit):
+    """id > after_id 的用户行（columns 列），按 id 顺序最多 limit 行（None 为不限）"""
+    # LIMIT -1 表示不限行数
+    return (
+        f"SELECT {', '.join(columns)} FROM users WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, -1 if limit is None else limit)
     )
-    conn.commit()
-    new_id = cursor.lastrowid
-    conn.close()
-    return new_id
 
-def authenticate_user(email, password):
-    conn = get_connection()
-    cursor = conn.cursor()
-    # 确保查询所有列，包括 is_admin
-    cursor.execute("SELECT * FROM users WHERE email = ? AND password = ?", (email, password))
-    row = cursor.fetchone()
-    conn.close()
-    return dict(row) if row else None
+def _next_after_id_statement(after_id, limit):
+    """取 id > after_id 的第 limit 与第 limit+1 行的 id；两行都存在时前者就是下一页的 after_id"""
+    return "SELECT id FROM users WHERE id > ? ORDER BY id LIMIT 2 OFFSET ?", (after_id, limit - 1)
+
+@write_operation(invalidates_users=True)
+def replace_password_hash(user_id, old_password, new_password):
+    """登录时把旧的明文/过时哈希替换为新哈希。仅当存储值仍为 old_password 时更新，避免覆盖并发的改密码。"""
+    def _replace(conn):
+        cursor = conn.execute(
+            "UPDATE users SET password = ? WHERE id = ? AND password = ?", (new_password, user_id, old_password)
+        )
+        return cursor.rowcount > 0
+    return _replace
 
+class UsersNotFound(LookupError):
+    """批量更新时部分用户不存在"""
+    def __init__(self, user_ids):
+        super().__init__(f"用户不存在: {user_ids}")
+        self.user_ids = user_ids
+
+@write_operation(invalidates_users=True)
 def update_user(user_id, username=None, email=None, password=None, remark=None, is_admin=None, height=None, weight=None, age=None):
-    conn = get_connection() # 注意：这里之前是 get_db_connection()，已更正为 get_connection()
-    cursor = conn.cursor()
-    updates = []
-    params = []
-
-    if username is not None:
-        updates.append("username = ?")
-        params.append(username)
-    if email is not None:
-        updates.append("email = ?")
-        params.append(email)
-    if password is not None:
-        updates.append("password = ?")
-        params.append(password)
-    if remark is not None:
-        updates.append("remark = ?")
-        params.append(remark)
-    if is_admin is not None:
-        updates.append("is_admin = ?")
-        params.append(is_admin)
-    if height is not None:
-        updates.append("height = ?")
-        params.append(height)
-    if weight is not None:
-        updates.append("weight = ?")
-        params.append(weight)
-    if age is not None:
-        updates.append("age = ?")
-        params.append(age)
-
-    if not updates:
-        conn.close()
-        return False
-
-    params.append(user_id)
-    query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
-    cursor.execute(query, tuple(params))
-    conn.commit()
-    conn.close()
-    return cursor.rowcount > 0
+    fields = dict(username=username, email=email, password=password, remark=remark,
+                  is_admin=is_admin, height=height, weight=weight, age=age)
+    statement = _user_update_statement(fields)
+
+    def _update(conn):
+        if statement is None:
+            return False
+        query, params = statement
+        cursor = conn.cursor()
+        cursor.execute(query, (*params, user_id))
+        return cursor.rowcount > 0
+    return _update
+
+@write_operation(invalidates_users=True)
+def update_users(updates):
+    """在一个事务中批量更新用户，updates 为 [(user_id, {字段: 值})]，值为 None 的字段不修改。
+
+    任一用户不存在时抛出 UsersNotFound，用户名/邮箱冲突时抛出 sqlite3.IntegrityError，
+    两种情况下整批都不生效。返回实际更新的用户数。
+    """
+    statements = [(user_id, _user_update_statement(fields)) for user_id, fields in updates]
 
+    def _update(conn):
+        cursor = conn.cursor()
+        updated, missing = 0, []
+        for user_id, statement in statements:
+            if statement is None:
+                exists = cursor.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone()
+                if exists is None:
+                    missing.append(user_id)
+                continue
+            query, params = statement
+            cursor.execute(query, (*params, user_id))
+            if cursor.rowcount:
+                updated += 1
+            else:
+                missing.append(user_id)
+        if missing:
+            # 抛出异常使写线程回滚本任务的保存点
+            raise UsersNotFound(missing)
+        return updated
+    return _update
+
+def _user_update_statement(fields):
+    """由值不为 None 的字段生成 (UPDATE 语句, 参数)，语句最后一个占位符是 id；没有可更新字段时返回 None"""
+    columns = [column for column in USER_UPDATE_COLUMNS if fields.get(column) is not None]
+    if not columns:
+        return None
+    assignments = ', '.join(f"{column} = ?" for column in columns)
+    return f"UPDATE users SET {assignments} WHERE id = ?", [fields[column] for column in columns]
+
+@write_operation(invalidates_users=True)
 def delete_user(user_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-    conn.commit()
-    conn.close()
-    return True
+    def _delete(conn):
+        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        return True
+    return _delete
 
 # --- Plan CRUD Functions ---
 
+@write_operation()
 def create_plan(user_id: int, bmi: float, bmi_category: str, suggestion: str, ai_plan: str):
     """为用户创建一个新的方案记录"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO plans (user_id, bmi, bmi_category, suggestion, ai_plan) VALUES (?, ?, ?, ?, ?)",
-        (user_id, bmi, bmi_category, suggestion, ai_plan)
-    )
-    conn.commit()
-    new_id = cursor.lastrowid
-    conn.close()
-    return new_id
-
-def get_plans_by_user_id(user_id: int):
-    """根据用户ID获取所有方案"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM plans WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    rows = cursor.fetchall()
-    conn.close()
+    def _insert(conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO plans (user_id, bmi, bmi_category, suggestion, ai_plan) VALUES (?, ?, ?, ?, ?)",
+            (user_id, bmi, bmi_category, suggestion, ai_plan)
+        )
+        return cursor.lastrowid
+    return _insert
+
+def get_plans_by_user_id(user_id: int, summary: bool = False):
+    """根据用户ID获取所有方案；summary=True 时不返回 ai_plan"""
+    columns = PLAN_SUMMARY_COLUMNS if summary else "*"
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {columns} FROM plans WHERE user_id = ? ORDER BY created_at DESC, id DESC", (user_id,))
+        rows = cursor.fetchall()
     return [dict(row) for row in rows]
+
+def get_plans_page(user_id: int, before=None, limit: int = DEFAULT_PAGE_SIZE, summary: bool = False):
+    """键集分页获取用户方案，按 (created_at, id) 倒序。
+
+    before 为上一页最后一条的 (created_at, id)。沿 idx_plans_user_created 索引定位，
+    返回 (plans, next_before)，没有下一页时 next_before 为 None。
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    with connection() as conn:
+        cursor = conn.cursor()
+        # 多取一行用来判断是否还有下一页
+        cursor.execute(*_plans_page_statement(user_id, before, limit + 1, summary))
+        rows = cursor.fetchall()
+    return _plans_page_result(rows, limit)
+
+def _plans_page_statement(user_id, before, limit, summary):
+    columns = PLAN_SUMMARY_COLUMNS if summary else "*"
+    if before is None:
+        return (
+            f"SELECT {columns} FROM plans WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+            (user_id, limit)
+        )
+    return (
+        f"SELECT {columns} FROM plans WHERE user_id = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT ?",
+        (user_id, before[0], before[1], limit)
+    )
+
+def _plans_page_result(rows, limit):
+    """rows 比 limit 多取一行，返回 (plans, next_before)"""
+    plans = [dict(row) for row in rows[:limit]]
+    next_before = (plans[-1]['created_at'], plans[-1]['id']) if len(rows) > limit else None
+    return plans, next_before
+
+def get_plan_by_id(plan_id: int):
+    """获取单个方案的完整内容"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM plans WHERE id = ?", (plan_id,))
+        row = cursor.fetchone()
+    return dict(row) if row else None
+
+# --- Stats ---
+
+@write_operation()
+def rebuild_stats():
+    """从 users / plans 全量重算统计汇总（触发器被绕过、手工改库之后使用），返回汇总行数"""
+    def _rebuild(conn):
+        _rebuild_stats(conn)
+        return conn.execute("SELECT COUNT(*) FROM stats_counts").fetchone()[0]
+    return _rebuild
+
+def _stats_statement(days):
+    """年龄段、用户与方案 BMI 分类的全部计数，以及最近 days 天（含今天，UTC）每天的方案数；计数减到 0 的行不返回"""
+    return (
+        "SELECT metric, key, value FROM stats_counts "
+        "WHERE metric IN ('age_band', 'user_bmi_category', 'bmi_category') AND value > 0 "
+        "UNION ALL SELECT metric, key, value FROM stats_counts "
+        "WHERE metric = 'plans_day' AND key >= date('now', ?) AND value > 0 ORDER BY 1, 2",
+        (f"-{days - 1} days",),
+    )
+
+def _stats_result(rows):
+    # stats_counts 中 bmi_category 为方案按分类的计数，user_bmi_category 为用户按当前身高体重的分类
+    age_bands = {}
+    bmi_categories = {}
+    plan_bmi_categories = {}
+    plans_per_day = []
+    for metric, key, value in rows:
+        if metric == 'age_band':
+            age_bands[key] = value
+        elif metric == 'user_bmi_category':
+            bmi_categories[key] = value
+        elif metric == 'bmi_category':
+            plan_bmi_categories[key] = value
+        else:
+            plans_per_day.append({"day": key, "plans": value})
+    return {
+        "users": sum(age_bands.values()),
+        "plans": sum(plan_bmi_categories.values()),
+        "age_bands": age_bands,
+        "bmi_categories": bmi_categories,
+        "plan_bmi_categories": plan_bmi_categories,
+        "plans_per_day": plans_per_day,
+    }
+
+def get_stats(days=STATS_DEFAULT_DAYS):
+    """读取统计汇总：{"users", "plans", "age_bands", "bmi_categories"（用户）, "plan_bmi_categories"（方案）,
+    "plans_per_day": [{"day", "plans"}]}"""
+    with connection() as conn:
+        return _stats_result(_fetch_tuples(conn, *_stats_statement(min(days, STATS_MAX_DAYS))))
+
+# --- Plan Cache Functions ---
+
+def get_cached_plan(key: str, min_created_at: float):
+    """读取未过期的缓存方案，返回 {"ai_plan", "created_at"} 或 None"""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT ai_plan, created_at FROM plan_cache WHERE key = ? AND created_at >= ?",
+            (key, min_created_at)
+        )
+        row = cursor.fetchone()
+    return dict(row) if row else None
+
+@write_operation()
+def put_cached_plan(key: str, ai_plan: str, created_at: float, expire_before: float, max_rows: int):
+    """写入缓存方案，并清理过期条目；超过 max_rows 时淘汰最早写入的条目"""
+    def _put(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO plan_cache (key, ai_plan, created_at) VALUES (?, ?, ?)",
+            (key, ai_plan, created_at)
+        )
+        conn.execute("DELETE FROM plan_cache WHERE created_at < ?", (expire_before,))
+        conn.execute(
+            "DELETE FROM plan_cache WHERE key IN ("
+            "SELECT key FROM plan_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (max_rows,)
+        )
+    return _put
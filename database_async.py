@@ -0,0 +1,402 @@
+"""异步数据访问层
+
+与 database.py 提供同名的读写函数，供 async 端点直接 await，不再占用 Starlette 的线程池。
+
+读操作走 aiosqlite 连接池：每个连接在自己的后台线程里执行 SQL，事件循环只等待结果。
+写操作仍交给 database 的单写线程（与同步接口共用同一个队列，继续合并事务、串行写入），
+这里只是把写线程返回的 Future 包装成可 await 的对象；写任务本身由 database 中被
+write_operation 装饰的函数构造，SQL 只有一份。
+用户总数与列表页同样经过 database 的用户读缓存。
+"""
+import asyncio
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+import database
+import db_metrics
+import metrics
+from database import (
+    MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE, DEFAULT_SEARCH_LIMIT, DEFAULT_LOOKUP_LIMIT, MAX_LOOKUP_LIMIT, PUBLIC_USER_COLUMNS,
+)
+from db_pool import PoolTimeout
+
+
+class AsyncConnectionPool:
+    """aiosqlite 连接池：按需建连，最多 size 个，借出时若全部在用则等待至多 timeout 秒。
+
+    借用权由信号量按到达顺序分配，避免新请求插队使早到的请求长时间拿不到连接。
+    流式读取（见 open_stream）不从池中借连接，几个慢速下载的客户端不会耗尽池、拖垮其他接口。
+    """
+
+    def __init__(self, size=database.DB_POOL_SIZE, timeout=database.DB_POOL_TIMEOUT,
+                 stream_limit=database.DB_STREAM_LIMIT):
+        if size < 1 or stream_limit < 1:
+            raise ValueError("连接池大小与流式读取上限至少为 1")
+        self.size = size
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(size)
+        self._stream_slots = asyncio.Semaphore(stream_limit)
+        self._streams = 0
+        self._idle = []
+        self._created = 0
+        self._closed = False
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._timeouts = 0
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(database.DB_PATH, factory=db_metrics.connection_factory())
+        conn.row_factory = sqlite3.Row
+        for pragma in database._CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def _wait(self, slots):
+        if slots.locked():
+            # asyncio.timeout 不像 wait_for 那样为每次等待新建任务
+            start = time.perf_counter()
+            try:
+                async with asyncio.timeout(self.timeout):
+                    await slots.acquire()
+            except TimeoutError:
+                self._timeouts += 1
+                raise PoolTimeout(f"等待数据库连接超时 ({self.timeout}s)")
+            finally:
+                self._waits += 1
+                self._wait_seconds += time.perf_counter() - start
+        else:
+            await slots.acquire()
+
+    async def acquire(self):
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        await self._wait(self._slots)
+        if self._idle:
+            return self._idle.pop()
+        try:
+            conn = await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._created += 1
+        return conn
+
+    async def release(self, conn):
+        if self._closed:
+            self._created -= 1
+            await conn.close()
+        else:
+            self._idle.append(conn)
+        self._slots.release()
+
+    async def _discard(self, conn):
+        self._created -= 1
+        self._slots.release()
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            # 包括请求被取消：回滚后放回池中，回滚失败说明连接已不可用，丢弃
+            try:
+                await asyncio.shield(conn.rollback())
+            except BaseException:
+                await self._discard(conn)
+                raise
+            await self.release(conn)
+            raise
+        await self.release(conn)
+
+    async def open_stream(self):
+        """为一次流式读取新建独立连接，用完须交给 close_stream。
+
+        读取时间取决于客户端的下载速度，不能占用请求共用的池连接；并发数由单独的信号量限制。
+        """
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        await self._wait(self._stream_slots)
+        try:
+            conn = await self._connect()
+        except BaseException:
+            self._stream_slots.release()
+            raise
+        self._streams += 1
+        return conn
+
+    async def close_stream(self, conn):
+        try:
+            await asyncio.shield(conn.close())
+        finally:
+            self._streams -= 1
+            self._stream_slots.release()
+
+    async def close(self):
+        self._closed = True
+        while self._idle:
+            conn = self._idle.pop()
+            self._created -= 1
+            await conn.close()
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": len(self._idle),
+            "waits": self._waits,
+            "wait_seconds": self._wait_seconds,
+            "timeouts": self._timeouts,
+            "streams": self._streams,
+        }
+
+
+_pool = None
+
+
+def get_pool():
+    """返回当前事件循环使用的连接池，首次调用时创建"""
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool()
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+@metrics.register_collector
+def _collect_metrics():
+    if _pool is None:
+        return []
+    return metrics.stats_collector(
+        "db_pool", database._POOL_METRIC_HELP, _pool.stats(), database._POOL_COUNTERS, {"pool": "async"}
+    )
+
+
+def connection():
+    return get_pool().connection()
+
+
+async def _fetchall(sql, params=()):
+    async with connection() as conn:
+        return await conn.execute_fetchall(sql, params)
+
+
+async def _fetch_tuples(sql, params=()):
+    """以普通元组返回全部行（不构造 sqlite3.Row）"""
+    async with connection() as conn:
+        async with conn.execute(sql, params) as cursor:
+            cursor.row_factory = None
+            return await cursor.fetchall()
+
+
+async def _fetchone(sql, params=()):
+    rows = await _fetchall(sql, params)
+    return rows[0] if rows else None
+
+
+async def run_write(fn):
+    """把写任务 fn(conn) 交给单写线程并等待其提交；关闭写队列时在线程中直接执行"""
+    if not database.DB_WRITE_QUEUE:
+        return await asyncio.to_thread(database.run_write, fn)
+    return await asyncio.wrap_future(database.get_writer().submit(fn))
+
+
+def _async_write(operation):
+    """由 database 中 write_operation 装饰的同步写函数生成对应的 async 版本"""
+    async def wrapper(*args, **kwargs):
+        fn = operation.build(*args, **kwargs)
+        try:
+            return await run_write(fn)
+        finally:
+            if operation.invalidates_users:
+                database.invalidate_users_cache()
+    wrapper.__name__ = operation.__name__
+    wrapper.__qualname__ = operation.__qualname__
+    wrapper.__doc__ = operation.__doc__
+    return wrapper
+
+
+async def check_data_version():
+    """database._check_data_version 的异步版本：在线程中读取 data_version，不阻塞事件循环"""
+    database._apply_data_version(await asyncio.to_thread(database._read_data_version))
+
+
+async def users_etag():
+    await check_data_version()
+    return database.users_etag(check=False)
+
+
+async def cached_users_read(key, load, check=True):
+    """database.cached_users_read 的异步版本，load 为返回可等待对象的函数。
+
+    调用方刚检查过 data_version（如先取了 ETag）时可传 check=False，省去一次线程切换。
+    """
+    if check:
+        await check_data_version()
+    version, value = database.users_cache_get(key, check=False)
+    if value is database._MISSING:
+        value = await load()
+        if database.USERS_CACHE_SIZE > 0:
+            await check_data_version()
+        database.users_cache_put(key, version, value, check=False)
+    return value
+
+
+# --- 用户 ---
+
+async def get_total_users_count():
+    return await cached_users_read(("count",), _count_users)
+
+
+async def _count_users():
+    row = await _fetchone("SELECT COUNT(*) FROM users")
+    return row[0]
+
+
+async def get_all_users(skip=0, limit=None, columns=PUBLIC_USER_COLUMNS):
+    limit = min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+    return await cached_users_read(
+        ("offset", skip, limit, columns), lambda: _fetch_tuples(*database._users_page_statement(skip, limit, columns))
+    )
+
+
+async def get_users_after(after_id=0, limit=DEFAULT_PAGE_SIZE, columns=PUBLIC_USER_COLUMNS):
+    limit = min(limit, MAX_PAGE_SIZE)
+    return await cached_users_read(
+        ("after", after_id, limit, columns), lambda: _load_users_after(after_id, limit, columns)
+    )
+
+
+async def _load_users_after(after_id, limit, columns):
+    rows = await _fetch_tuples(*database._users_after_statement(after_id, limit + 1, columns))
+    return database._users_after_result(rows, limit)
+
+
+async def search_users(query, limit=DEFAULT_SEARCH_LIMIT, offset=0, columns=PUBLIC_USER_COLUMNS):
+    limit = min(limit, MAX_PAGE_SIZE)
+    if database._search_index_ready is None:
+        row = await _fetchone("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+        database._search_index_ready = row is not None
+    return await _fetch_tuples(
+        *database._search_statement(query, limit, offset, database._search_index_ready, columns)
+    )
+
+
+async def lookup_users(prefix, limit=DEFAULT_LOOKUP_LIMIT):
+    return await _fetch_tuples(*database._lookup_statement(prefix, min(limit, MAX_LOOKUP_LIMIT)))
+
+
+async def get_user_by_id(user_id):
+    row = await _fetchone(f"SELECT {database._PUBLIC_USER_SQL} FROM users WHERE id = ?", (user_id,))
+    return dict(row) if row else None
+
+
+async def get_login_user(email):
+    """登录校验用：公开列加上 password（密码哈希）"""
+    row = await _fetchone(f"SELECT {database._PUBLIC_USER_SQL}, password FROM users WHERE email = ?", (email,))
+    return dict(row) if row else None
+
+
+class UsersStream:
+    """已借到独立连接的用户流式读取，由 open_users_stream 创建。
+
+    async for 逐批产出元组行，读完或出错时关闭连接；未读完就放弃时由调用方 aclose()（可重复调用）。
+    """
+
+    def __init__(self, pool, conn, statement, batch_size):
+        self._pool = pool
+        self._conn = conn
+        self._statement = statement
+        self._batch_size = batch_size
+        self._closed = False
+
+    async def __aiter__(self):
+        try:
+            async with self._conn.execute(*self._statement) as cursor:
+                cursor.row_factory = None
+                while True:
+                    rows = await cursor.fetchmany(self._batch_size)
+                    if not rows:
+                        break
+                    yield rows
+        finally:
+            await self.aclose()
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            await self._pool.close_stream(self._conn)
+
+
+async def open_users_stream(columns=PUBLIC_USER_COLUMNS, batch_size=1000, after_id=0, limit=None):
+    """按 id 顺序流式读取 id > after_id 的用户，逐批产出 columns 的元组行，最多 limit 行（None 为不限）。
+
+    读取的是开始时的一致快照。在返回前就借好独立连接（见 open_stream），
+    端点可以在发送响应头之前把等待超时转成 503"""
+    pool = get_pool()
+    conn = await pool.open_stream()
+    return UsersStream(pool, conn, database._iter_users_statement(columns, after_id, limit), batch_size)
+
+
+async def users_next_after_id(after_id, limit):
+    """不读取整页，只沿主键索引判断 after_id 之后 limit 行的一页是否还有下一页，返回下一页的 after_id 或 None"""
+    rows = await _fetchall(*database._next_after_id_statement(after_id, limit))
+    return rows[0][0] if len(rows) == 2 else None
+
+
+create_user = _async_write(database.create_user)
+bulk_create_users = _async_write(database.bulk_create_users)
+update_user = _async_write(database.update_user)
+update_users = _async_write(database.update_users)
+delete_user = _async_write(database.delete_user)
+replace_password_hash = _async_write(database.replace_password_hash)
+
+
+# --- 方案 ---
+
+async def get_plans_by_user_id(user_id, summary=False):
+    columns = database.PLAN_SUMMARY_COLUMNS if summary else "*"
+    rows = await _fetchall(
+        f"SELECT {columns} FROM plans WHERE user_id = ? ORDER BY created_at DESC, id DESC", (user_id,)
+    )
+    return [dict(row) for row in rows]
+
+
+async def get_plans_page(user_id, before=None, limit=DEFAULT_PAGE_SIZE, summary=False):
+    limit = min(limit, MAX_PAGE_SIZE)
+    rows = await _fetchall(*database._plans_page_statement(user_id, before, limit + 1, summary))
+    return database._plans_page_result(rows, limit)
+
+
+async def get_stats(days=database.STATS_DEFAULT_DAYS):
+    rows = await _fetch_tuples(*database._stats_statement(min(days, database.STATS_MAX_DAYS)))
+    return database._stats_result(rows)
+
+
+async def get_plan_by_id(plan_id):
+    row = await _fetchone("SELECT * FROM plans WHERE id = ?", (plan_id,))
+    return dict(row) if row else None
+
+
+async def get_cached_plan(key, min_created_at):
+    row = await _fetchone(
+        "SELECT ai_plan, created_at FROM plan_cache WHERE key = ? AND created_at >= ?", (key, min_created_at)
+    )
+    return dict(row) if row else None
+
+
+create_plan = _async_write(database.create_plan)
+put_cached_plan = _async_write(database.put_cached_plan)
@@ -0,0 +1,152 @@
+"""SQLite 语句计时
+
+database.get_connection() 与 aiosqlite 连接池都以 TimedConnection 作为 sqlite3 的连接类，
+于是池连接、写线程连接与异步连接上执行的每条语句都会经过 TimedCursor：
+按规范化后的 SQL 统计执行次数、耗时与行数，超过 SLOW_QUERY_MS 的语句写入慢查询日志。
+
+SELECT 的耗时包括 execute 与之后各次 fetch*，在结果取完、游标再次执行、关闭或被回收时记录；
+行数按 fetch* 取到的行数计（直接迭代游标取到的行不计入），写语句取 rowcount。
+日志只记录 SQL 文本，不记录参数（可能含密码哈希等敏感数据）。
+"""
+import logging
+import os
+import re
+import sqlite3
+import time
+
+import metrics
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS") or 0)  # 0 表示不记录慢查询
+
+slow_query_log = logging.getLogger("database.slow_query")
+
+statement_seconds = metrics.histogram(
+    "db_statement_duration_seconds", "SQL 语句耗时（含 fetch）", ("statement",), metrics.DB_BUCKETS
+)
+statement_rows = metrics.counter("db_statement_rows_total", "SQL 语句读取或影响的行数", ("statement",))
+statement_errors = metrics.counter("db_statement_errors_total", "执行出错的 SQL 语句数", ("statement",))
+slow_queries = metrics.counter("db_slow_queries_total", "超过 SLOW_QUERY_MS 的语句数", ("statement",))
+
+_MAX_LABEL_LENGTH = 200
+_labels = {}
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def statement_label(sql):
+    """把 SQL 规范化为指标标签：压缩空白，IN (?, ?, ...) 这类变长占位符列表折叠为 "?, ..."。"""
+    label = _labels.get(sql)
+    if label is None:
+        label = _PLACEHOLDER_LIST.sub("?, ...", _WHITESPACE.sub(" ", sql).strip())
+        if len(label) > _MAX_LABEL_LENGTH:
+            label = label[:_MAX_LABEL_LENGTH - 3] + "..."
+        # 语句基本都是固定模板，缓存数量有限；超出上限后不再缓存，只是每次多做一次正则替换
+        if len(_labels) < 4096:
+            _labels[sql] = label
+    return label
+
+
+def _record(sql, seconds, rows):
+    label = statement_label(sql)
+    statement_seconds.observe(seconds, label)
+    if rows > 0:
+        statement_rows.inc(label, amount=rows)
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc(label)
+        slow_query_log.warning("慢查询 %.1f ms, %d 行: %s", seconds * 1000, rows, label)
+
+
+class TimedCursor(sqlite3.Cursor):
+    _sql = None
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            _record(sql, self._seconds, self._rows)
+
+    def _run(self, method, sql, *args):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            method(self, sql, *args)
+        except Exception:
+            statement_errors.inc(statement_label(sql))
+            raise
+        seconds = time.perf_counter() - start
+        if self.description is None:
+            _record(sql, seconds, max(self.rowcount, 0))
+        else:
+            self._sql, self._seconds, self._rows = sql, seconds, 0
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self._run(sqlite3.Cursor.executescript, script)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if self._sql is not None:
+            self._seconds += time.perf_counter() - start
+            if row is None:
+                self._finish()
+            else:
+                self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        if self._sql is not None:
+            self._seconds += time.perf_counter() - start
+            self._rows += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        if self._sql is not None:
+            self._seconds += time.perf_counter() - start
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # 只取了一行就丢弃的游标（如按 id 查询）在这里记录
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.connect(factory=TimedConnection)：连接上的快捷 execute* 也走 TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def connection_factory():
+    """database 建连时使用的 sqlite3 连接类；既不统计指标也不记录慢查询时为原生 Connection，没有额外开销"""
+    return TimedConnection if metrics.METRICS_ENABLED or SLOW_QUERY_MS else sqlite3.Connection
@@ -0,0 +1,119 @@
+"""SQLite 连接池
+
+FastAPI 的同步端点跑在线程池里，原来每次调用都要 sqlite3.connect/close，
+每个请求都得重新打开文件、解析 schema、预热页缓存。这里维护固定数量的长连接，
+借出期间由一个线程独占，归还后复用；PRAGMA 只在建连时由 factory 设置一次。
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时"""
+
+
+class ConnectionPool:
+    def __init__(self, factory, size=8, timeout=30.0):
+        if size < 1:
+            raise ValueError("连接池大小至少为 1")
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        # LIFO：优先复用刚归还的连接，页缓存更热
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        # 池满时需要等待的借出次数、累计等待时间与超时次数
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._timeouts = 0
+
+    def acquire(self):
+        """借出一个连接；池满时最多等待 timeout 秒"""
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        start = time.perf_counter()
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(f"等待数据库连接超时 ({self.timeout}s)")
+        finally:
+            with self._lock:
+                self._waits += 1
+                self._wait_seconds += time.perf_counter() - start
+
+    def release(self, conn):
+        """归还连接；连接池已关闭时直接关掉"""
+        if self._closed:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """丢弃一个(可能已损坏的)连接，腾出名额给新连接"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        """借出连接；正常结束时提交，异常时回滚，最后归还到池中"""
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                self.discard(conn)
+                raise
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """关闭所有空闲连接；借出中的连接在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": self._idle.qsize(),
+            "waits": self._waits,
+            "wait_seconds": self._wait_seconds,
+            "timeouts": self._timeouts,
+        }
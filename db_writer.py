@@ -0,0 +1,162 @@
+"""单写线程队列
+
+SQLite 同一时刻只允许一个写事务。多个线程各自开事务抢锁时，突发写入会互相等待，
+等到 busy_timeout 仍拿不到锁就抛出 "database is locked"。这里把所有写操作交给
+一个专用线程串行执行，并把排队中的多个写操作合并进同一个事务提交：
+每个写操作包在自己的 SAVEPOINT 里，单个失败只回滚它自己，不影响同批的其他写入。
+建连或回滚失败时整批以该异常结束，丢弃连接，下一批重新建连，写线程不会因此退出。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self, factory, max_batch=64, timeout=None):
+        self._factory = factory
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # 只由写线程更新
+        self._stats = {
+            "batches": 0,
+            "jobs": 0,
+            "failed_jobs": 0,
+            "failed_batches": 0,
+            "queue_wait_seconds": 0.0,  # 从提交到所在批次开始执行
+            "lock_wait_seconds": 0.0,   # BEGIN IMMEDIATE 等待写锁
+            "commit_seconds": 0.0,      # 整批从 BEGIN 到 COMMIT
+        }
+
+    def submit(self, fn):
+        """提交写操作 fn(conn)，返回 Future；结果在所在事务提交后才可用"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, future, time.perf_counter()))
+        return future
+
+    def execute(self, fn):
+        """提交写操作并等待其提交完成，返回 fn 的返回值或重新抛出其异常。
+
+        超过 timeout 秒仍未完成时抛出 TimeoutError；此时若还在排队则撤销，已开始执行的仍会提交。
+        """
+        future = self.submit(fn)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise TimeoutError(f"等待写操作提交超时 ({self.timeout}s)") from None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return dict(self._stats, pending=self._queue.qsize())
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                    self._thread.start()
+
+    def _connect(self):
+        conn = self._factory()
+        # 自行管理事务，不让 sqlite3 模块隐式 BEGIN
+        conn.isolation_level = None
+        return conn
+
+    def _run(self):
+        conn = None
+        try:
+            stop = False
+            while not stop:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    self._commit_batch(conn, batch)
+                except Exception as e:
+                    # 建连失败，或回滚失败（连接已不可用）：丢弃连接，下一批重新建立
+                    self._fail(batch, e)
+                    if conn is not None:
+                        try:
+                            conn.close()
+                        except Exception:
+                            pass
+                        conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _fail(self, batch, error):
+        """以 error 结束 batch 中尚未完成的写操作"""
+        pending = [future for _, future, _ in batch if not future.done()]
+        if pending:
+            self._stats["failed_batches"] += 1
+        for future in pending:
+            future.set_exception(error)
+
+    def _commit_batch(self, conn, batch):
+        outcomes = []
+        stats = self._stats
+        start = time.perf_counter()
+        stats["batches"] += 1
+        stats["jobs"] += len(batch)
+        stats["queue_wait_seconds"] += sum(start - submitted for _, _, submitted in batch)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            stats["lock_wait_seconds"] += time.perf_counter() - start
+            for fn, future, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_job")
+                try:
+                    result = fn(conn)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_job")
+                    conn.execute("RELEASE write_job")
+                    outcomes.append((future, e, None))
+                    stats["failed_jobs"] += 1
+                else:
+                    conn.execute("RELEASE write_job")
+                    outcomes.append((future, None, result))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # 事务本身失败（磁盘满、锁超时等）：整批都没有写入。
+            # 先结束整批再回滚，回滚失败时由 _run 丢弃连接
+            self._fail(batch, e)
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return
+        finally:
+            stats["commit_seconds"] += time.perf_counter() - start
+        for future, error, result in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -0,0 +1,201 @@
+"""长生命周期的 LLM 客户端
+
+原来每次生成方案都新建 OpenAI 客户端：新的 httpx 连接池、新的 TLS 握手，没有 keep-alive，
+还要重新读一遍 apikey 和环境变量。这里在应用启动时创建一个客户端，复用调好参数的连接池，
+对 429/5xx/连接错误做指数退避重试，并记录在途请求数、延迟、重试次数与 token 用量，
+同时写入 metrics（GET /metrics）。openai 与连接池在第一次请求时才导入、创建。
+"""
+import importlib.util
+import os
+import random
+import threading
+import time
+
+import metrics
+
+try:
+    import apikey
+except ImportError:
+    apikey = None
+
+# openai SDK 导入要 0.5s 以上，放到第一次请求时再导入；启动时只检查是否已安装
+_openai_available = importlib.util.find_spec("openai") is not None
+
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE") or 20)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT") or 60)
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT") or 5)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES") or 2)
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF") or 0.5)  # 首次重试前等待的秒数，之后翻倍
+# 流式请求附带 stream_options.include_usage，让服务端在最后一段返回 token 用量；不支持该参数的服务可关闭
+LLM_STREAM_USAGE = (os.getenv("LLM_STREAM_USAGE") or "1").lower() not in ("0", "false", "no", "off")
+
+llm_requests = metrics.counter("llm_requests_total", "LLM 请求数", ("operation", "outcome"))
+llm_request_seconds = metrics.histogram(
+    "llm_request_duration_seconds", "LLM 请求耗时（含重试，流式计到最后一段）", ("operation",), metrics.LLM_BUCKETS
+)
+llm_retries = metrics.counter("llm_retries_total", "LLM 请求重试次数")
+llm_tokens = metrics.counter("llm_tokens_total", "LLM token 用量", ("type",))
+
+
+def _retryable(error):
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    # 包括 APITimeoutError
+    return isinstance(error, APIConnectionError)
+
+
+class LLMClient:
+    def __init__(self, api_key, base_url=None, model="deepseek-chat", pool_size=LLM_POOL_SIZE,
+                 timeout=LLM_TIMEOUT, connect_timeout=LLM_CONNECT_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, retry_backoff=LLM_RETRY_BACKOFF):
+        self.model = model
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._client_options = (api_key, base_url, pool_size, timeout, connect_timeout)
+        self._http = None
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {
+            "pool_size": pool_size,
+            "in_flight": 0,
+            "requests": 0,
+            "failures": 0,
+            "retries": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency_seconds_sum": 0.0,
+            "latency_seconds_max": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        """按 apikey.py > DEEPSEEK_API_KEY > OPENAI_API_KEY 的顺序取密钥；未配置或未安装 openai 时返回 None"""
+        if not _openai_available:
+            return None
+        api_key_from_file = getattr(apikey, 'apikey', None)
+        api_key = api_key_from_file if api_key_from_file and api_key_from_file != "你的key" else os.getenv('DEEPSEEK_API_KEY') or os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            return None
+        return cls(
+            api_key,
+            base_url=os.getenv('DEEPSEEK_BASE_URL'),  # 如 https://api.deepseek.com
+            model=os.getenv('DEEPSEEK_MODEL', 'deepseek-chat'),
+        )
+
+    def chat(self, messages, **kwargs):
+        """一次性生成，返回完整文本"""
+        start = self._begin()
+        ok = False
+        try:
+            completion = self._create(messages, **kwargs)
+            self._record_usage(completion.usage)
+            ok = True
+            return completion.choices[0].message.content.strip()
+        finally:
+            self._end(start, ok, "chat")
+
+    def stream_chat(self, messages, **kwargs):
+        """流式生成，逐段产出文本。只在收到第一段之前重试。"""
+        start = self._begin()
+        ok = False
+        try:
+            if LLM_STREAM_USAGE:
+                kwargs.setdefault("stream_options", {"include_usage": True})
+            stream = self._create(messages, stream=True, **kwargs)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None) is not None:
+                    self._record_usage(chunk.usage)
+            ok = True
+        except GeneratorExit:
+            # 调用方提前停止读取（如客户端断开），不算失败
+            ok = True
+            raise
+        finally:
+            self._end(start, ok, "stream")
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["latency_seconds_avg"] = stats["latency_seconds_sum"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+
+    def _openai(self):
+        """第一次请求时导入 openai 并创建客户端与连接池"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+
+                    api_key, base_url, pool_size, timeout, connect_timeout = self._client_options
+                    self._http = httpx.Client(
+                        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                    )
+                    # 重试由本类负责，以便统计重试次数
+                    self._client = OpenAI(api_key=api_key, base_url=base_url, http_client=self._http, max_retries=0)
+        return self._client
+
+    def _create(self, messages, **kwargs):
+        client = self._openai()
+        attempt = 0
+        while True:
+            try:
+                return client.chat.completions.create(model=self.model, messages=messages, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not _retryable(e):
+                    raise
+                time.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+                with self._lock:
+                    self._stats["retries"] += 1
+                llm_retries.inc()
+
+    def _retry_delay(self, error, attempt):
+        # 429 时优先遵循服务端给出的 Retry-After
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+        return self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def _begin(self):
+        with self._lock:
+            self._stats["in_flight"] += 1
+        return time.perf_counter()
+
+    def _record_usage(self, usage):
+        if usage is None:
+            return
+        prompt = usage.prompt_tokens or 0
+        completion = usage.completion_tokens or 0
+        with self._lock:
+            self._stats["prompt_tokens"] += prompt
+            self._stats["completion_tokens"] += completion
+        llm_tokens.inc("prompt", amount=prompt)
+        llm_tokens.inc("completion", amount=completion)
+
+    def _end(self, start, ok, operation):
+        elapsed = time.perf_counter() - start
+        llm_request_seconds.observe(elapsed, operation)
+        llm_requests.inc(operation, "success" if ok else "failure")
+        with self._lock:
+            stats = self._stats
+            stats["in_flight"] -= 1
+            stats["requests"] += 1
+            if not ok:
+                stats["failures"] += 1
+            stats["latency_seconds_sum"] += elapsed
+            stats["latency_seconds_max"] = max(stats["latency_seconds_max"], elapsed)
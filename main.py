@@ -1,12 +1,11 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import hashlib
+import json
 import requests
-import os
+import pyarrow as pa
 
-# --- API Configuration ---
-API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+import api_client
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -18,12 +17,37 @@ st.set_page_config(
 
 # --- Helper Functions ---
 
-def hash_password(password):
-    """
-    Hashes a password using SHA256. 
-    This is now only used for client-side password verification for critical actions.
-    """
-    return hashlib.sha256(password.encode()).hexdigest()
+def iter_sse(response):
+    """解析 Server-Sent Events 流式响应，逐个产出 (event, data)"""
+    response.encoding = 'utf-8'
+    event, data_lines = 'message', []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data_lines:
+                yield event, json.loads('\n'.join(data_lines))
+            event, data_lines = 'message', []
+        elif line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data_lines.append(line[len('data:'):].lstrip())
+
+def read_arrow(response):
+    """把 format=arrow 的响应体（Arrow IPC 流）读成 DataFrame"""
+    return pa.ipc.open_stream(response.content).read_pandas()
+
+def user_picker(label, key):
+    """输入联想选择用户：按输入的用户名或邮箱开头请求 /users/lookup，返回选中用户的 id，没有匹配时返回 None"""
+    prefix = st.text_input(f"🔍 {label}", key=f"{key}_prefix", placeholder="输入用户名或邮箱的开头，回车后更新候选")
+    response = api_client.get("/users/lookup", params={"prefix": prefix.strip(), "limit": 20})
+    if not response.ok:
+        handle_api_error(response, "查找用户")
+        return None
+    matches = response.json()
+    if not matches:
+        st.info("没有匹配的用户。")
+        return None
+    options = {f"{user['id']} - {user['username']}": user['id'] for user in matches}
+    return options[st.selectbox("👤 选择用户", options=list(options.keys()), key=f"{key}_select")]
 
 def handle_api_error(response, context="操作"):
     """Generic error handler for API responses."""
@@ -44,7 +68,7 @@ def login_page():
 
         if submitted:
             try:
-                response = requests.post(f"{API_URL}/login", json={"email": email, "password": password})
+                response = api_client.post("/login", invalidate=False, json={"email": email, "password": password})
                 if response.ok:
                     user = response.json()
                     st.session_state['logged_in'] = True
@@ -52,6 +76,7 @@ def login_page():
                     st.session_state['user_id'] = user['id']
                     st.session_state['email'] = user['email'] # Store email in session state
                     st.session_state['is_admin'] = bool(user.get('is_admin', False))
+                    st.session_state['token'] = user['access_token']
                     st.success(f"欢迎回来, {user['username']}!")
                     st.rerun()
                 else:
@@ -101,7 +126,7 @@ def register_page():
                     "age": age,
                 }
                 try:
-                    response = requests.post(f"{API_URL}/users", json=user_data)
+                    response = api_client.post("/users", json=user_data)
                     if response.status_code == 201:
                         new_user = response.json()
                         st.success(f"用户 {new_user['username']} 注册成功！用户ID: {new_user['id']}")
@@ -112,6 +137,8 @@ def register_page():
 
 # --- Main Application Logic ---
 
+api_client.start_run()
+
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
 
@@ -133,7 +160,7 @@ else:
         
         menu_options = ["列出所有用户", "添加用户", "更新用户", "搜索用户"]
         if st.session_state.get('is_admin'):
-            menu_options.extend(["删除用户", "管理用户权限"])
+            menu_options.extend(["删除用户", "管理用户权限", "统计看板"])
         menu_options.append("智能身材方案")  # Add AI plan menu for logged in users
             
         menu = st.selectbox("请选择操作", menu_options)
@@ -148,7 +175,7 @@ else:
     if menu == "列出所有用户":
         st.header("用户列表")
         try:
-            count_response = requests.get(f"{API_URL}/users/count")
+            count_response = api_client.get("/users/count")
             if not count_response.ok:
                 handle_api_error(count_response, "获取用户总数")
                 st.stop()
@@ -157,16 +184,38 @@ else:
             if total_users > 0:
                 page_size = st.slider("每页显示用户数", 5, 50, 10)
                 total_pages = (total_users + page_size - 1) // page_size
-                current_page = st.number_input('页码', min_value=1, max_value=total_pages, value=1)
-                
-                skip = (current_page - 1) * page_size
-                users_response = requests.get(f"{API_URL}/users", params={"skip": skip, "limit": page_size})
-                
+
+                # 键集分页：记录已访问各页的起始游标，翻页只需回传游标
+                if st.session_state.get('users_page_size') != page_size:
+                    st.session_state['users_page_size'] = page_size
+                    st.session_state['users_cursors'] = [None]
+                cursors = st.session_state['users_cursors']
+                current_page = len(cursors)
+
+                params = {"limit": page_size, "format": "arrow"}
+                if cursors[-1] is None:
+                    params["after_id"] = 0
+                else:
+                    params["cursor"] = cursors[-1]
+                users_response = api_client.get("/users", params=params)
+
                 if users_response.ok:
-                    users = users_response.json()
-                    df = pd.DataFrame(users)
-                    st.dataframe(df[['id', 'username', 'email', 'remark', 'is_admin', 'height', 'weight', 'age', 'created_at']], use_container_width=True)
+                    # Arrow 响应的下一页游标在 X-Next-Cursor 响应头中
+                    next_cursor = users_response.headers.get('X-Next-Cursor')
+                    df = read_arrow(users_response)
+                    if not df.empty:
+                        st.dataframe(df[['id', 'username', 'email', 'remark', 'is_admin', 'height', 'weight', 'age', 'created_at']], use_container_width=True)
                     st.info(f"显示第 {current_page}/{total_pages} 页，共 {total_users} 个用户")
+
+                    col_prev, col_next = st.columns(2)
+                    with col_prev:
+                        if st.button("⬅️ 上一页", disabled=current_page == 1):
+                            cursors.pop()
+                            st.rerun()
+                    with col_next:
+                        if st.button("下一页 ➡️", disabled=not next_cursor):
+                            cursors.append(next_cursor)
+                            st.rerun()
                 else:
                     handle_api_error(users_response, "获取用户列表")
             else:
@@ -188,7 +237,7 @@ else:
                     st.error("用户名、邮箱和密码不能为空！")
                 else:
                     try:
-                        response = requests.post(f"{API_URL}/users", json={"username": username, "email": email, "password": password, "remark": remark})
+                        response = api_client.post("/users", json={"username": username, "email": email, "password": password, "remark": remark})
                         if response.status_code == 201:
                             st.success(f"用户 {username} 已成功添加！")
                         else:
@@ -199,19 +248,12 @@ else:
     elif menu == "更新用户":
         st.header("更新用户信息")
         try:
-            users_response = requests.get(f"{API_URL}/users", params={"limit": 1000}) # Fetch all for dropdown
-            if not users_response.ok:
-                handle_api_error(users_response, "获取用户列表")
-                st.stop()
-            
-            users = users_response.json()
-            if not users:
-                st.info("系统中还没有用户。")
+            # 管理员可以修改任意用户，其他用户只能修改自己的信息
+            if st.session_state.get('is_admin'):
+                selected_id = user_picker("查找要更新的用户", "update_user")
             else:
-                user_options = {f"{user['id']} - {user['username']}": user['id'] for user in users}
-                selected_key = st.selectbox("👤 选择要更新的用户", options=list(user_options.keys()))
-                selected_id = user_options[selected_key]
-
+                selected_id = st.session_state['user_id']
+            if selected_id is not None:
                 with st.form("update_user_form"):
                     st.write(f"正在更新用户ID: {selected_id}")
                     username = st.text_input("新用户名", placeholder="留空不更新")
@@ -228,7 +270,7 @@ else:
                         if not update_data:
                             st.warning("未输入任何要更新的信息。")
                         else:
-                            response = requests.put(f"{API_URL}/users/{selected_id}", json=update_data)
+                            response = api_client.put(f"/users/{selected_id}", json=update_data)
                             if response.ok:
                                 st.success("用户信息已成功更新！")
                                 st.rerun()
@@ -240,41 +282,18 @@ else:
     elif menu == "删除用户" and st.session_state.get('is_admin'):
         st.header("删除用户")
         try:
-            users_response = requests.get(f"{API_URL}/users", params={"limit": 1000})
-            if not users_response.ok:
-                handle_api_error(users_response, "获取用户列表")
-                st.stop()
-
-            users = users_response.json()
-            if not users:
-                st.info("系统中还没有用户。")
-            else:
+            selected_id = user_picker("查找要删除的用户", "delete_user")
+            if selected_id is not None:
                 st.warning("⚠️ 警告：删除操作不可恢复！")
-                user_options = {f"{user['id']} - {user['username']}": user['id'] for user in users}
-                selected_id = user_options[st.selectbox("👤 选择要删除的用户", options=list(user_options.keys()))]
-                
-                password_to_confirm = st.text_input("🔑 请输入您的登录密码以确认删除", type="password")
-
-                if st.button("❌ 确认删除"):
-                    if not password_to_confirm:
-                        st.error("请输入您的密码以确认操作。")
+                confirmed = st.checkbox("我确认要删除该用户")
+                if st.button("❌ 确认删除", disabled=not confirmed):
+                    # 以登录时签发的令牌授权，令牌过期时需重新登录
+                    delete_response = api_client.delete(f"/users/{selected_id}")
+                    if delete_response.status_code == 204:
+                        st.success("用户已成功删除！")
+                        st.rerun()
                     else:
-                        # Authenticate admin before deleting
-                        admin_email = st.session_state.get('email')
-                        if not admin_email:
-                            st.error("无法获取管理员邮箱，请重新登录。")
-                            st.stop()
-
-                        login_response = requests.post(f"{API_URL}/login", json={"email": admin_email, "password": password_to_confirm})
-                        if login_response.ok:
-                            delete_response = requests.delete(f"{API_URL}/users/{selected_id}")
-                            if delete_response.status_code == 204:
-                                st.success("用户已成功删除！")
-                                st.rerun()
-                            else:
-                                handle_api_error(delete_response, "删除用户")
-                        else:
-                            st.error("密码不正确，无法授权删除操作。")
+                        handle_api_error(delete_response, "删除用户")
 
         except requests.exceptions.RequestException as e:
             st.error(f"无法连接到API: {e}")
@@ -285,11 +304,11 @@ else:
         search_query = st.text_input("🔍 输入用户名或邮箱进行搜索")
         if search_query:
             try:
-                response = requests.get(f"{API_URL}/users/search", params={"query": search_query})
+                response = api_client.get("/users/search", params={"query": search_query, "format": "arrow"})
                 if response.ok:
-                    results = response.json()
-                    if results:
-                        st.dataframe(pd.DataFrame(results), use_container_width=True)
+                    results = read_arrow(response)
+                    if not results.empty:
+                        st.dataframe(results, use_container_width=True)
                     else:
                         st.info("没有找到匹配的用户。")
                 else:
@@ -300,25 +319,120 @@ else:
     elif menu == "管理用户权限" and st.session_state.get('is_admin'):
         st.header("管理用户权限")
         try:
-            response = requests.get(f"{API_URL}/users", params={"limit": 1000})
+            # 有筛选词时按搜索结果编辑，否则按 id 分页浏览，每页 50 个用户
+            admin_fields = "id,username,email,is_admin"
+            query = st.text_input("🔍 按用户名或邮箱筛选", key="admin_query").strip()
+            admin_cursors = st.session_state.setdefault('admin_cursors', [None])
+            if st.session_state.get('admin_cursors_query') != query:
+                st.session_state['admin_cursors_query'] = query
+                admin_cursors[:] = [None]
+            next_cursor = None
+            if query:
+                response = api_client.get("/users/search", params={"query": query, "limit": 50, "fields": admin_fields})
+            else:
+                params = {"limit": 50, "fields": admin_fields}
+                if admin_cursors[-1] is None:
+                    params["after_id"] = 0
+                else:
+                    params["cursor"] = admin_cursors[-1]
+                response = api_client.get("/users", params=params)
             if not response.ok:
                 handle_api_error(response, "获取用户列表")
                 st.stop()
-
             users = response.json()
-            for user in users:
-                is_admin_current = bool(user['is_admin'])
-                # Admin cannot change their own status
-                if user['id'] == st.session_state['user_id']:
-                    st.checkbox(f"{user['username']} ({user['email']})", value=is_admin_current, disabled=True, key=f"admin_{user['id']}")
+            if not query:
+                next_cursor = users['next_cursor']
+                users = users['items']
+
+            # 自己的权限不能修改，不放进可编辑表格
+            users = [user for user in users if user['id'] != st.session_state['user_id']]
+            if not users:
+                st.info("没有匹配的其他用户。")
+                st.stop()
+            # 编辑状态按行号记录，换页或换筛选词时使用新的 key，避免把上一页的勾选带到新的一页
+            editor_key = f"admin_editor_{query}_{len(admin_cursors)}"
+            original = pd.DataFrame(users)[['id', 'username', 'email', 'is_admin']]
+            original['is_admin'] = original['is_admin'].astype(bool)
+            st.caption("勾选或取消“管理员”后点击保存，所有修改一次提交。当前登录账号不在列表中。")
+            edited = st.data_editor(
+                original,
+                column_config={
+                    "id": st.column_config.NumberColumn("ID"),
+                    "username": "用户名",
+                    "email": "邮箱",
+                    "is_admin": st.column_config.CheckboxColumn("管理员"),
+                },
+                disabled=['id', 'username', 'email'],
+                hide_index=True,
+                use_container_width=True,
+                key=editor_key,
+            )
+            changed = edited[edited['is_admin'] != original['is_admin']]
+            if st.button(f"保存修改 ({len(changed)})", disabled=changed.empty):
+                updates = [
+                    {"id": int(row.id), "is_admin": bool(row.is_admin)}
+                    for row in changed.itertuples()
+                ]
+                update_response = api_client.patch("/users/batch", json={"updates": updates})
+                if update_response.ok:
+                    st.success(f"已更新 {update_response.json()['updated']} 个用户的权限。")
+                    del st.session_state[editor_key]
+                    st.rerun()
                 else:
-                    if st.checkbox(f"{user['username']} ({user['email']})", value=is_admin_current, key=f"admin_{user['id']}") != is_admin_current:
-                        update_response = requests.put(f"{API_URL}/users/{user['id']}", json={"is_admin": not is_admin_current})
-                        if update_response.ok:
-                            st.success(f"用户 {user['username']} 的权限已更新。")
-                            st.rerun()
-                        else:
-                            handle_api_error(update_response, "更新权限")
+                    handle_api_error(update_response, "更新权限")
+
+            if not query:
+                col_prev, col_next = st.columns(2)
+                with col_prev:
+                    if st.button("⬅️ 上一页", disabled=len(admin_cursors) == 1, key="admin_prev"):
+                        admin_cursors.pop()
+                        st.rerun()
+                with col_next:
+                    if st.button("下一页 ➡️", disabled=not next_cursor, key="admin_next"):
+                        admin_cursors.append(next_cursor)
+                        st.rerun()
+        except requests.exceptions.RequestException as e:
+            st.error(f"无法连接到API: {e}")
+
+    elif menu == "统计看板" and st.session_state.get('is_admin'):
+        st.header("统计看板")
+        days = st.select_slider("方案趋势天数", options=[7, 30, 90, 180, 365], value=30)
+        try:
+            # 汇总表由数据库触发器增量维护，读取耗时与数据量无关，不走前端缓存
+            response = api_client.get("/stats", params={"days": days}, cache=False)
+            if not response.ok:
+                handle_api_error(response, "获取统计数据")
+                st.stop()
+            stats = response.json()
+
+            col_users, col_plans = st.columns(2)
+            col_users.metric("用户总数", stats['users'])
+            col_plans.metric("方案总数", stats['plans'])
+
+            col_age, col_bmi = st.columns(2)
+            with col_age:
+                st.subheader("用户年龄段")
+                age_order = ["<18", "18-29", "30-39", "40-49", "50-59", "60+", "unknown"]
+                ages = pd.Series(stats['age_bands'], dtype='int64').reindex(age_order, fill_value=0)
+                st.bar_chart(ages.rename(index={"unknown": "未填写"}))
+            with col_bmi:
+                # 每个用户按当前身高体重计一次，未填写身高体重的用户单独列出
+                st.subheader("用户 BMI 分类")
+                bmi_order = ["偏瘦", "正常", "超重", "肥胖", "未知", "unknown"]
+                categories = pd.Series(stats['bmi_categories'], dtype='int64').reindex(bmi_order, fill_value=0)
+                st.bar_chart(categories.rename(index={"unknown": "未填写"}))
+
+            st.subheader("已生成方案的 BMI 分类")
+            st.bar_chart(pd.Series(stats['plan_bmi_categories'], dtype='int64'))
+
+            st.subheader(f"最近 {days} 天每日生成方案数")
+            # 没有方案的日期不在汇总表中，补 0 后再画
+            today = pd.Timestamp.now(tz='UTC').normalize().tz_localize(None)
+            index = pd.date_range(end=today, periods=days, freq='D')
+            daily = pd.Series(
+                {pd.Timestamp(item['day']): item['plans'] for item in stats['plans_per_day']}, dtype='int64'
+            ).reindex(index, fill_value=0)
+            st.line_chart(daily)
         except requests.exceptions.RequestException as e:
             st.error(f"无法连接到API: {e}")
 
@@ -358,23 +472,39 @@ else:
                 "user_id": st.session_state['user_id']  # 关联当前用户
             }
             try:
-                resp = requests.post(f"{API_URL}/bmi/plan", json=payload, timeout=60)
-                if resp.ok:
-                    data = resp.json()
-                    st.subheader("基础指标")
-                    st.write(f"BMI: {data['bmi']} ({data['bmi_category']})")
-                    st.info(data['suggestion'])
-                    if data.get('ai_plan'):
+                # 流式接收：基础指标先到，AI 方案逐段渲染；读超时按相邻两段之间计算
+                with api_client.stream("POST", "/bmi/plan/stream", json=payload, timeout=(5, 60)) as resp:
+                    if resp.ok:
+                        events = iter_sse(resp)
+                        event, meta = next(events, (None, None))
+                        if event == 'meta':
+                            st.subheader("基础指标")
+                            st.write(f"BMI: {meta['bmi']} ({meta['bmi_category']})")
+                            st.info(meta['suggestion'])
+
+                        outcome = {}
+                        def plan_tokens():
+                            for event, data in events:
+                                if event == 'token':
+                                    yield data['delta']
+                                else:
+                                    outcome[event] = data
+
                         st.subheader("AI 方案")
-                        st.markdown(data['ai_plan'])
+                        ai_plan = st.write_stream(plan_tokens())
+                        if outcome.get('done', {}).get('plan_id'):
+                            # 新方案已保存，历史方案列表需要重新获取
+                            api_client.invalidate_cache()
+                        if 'error' in outcome:
+                            st.error(outcome['error']['detail'])
+                        elif not ai_plan:
+                            st.warning("未生成 AI 方案 (可能未配置密钥)")
                     else:
-                        st.warning("未生成 AI 方案 (可能未配置密钥)")
-                else:
-                    try:
-                        detail = resp.json().get('detail')
-                    except Exception:
-                        detail = resp.text
-                    st.error(f"生成失败: {detail}")
+                        try:
+                            detail = resp.json().get('detail')
+                        except Exception:
+                            detail = resp.text
+                        st.error(f"生成失败: {detail}")
             except requests.exceptions.RequestException as e:
                 
                 st.error(f"请求异常: {e}")
@@ -382,20 +512,40 @@ else:
         # 显示历史方案
         st.markdown("---")
         st.subheader("历史方案记录")
+        plans_page_size = 10
         try:
-            plans_response = requests.get(f"{API_URL}/users/{st.session_state['user_id']}/plans")
+            # 分页加载方案摘要，AI 方案正文在点开某条方案时再单独获取
+            plan_cursors = st.session_state.setdefault('plan_cursors', [None])
+            params = {"limit": plans_page_size, "summary": True, "format": "arrow"}
+            if plan_cursors[-1] is not None:
+                params["cursor"] = plan_cursors[-1]
+            plans_response = api_client.get(f"/users/{st.session_state['user_id']}/plans", params=params)
             if plans_response.ok:
-                plans = plans_response.json()
-                if not plans:
+                next_cursor = plans_response.headers.get('X-Next-Cursor')
+                plans = read_arrow(plans_response).to_dict('records')
+                if not plans and len(plan_cursors) == 1:
                     st.info("暂无历史方案记录。")
                 else:
+                    offset = (len(plan_cursors) - 1) * plans_page_size
                     for i, plan in enumerate(plans):
-                        with st.expander(f"方案 {i+1} - {plan['created_at']}"):
+                        with st.expander(f"方案 {offset + i + 1} - {plan['created_at']}"):
                             st.write(f"**BMI:** {plan['bmi']} ({plan['bmi_category']})")
                             st.write(f"**基础建议:** {plan['suggestion']}")
+
+                            detail_key = f"plan_detail_{plan['id']}"
+                            if detail_key not in st.session_state:
+                                if st.button("查看 AI 方案", key=f"load_plan_{plan['id']}"):
+                                    detail_response = api_client.get(f"/plans/{plan['id']}")
+                                    if detail_response.ok:
+                                        st.session_state[detail_key] = detail_response.json()
+                                    else:
+                                        handle_api_error(detail_response, "获取方案详情")
+                            detail = st.session_state.get(detail_key)
+                            if detail is None:
+                                continue
                             st.markdown("**AI 方案:**")
-                            st.markdown(plan['ai_plan'])
-                            
+                            st.markdown(detail['ai_plan'])
+
                             # 准备下载内容
                             download_content = f"""
 # 智能身材方案 ({plan['created_at']})
@@ -405,7 +555,7 @@ else:
 - **基础建议:** {plan['suggestion']}
 
 ## AI 智能方案
-{plan['ai_plan']}
+{detail['ai_plan']}
 """
                             st.download_button(
                                 label="下载此方案 (Markdown)",
@@ -414,7 +564,19 @@ else:
                                 mime="text/markdown",
                                 key=f"download_{plan['id']}"
                             )
+
+                    col_prev, col_next = st.columns(2)
+                    with col_prev:
+                        if st.button("⬅️ 较新的方案", disabled=len(plan_cursors) == 1):
+                            plan_cursors.pop()
+                            st.rerun()
+                    with col_next:
+                        if st.button("较早的方案 ➡️", disabled=not next_cursor):
+                            plan_cursors.append(next_cursor)
+                            st.rerun()
             else:
                 handle_api_error(plans_response, "获取历史方案")
         except requests.exceptions.RequestException as e:
             st.error(f"获取历史方案失败: {e}")
+
+api_client.render_timings()
@@ -0,0 +1,42 @@
+"""运维命令
+
+用法:
+  python manage.py migrate          把数据库结构迁移到最新版本（API 启动时也会执行）
+  python manage.py rebuild-stats    从 users / plans 全量重算统计汇总表 (stats_counts)
+
+数据库路径取自 DATABASE_PATH（默认 users.db）。
+"""
+import argparse
+import time
+
+import database
+
+
+def migrate(args):
+    start = time.perf_counter()
+    applied = database.init_db()
+    print(f"schema version {database.SCHEMA_VERSION}: applied {applied} migration(s) "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+def rebuild_stats(args):
+    database.init_db()
+    start = time.perf_counter()
+    rows = database.rebuild_stats()
+    print(f"rebuilt stats_counts ({rows} rows) in {time.perf_counter() - start:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="执行数据库结构迁移").set_defaults(run=migrate)
+    commands.add_parser("rebuild-stats", help="全量重算统计汇总表").set_defaults(run=rebuild_stats)
+    args = parser.parse_args()
+    try:
+        args.run(args)
+    finally:
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
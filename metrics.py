@@ -0,0 +1,201 @@
+"""进程内指标，以 Prometheus 文本格式从 GET /metrics 导出
+
+不依赖 prometheus_client：计数器与直方图各带一把锁，按标签值元组分别累计；
+连接池、写队列、缓存这类本来就有 stats() 的组件注册为 collector，在抓取时读取当前值。
+指标只在本进程内有效，多进程部署时每个进程各自暴露、由抓取端汇总。
+
+METRICS_ENABLED=0 时不记录请求与 SQL 语句指标（/metrics 仍返回 collector 的当前值）。
+"""
+import bisect
+import math
+import os
+import threading
+import time
+
+METRICS_ENABLED = (os.getenv("METRICS_ENABLED") or "1").lower() not in ("0", "false", "no", "off")
+
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增的计数器，inc 的位置参数依次为各标签值"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # 无标签的计数器从 0 开始导出，便于抓取端计算 rate
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _lines(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """累计分桶直方图，observe(value, *标签值)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=HTTP_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [各桶计数..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def _lines(self):
+        with self._lock:
+            items = [(labels, list(entry)) for labels, entry in self._values.items()]
+        for labels, entry in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (math.inf,), entry):
+                cumulative += hits
+                yield (f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', _format_value(float(bound))))}"
+                       f" {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(entry[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+def counter(name, help, labelnames=()):
+    metric = Counter(name, help, labelnames)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name, help, labelnames=(), buckets=HTTP_BUCKETS):
+    metric = Histogram(name, help, labelnames, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn):
+    """注册抓取时调用的 fn()，返回 [(name, kind, help, [(labels dict, value), ...]), ...]
+
+    kind 为 "gauge" 或 "counter"；fn 抛出的异常会被忽略，不影响其他指标。
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def stats_collector(prefix, help_texts, stats, counters=(), labels=None):
+    """把 stats() 返回的 dict 转成 collector 的指标族：数值字段逐个导出，
+    counters 中列出的字段作为 counter（名称追加 _total），其余作为 gauge"""
+    labels = labels or {}
+    families = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        is_counter = key in counters
+        name = f"{prefix}_{key}_total" if is_counter else f"{prefix}_{key}"
+        families.append((name, "counter" if is_counter else "gauge", help_texts.get(key, key), [(labels, value)]))
+    return families
+
+
+def render():
+    """生成 Prometheus 文本格式 (version 0.0.4)"""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric._lines())
+    families = {}
+    for fn in _collectors:
+        try:
+            collected = fn()
+        except Exception:
+            continue
+        for name, kind, help, samples in collected:
+            family = families.setdefault(name, (kind, help, []))
+            family[2].extend(samples)
+    for name, (kind, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+# --- HTTP ---
+
+http_requests = counter("http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+http_request_seconds = histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（流式响应计到最后一段发送完）", ("method", "route"), HTTP_BUCKETS
+)
+
+
+class MetricsMiddleware:
+    """按路由模板（如 /users/{user_id}）统计请求数与耗时的 ASGI 中间件。
+
+    路由在 Starlette 匹配后写入 scope["route"]；未匹配的请求（404）统一记为 "unmatched"，
+    避免任意路径把标签基数撑爆。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_seconds.observe(time.perf_counter() - start, method, route)
+            http_requests.inc(method, route, str(status))
@@ -0,0 +1,226 @@
+"""密码哈希与校验
+
+密码用 scrypt（标准库 hashlib）加盐哈希后存储，格式为 scrypt$n$r$p$盐$哈希（盐与哈希为 base64）。
+scrypt 一次约几十毫秒 CPU，直接放在请求里会占住事件循环或线程池，这里交给独立的进程池计算。
+
+校验通过的 (密码, 存储的哈希) 记在一个有大小上限、短时间过期的缓存里，同一账号重复授权
+（如删除用户前再次输入密码）不必再跑一遍 KDF。缓存键是以进程内随机密钥计算的 HMAC，
+不保存密码本身；存储的哈希变化（改密码）后旧条目自然不再命中。
+
+早期数据库中的密码是明文，verify_password 仍能校验，needs_rehash 为 True，由调用方在登录成功后替换为哈希。
+以 scrypt$ 开头但无法完整解析、或 n/r/p 超过本服务参数（SCRYPT_N/R/P）的值同样按明文处理：
+校验耗时随参数线性增长，导入的哈希若参数过大，每次登录都会长时间占住一个哈希进程。
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# 哈希计算的进程数，0 表示改在线程中计算（scrypt 计算时会释放 GIL）
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS") or os.cpu_count() or 2)
+PASSWORD_CACHE_SIZE = int(os.getenv("PASSWORD_CACHE_SIZE") or 1024)
+PASSWORD_CACHE_TTL = float(os.getenv("PASSWORD_CACHE_TTL") or 300)
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+_SCHEME = "scrypt"
+_SALT_BYTES = 16
+_HASH_BYTES = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4), validate=True)
+
+
+def _parse_hash(value):
+    """解析 scrypt$n$r$p$盐$哈希，返回 (n, r, p, 盐, 哈希)；格式不完整、取值无效或参数超过上限时返回 None"""
+    if not isinstance(value, str) or not value.startswith(_SCHEME + "$"):
+        return None
+    parts = value.split("$")
+    if len(parts) != 6:
+        return None
+    try:
+        n, r, p = (int(part) for part in parts[1:4])
+        salt = _b64decode(parts[4])
+        digest = _b64decode(parts[5])
+    except ValueError:
+        return None
+    # scrypt 要求 n 为大于 1 的 2 的幂
+    if n < 2 or n & (n - 1) or r < 1 or p < 1 or not salt or not digest:
+        return None
+    if n > SCRYPT_N or r > SCRYPT_R or p > SCRYPT_P:
+        return None
+    return n, r, p, salt, digest
+
+
+def is_password_hash(value):
+    """value 是否是完整、可解析的 scrypt 哈希"""
+    return _parse_hash(value) is not None
+
+
+def is_malformed_hash(value):
+    """value 以 scrypt$ 开头却无法解析（如导入时误把明文或截断的哈希当作哈希），或参数超过上限"""
+    return isinstance(value, str) and value.startswith(_SCHEME + "$") and not is_password_hash(value)
+
+
+def hash_password(password):
+    """在当前进程中计算密码哈希"""
+    salt = os.urandom(_SALT_BYTES)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=_HASH_BYTES)
+    return f"{_SCHEME}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def verify_password(password, stored):
+    """在当前进程中校验密码。stored 不是哈希格式时按旧的明文密码比较。"""
+    if not stored:
+        return False
+    parsed = _parse_hash(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode(), stored.encode())
+    n, r, p, salt, expected = parsed
+    try:
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=len(expected))
+    except ValueError:
+        # 参数超出 scrypt 的内存上限等
+        return False
+    return hmac.compare_digest(digest, expected)
+
+
+# 邮箱不存在时用它跑一次同样参数的 KDF，使登录响应时间不泄露邮箱是否已注册。
+# 盐与哈希随机生成，任何密码都校验不通过，也不必在导入时计算。
+DUMMY_HASH = (f"{_SCHEME}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$"
+              f"{_b64encode(os.urandom(_SALT_BYTES))}${_b64encode(os.urandom(_HASH_BYTES))}")
+
+
+def needs_rehash(stored):
+    """明文或参数已过时的哈希需要在下次登录成功后重新计算"""
+    if not is_password_hash(stored):
+        return True
+    return stored.split("$")[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+def _hash_many(passwords):
+    return [hash_password(password) for password in passwords]
+
+
+class CredentialCache:
+    """最近校验通过的凭据，按 TTL 过期，超过 size 条时淘汰最早的"""
+
+    def __init__(self, size=PASSWORD_CACHE_SIZE, ttl=PASSWORD_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._secret = secrets.token_bytes(32)
+        self._entries = OrderedDict()  # key -> 过期时间
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _key(self, password, stored):
+        return hmac.new(self._secret, f"{password}\0{stored}".encode(), hashlib.sha256).digest()
+
+    def contains(self, password, stored):
+        key = self._key(password, stored)
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None and expires > now:
+                self._stats["hits"] += 1
+                return True
+            if expires is not None:
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return False
+
+    def add(self, password, stored):
+        if self.size <= 0:
+            return
+        key = self._key(password, stored)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+credential_cache = CredentialCache()
+
+
+def get_executor():
+    global _executor
+    if _executor is None and PASSWORD_HASH_WORKERS > 0:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _executor
+
+
+def start():
+    """预先启动全部工作进程，避免第一批登录请求承担进程启动开销"""
+    executor = get_executor()
+    if executor is not None:
+        for future in [executor.submit(int) for _ in range(PASSWORD_HASH_WORKERS)]:
+            future.result()
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+async def _run(fn, *args):
+    executor = get_executor()
+    if executor is None:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def hash_password_async(password):
+    return await _run(hash_password, password)
+
+
+async def hash_passwords_async(passwords):
+    """批量哈希：已是哈希格式的值原样保留，其余按进程数分块并行计算"""
+    todo = [i for i, password in enumerate(passwords) if not is_password_hash(password)]
+    if not todo:
+        return list(passwords)
+    chunks = max(1, min(len(todo), PASSWORD_HASH_WORKERS or 1))
+    groups = [todo[i::chunks] for i in range(chunks)]
+    results = await asyncio.gather(*(_run(_hash_many, [passwords[i] for i in group]) for group in groups))
+    hashed = list(passwords)
+    for group, values in zip(groups, results):
+        for i, value in zip(group, values):
+            hashed[i] = value
+    return hashed
+
+
+async def verify_password_async(password, stored):
+    """校验密码；最近校验通过的凭据直接命中缓存，不再计算 KDF"""
+    if not is_password_hash(stored):
+        # 旧的明文密码，比较代价很小，不经过缓存
+        return verify_password(password, stored)
+    if credential_cache.contains(password, stored):
+        return True
+    ok = await _run(verify_password, password, stored)
+    if ok:
+        credential_cache.add(password, stored)
+    return ok
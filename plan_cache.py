@@ -0,0 +1,89 @@
+"""AI 方案缓存
+
+大量用户提交的 BMIRequest 几乎相同（同一 BMI 区间、年龄段、性别与目标），每次都完整调用
+一次 LLM 既慢又费钱。这里按量化后的输入生成指纹作为键：BMI 按 0.5、年龄按 5 岁分桶，
+再加上性别、目标、模型名与提示词版本。同一个桶内的用户共享同一份方案。
+
+两级缓存：进程内 LRU（最多 memory_size 条），以及 users.db 中的 plan_cache 表
+（跨进程、重启后仍有效，按 TTL 过期，超过 max_rows 时淘汰最早写入的条目）。
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import database
+
+PLAN_CACHE_ENABLED = (os.getenv("PLAN_CACHE_ENABLED") or "1").lower() not in ("0", "false", "no", "off")
+PLAN_CACHE_MEMORY_SIZE = int(os.getenv("PLAN_CACHE_MEMORY_SIZE") or 256)
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL") or 7 * 24 * 3600)
+PLAN_CACHE_MAX_ROWS = int(os.getenv("PLAN_CACHE_MAX_ROWS") or 10000)
+
+
+def plan_fingerprint(bmi, age, gender, goal, model, prompt_version):
+    """量化输入并生成缓存键"""
+    bmi_bucket = math.floor(bmi * 2) / 2
+    age_bucket = age // 5 * 5
+    parts = [
+        bmi_bucket,
+        age_bucket,
+        (gender or "").strip().lower(),
+        (goal or "").strip().lower(),
+        model,
+        prompt_version,
+    ]
+    raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class PlanCache:
+    def __init__(self, memory_size=PLAN_CACHE_MEMORY_SIZE, ttl=PLAN_CACHE_TTL, max_rows=PLAN_CACHE_MAX_ROWS):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._memory = OrderedDict()  # key -> (ai_plan, created_at)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "writes": 0}
+
+    def get(self, key):
+        """依次查内存与 SQLite，命中返回方案文本，否则返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+        row = database.get_cached_plan(key, now - self.ttl)
+        with self._lock:
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["db_hits"] += 1
+            self._remember(key, row["ai_plan"], row["created_at"])
+        return row["ai_plan"]
+
+    def put(self, key, ai_plan):
+        now = time.time()
+        with self._lock:
+            self._remember(key, ai_plan, now)
+            self._stats["writes"] += 1
+        database.put_cached_plan(key, ai_plan, now, expire_before=now - self.ttl, max_rows=self.max_rows)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, memory_entries=len(self._memory))
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["db_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, ai_plan, created_at):
+        self._memory[key] = (ai_plan, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
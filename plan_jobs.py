@@ -0,0 +1,109 @@
+"""AI 方案后台任务队列
+
+LLM 调用动辄数十秒，在同步端点里直接调用会长时间占住 FastAPI 线程池的 worker，
+几个并发的方案请求就能拖垮其他接口。这里用固定数量的 asyncio worker 消费有界队列：
+同时生成的方案数不超过 concurrency，排队数超过 max_pending 时直接拒绝（背压），
+调用方拿到 job id 后轮询结果。任务状态只保存在内存中，完成后保留 ttl 秒。
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+PLAN_JOB_CONCURRENCY = int(os.getenv("PLAN_JOB_CONCURRENCY") or 4)
+PLAN_JOB_QUEUE_SIZE = int(os.getenv("PLAN_JOB_QUEUE_SIZE") or 100)
+PLAN_JOB_TTL = float(os.getenv("PLAN_JOB_TTL") or 3600)
+
+
+class QueueFull(Exception):
+    """排队的任务已达上限"""
+
+
+class PlanJob:
+    def __init__(self, payload):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = "pending"  # pending | running | done | failed
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+
+class PlanJobQueue:
+    def __init__(self, handler, concurrency=PLAN_JOB_CONCURRENCY, max_pending=PLAN_JOB_QUEUE_SIZE, ttl=PLAN_JOB_TTL):
+        """handler 为 async 函数 handler(job)，其返回值作为任务结果"""
+        self._handler = handler
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._queue = None
+        self._workers = []
+        self._jobs = OrderedDict()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, payload):
+        """排入一个任务并立即返回；队列已满时抛出 QueueFull"""
+        if self._queue is None:
+            raise RuntimeError("任务队列未启动")
+        self._prune()
+        job = PlanJob(payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"排队中的方案任务已达上限 ({self.max_pending})")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def stats(self):
+        running = sum(1 for job in self._jobs.values() if job.status == "running")
+        return {
+            "concurrency": self.concurrency,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "running": running,
+            "tracked": len(self._jobs),
+        }
+
+    def _prune(self):
+        # 任务按提交顺序保存，从最早的开始清理已过期的已完成任务
+        cutoff = time.time() - self.ttl
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.finished_at is None:
+                if job.created_at > cutoff:
+                    break
+                continue
+            if job.finished_at > cutoff:
+                break
+            del self._jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            try:
+                job.result = await self._handler(job)
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "服务关闭，任务已取消"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
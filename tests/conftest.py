@@ -0,0 +1,48 @@
+"""测试公共设置：导入 api 之前指向临时数据库，密码哈希改在线程中计算，不调用真实的 LLM"""
+import os
+import tempfile
+
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bmi_tests_"), "test.db")
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+for var in ("DEEPSEEK_API_KEY", "OPENAI_API_KEY"):
+    os.environ.pop(var, None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import database
+import tokens
+
+# 种子用户：1 为管理员，其余为普通用户；密码为旧式明文，登录成功后替换为哈希
+SEED_USERS = 20
+
+
+@pytest.fixture(scope="session")
+def client():
+    database.init_db()
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, email, password, is_admin, height, weight, age) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"user{i:03d}", f"user{i:03d}@example.com", "secret", int(i == 1), 170, 60 + i, 20 + i)
+             for i in range(1, SEED_USERS + 1)],
+        )
+    with TestClient(api.app) as client:
+        api.app.state.llm = None
+        yield client
+
+
+def _auth(user_id, is_admin=False):
+    token, _ = tokens.issue_token(user_id, is_admin)
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def admin():
+    return _auth(1, is_admin=True)
+
+
+@pytest.fixture
+def user():
+    """普通用户 2 的令牌"""
+    return _auth(2)
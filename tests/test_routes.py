@@ -0,0 +1,106 @@
+"""路由测试：状态码、固定路径与 /users/{user_id} 的匹配顺序、令牌与管理员权限"""
+import pytest
+
+from conftest import SEED_USERS
+
+
+@pytest.mark.parametrize("method, path, kwargs, expected", [
+    ("GET", "/", {}, 200),
+    ("GET", "/users", {"params": {"skip": 0, "limit": 5}}, 200),
+    ("GET", "/users", {"params": {"after_id": 0, "limit": 5}}, 200),
+    ("GET", "/users/1", {}, 200),
+    ("GET", "/users/1/plans", {}, 200),
+    ("GET", f"/users/{SEED_USERS + 1000}", {}, 404),
+    ("POST", "/login", {"json": {"email": "user003@example.com", "password": "secret"}}, 200),
+    ("POST", "/login", {"json": {"email": "user003@example.com", "password": "wrong"}}, 401),
+    ("POST", "/login", {"json": {"email": "nobody@example.com", "password": "secret"}}, 401),
+    ("POST", "/bmi/plan", {"json": {"height": 170, "weight": 65, "age": 30, "user_id": 1}}, 200),
+    ("POST", "/bmi/batch", {"json": {"records": [{"id": 1, "height": 170, "weight": 65, "age": 30}]}}, 200),
+])
+def test_status(client, method, path, kwargs, expected):
+    assert client.request(method, path, **kwargs).status_code == expected
+
+
+# 固定路径必须在 /users/{user_id} 之前注册，否则会被当作 user_id 解析返回 422 / 405
+@pytest.mark.parametrize("path, params", [
+    ("/users/count", {}),
+    ("/users/search", {"query": "user001"}),
+    ("/users/lookup", {"prefix": "user"}),
+    ("/users/export", {}),
+])
+def test_fixed_user_paths_are_not_user_ids(client, path, params):
+    assert client.get(path, params=params).status_code == 200
+
+
+def test_users_count_etag(client):
+    response = client.get("/users/count")
+    assert response.status_code == 200
+    cached = client.get("/users/count", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+
+
+def test_create_user(client):
+    response = client.post("/users", json={"username": "created", "email": "created@example.com", "password": "pw"})
+    assert response.status_code == 201
+    assert response.json()["username"] == "created"
+
+
+@pytest.mark.parametrize("method, path, kwargs", [
+    ("PUT", "/users/2", {"json": {"remark": "x"}}),
+    ("DELETE", "/users/2", {}),
+    ("PATCH", "/users/batch", {"json": {"updates": [{"id": 2, "remark": "x"}]}}),
+    ("POST", "/users/bulk", {"content": '{"username": "b", "email": "b@example.com", "password": "pw"}'}),
+    ("GET", "/stats", {}),
+    ("POST", "/bmi/batch", {"params": {"source": "users"}}),
+])
+def test_requires_token(client, method, path, kwargs):
+    assert client.request(method, path, **kwargs).status_code == 401
+
+
+def test_invalid_token(client):
+    response = client.put("/users/2", json={"remark": "x"}, headers={"Authorization": "Bearer invalid.token"})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("method, path, kwargs", [
+    ("DELETE", "/users/3", {}),
+    ("PATCH", "/users/batch", {"json": {"updates": [{"id": 3, "remark": "x"}]}}),
+    ("POST", "/users/bulk", {"content": '{"username": "b", "email": "b@example.com", "password": "pw"}'}),
+    ("GET", "/stats", {}),
+    ("POST", "/bmi/batch", {"params": {"source": "users"}}),
+])
+def test_requires_admin(client, user, method, path, kwargs):
+    assert client.request(method, path, headers=user, **kwargs).status_code == 403
+
+
+def test_update_self(client, user):
+    response = client.put("/users/2", json={"remark": "本人修改"}, headers=user)
+    assert response.status_code == 200
+    assert response.json()["remark"] == "本人修改"
+
+
+def test_update_other_user_forbidden(client, user):
+    assert client.put("/users/3", json={"remark": "x"}, headers=user).status_code == 403
+
+
+def test_grant_admin_to_self_forbidden(client, user):
+    assert client.put("/users/2", json={"is_admin": True}, headers=user).status_code == 403
+
+
+def test_admin_routes(client, admin):
+    assert client.put("/users/3", json={"remark": "管理员修改"}, headers=admin).status_code == 200
+    batch = client.patch("/users/batch", json={"updates": [{"id": 4, "remark": "批量"}]}, headers=admin)
+    assert batch.status_code == 200
+    assert client.get("/stats", headers=admin).status_code == 200
+    assert client.post("/bmi/batch", params={"source": "users"}, headers=admin).status_code == 200
+    bulk = client.post(
+        "/users/bulk", content='{"username": "bulk1", "email": "bulk1@example.com", "password": "pw"}', headers=admin
+    )
+    assert bulk.status_code == 200
+    assert bulk.json()["inserted"] == 1
+
+
+def test_delete_user(client, admin):
+    assert client.delete(f"/users/{SEED_USERS}", headers=admin).status_code == 204
+    assert client.get(f"/users/{SEED_USERS}").status_code == 404
+    assert client.delete(f"/users/{SEED_USERS}", headers=admin).status_code == 404
@@ -0,0 +1,59 @@
+"""无状态访问令牌
+
+/login 成功后签发 HMAC-SHA256 签名的令牌：base64url(JSON 载荷) + "." + base64url(签名)。
+载荷包含用户 id (sub)、是否管理员 (adm) 与过期时间 (exp)，校验只需一次 HMAC，不查数据库。
+因此令牌过期前，数据库中权限的变更（如取消管理员）不会反映到已签发的令牌上，有效期不宜过长。
+
+AUTH_SECRET 未设置时每次启动随机生成密钥：重启后旧令牌全部失效，多进程部署时必须显式设置。
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+AUTH_SECRET = (os.getenv("AUTH_SECRET") or "").encode() or secrets.token_bytes(32)
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL") or 8 * 3600)
+
+
+class InvalidToken(Exception):
+    """令牌格式错误、签名不匹配或已过期"""
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return hmac.new(AUTH_SECRET, payload.encode(), hashlib.sha256).digest()
+
+
+def issue_token(user_id, is_admin, ttl=None):
+    """签发令牌，返回 (token, 有效秒数)"""
+    ttl = ttl or AUTH_TOKEN_TTL
+    claims = {"sub": user_id, "adm": bool(is_admin), "exp": int(time.time()) + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_b64encode(_sign(payload))}", ttl
+
+
+def verify_token(token):
+    """校验签名与有效期，返回载荷 dict；无效时抛出 InvalidToken"""
+    payload, _, signature = token.partition(".")
+    try:
+        valid = hmac.compare_digest(_b64decode(signature), _sign(payload))
+        claims = json.loads(_b64decode(payload)) if valid else None
+    except ValueError:
+        raise InvalidToken("令牌格式错误")
+    if not valid:
+        raise InvalidToken("令牌签名无效")
+    if not isinstance(claims, dict) or not isinstance(claims.get("exp"), int):
+        raise InvalidToken("令牌格式错误")
+    if claims["exp"] <= time.time():
+        raise InvalidToken("令牌已过期")
+    return claims